@@ -0,0 +1,425 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+''' Measures plan parsing, DOCKERManagerImpl start/stop and
+dockerfieldmanager startfield/stopfield on a synthetic plan, fully
+offline.
+
+    python bench_orchestration.py [options]
+
+docker, sysctl, etce-test and nsenter are replaced by recording stand-ins on
+PATH, Platform and ClientBuilder by recording fakes, and the wait for
+container interfaces by a no-op. Kernel parameters are written to a
+scratch copy of /proc/sys. Each stand-in sleeps its configured
+latency per call. Reported per phase: wall time, the time spent in
+each DOCKERManagerImpl step, the external commands and fake calls
+made, and the peak RSS of the process so far.
+
+--json writes the results, with the revision and options, and
+--compare prints the change against a previous --json file.
+'''
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import fakes
+import genplan
+
+
+# DOCKERManagerImpl steps timed inside start and stop, when present
+STEPS = ('_bringupnetwork',
+         '_provisionnetwork',
+         '_tunekernel',
+         '_writehosts',
+         '_materialize',
+         '_startnodes',
+         '_waitready',
+         '_removecontainers',
+         '_bringdownnetwork',
+         '_teardownnetwork',
+         '_restorekernel')
+
+
+class Phase(object):
+    def __init__(self, name, commandlog, recorders, verbose):
+        self.name = name
+
+        self.steps = {}
+
+        self._commandlog = commandlog
+
+        self._recorders = recorders
+
+        self._verbose = verbose
+
+
+    def __enter__(self):
+        # the tools' progress output is not part of the report
+        if not self._verbose:
+            self._stdout = sys.stdout
+
+            sys.stdout = open(os.devnull, 'w')
+
+        self._commands = fakes.count_commands(self._commandlog)
+
+        self._calls = self._callcounts()
+
+        self._start = time.time()
+
+        return self
+
+
+    def __exit__(self, *exc):
+        self.wall = time.time() - self._start
+
+        if not self._verbose:
+            sys.stdout.close()
+
+            sys.stdout = self._stdout
+
+        commands = fakes.count_commands(self._commandlog)
+
+        self.commands = dict([ (program, count - self._commands.get(program, 0))
+                               for program,count in commands.items()
+                               if count > self._commands.get(program, 0) ])
+
+        calls = self._callcounts()
+
+        self.calls = dict([ (name, count - self._calls.get(name, 0))
+                            for name,count in calls.items()
+                            if count > self._calls.get(name, 0) ])
+
+        self.maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        return False
+
+
+    def timed(self, name, function):
+        def call(*args, **kwargs):
+            start = time.time()
+
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.steps[name] = self.steps.get(name, 0.0) + time.time() - start
+
+        return call
+
+
+    def result(self):
+        return {'wall':self.wall,
+                'steps':self.steps,
+                'commands':self.commands,
+                'calls':self.calls,
+                'maxrss_kb':self.maxrss}
+
+
+    def _callcounts(self):
+        counts = {}
+
+        for prefix,recorder in self._recorders.items():
+            for name,count in recorder.calls.items():
+                counts['%s.%s' % (prefix, name)] = count
+
+        return counts
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timestep(impl, phase):
+    for name in STEPS:
+        if hasattr(impl, name):
+            setattr(impl, name, phase.timed(name, getattr(impl, name)))
+
+
+def run(args, workdir):
+    import etce.dockerfieldmanager
+    import etce.dockerkernelparameters
+    import etce.dockermanager
+    from etce.dockermanager import DOCKERManagerImpl
+    from etce.dockerplanfiledoc import DOCKERPlanFileDoc
+
+    planfile = os.path.join(workdir, 'dockerplan.xml')
+
+    genplan.generate(planfile,
+                     args.hosts,
+                     args.containers,
+                     args.bridges,
+                     args.interfaces,
+                     args.templatedepth,
+                     args.overlaylists,
+                     args.overlaylistsize)
+
+    commandlog = os.path.join(workdir, 'commands.log')
+
+    platform = fakes.FakePlatform(args.platform_latency)
+
+    clientbuilder = fakes.FakeClientBuilder(args.ssh_latency)
+
+    interfacewait = fakes.FakeInterfaceWait()
+
+    recorders = {'platform':platform,
+                 'client':clientbuilder,
+                 'netns':interfacewait}
+
+    phases = []
+
+    def phase(name):
+        phases.append(Phase(name, commandlog, recorders, args.verbose))
+
+        return phases[-1]
+
+    # parse
+    with phase('parse') as p:
+        plandoc = p.timed('full', DOCKERPlanFileDoc)(planfile, cache=False)
+
+        p.timed('lazy', DOCKERPlanFileDoc)(planfile, cache=False, lazy=True).containers(
+            platform.hostname())
+
+        p.timed('stream', DOCKERPlanFileDoc)(planfile, cache=False, stream=True)
+
+    hostname = platform.hostname()
+
+    dockerroot = plandoc.docker_root_directory(hostname)
+
+    if dockerroot and os.path.exists(dockerroot):
+        if not args.force:
+            raise RuntimeError('docker root directory "%s" exists, a field may be ' \
+                               'running. Use --force to remove it.' % dockerroot)
+
+    # nothing below reaches a real device, daemon or host
+    etce.dockermanager.Platform = lambda: platform
+
+    etce.dockermanager.waitforinterface = interfacewait
+
+    etce.dockerfieldmanager.Platform = lambda: platform
+
+    etce.dockerfieldmanager.ClientBuilder = clientbuilder
+
+    # kernel parameters are set in a scratch tree
+    procsys = os.path.join(workdir, 'procsys')
+
+    fakes.install_procsys(procsys)
+
+    etce.dockerkernelparameters.PROCSYS = procsys
+
+    # the fake docker lists no containers, one readiness query is
+    # measured instead of waiting out the deadline
+    DOCKERManagerImpl.READY_TIMEOUT = 0.0
+
+    # /etc/hosts is not touched
+    etce.dockerfieldmanager.writehosts = lambda plandoc, containers: None
+
+    try:
+        with phase('start') as p:
+            impl = DOCKERManagerImpl('cli', args.attach, platform=platform)
+
+            timestep(impl, p)
+
+            impl.start(plandoc, False, forcedockerroot=True, parallel=args.parallel)
+
+        with phase('stop') as p:
+            impl = DOCKERManagerImpl('cli', platform=platform)
+
+            timestep(impl, p)
+
+            impl.stop(plandoc, parallel=args.parallel)
+
+        fieldargs = argparse.Namespace(dockerplanfile=planfile,
+                                       stream=False,
+                                       slices=args.slices,
+                                       writehosts=False,
+                                       forcedockerroot=True,
+                                       dryrun=False,
+                                       parallel=args.parallel,
+                                       runtime='cli',
+                                       attach=args.attach,
+                                       netlink=False,
+                                       reconcile=False,
+                                       collect=False,
+                                       user=None,
+                                       port=None,
+                                       password=None,
+                                       policy='reject',
+                                       maxhosts=args.maxhosts,
+                                       hosttimeout=None,
+                                       trace=tracefile(args.trace, 'startfield'),
+                                       textfiledir=args.textfiledir)
+
+        with phase('startfield'):
+            etce.dockerfieldmanager.startfield(fieldargs)
+
+        fieldargs.trace = tracefile(args.trace, 'stopfield')
+
+        with phase('stopfield'):
+            etce.dockerfieldmanager.stopfield(fieldargs)
+    finally:
+        if dockerroot and os.path.exists(dockerroot):
+            shutil.rmtree(dockerroot)
+
+    return phases
+
+
+def report(results, baseline=None):
+    print 'revision %s, %d containers on %d hosts' % \
+        (results['revision'],
+         results['options']['containers'] * results['options']['hosts'],
+         results['options']['hosts'])
+
+    print '%-24s %10s %10s %10s %10s %s' % \
+        ('phase', 'seconds', 'commands', 'calls', 'maxrss_mb', 'change')
+
+    for name,phase in results['phases']:
+        change = ''
+
+        if baseline and name in baseline and baseline[name]['wall']:
+            change = '%+.1f%%' % (100.0 * (phase['wall'] / baseline[name]['wall'] - 1))
+
+        print '%-24s %10.3f %10d %10d %10d %s' % \
+            (name,
+             phase['wall'],
+             sum(phase['commands'].values()),
+             sum(phase['calls'].values()),
+             phase['maxrss_kb'] / 1024,
+             change)
+
+        for step,seconds in sorted(phase['steps'].items()):
+            print '  %-22s %10.3f' % (step, seconds)
+
+        for command,count in sorted(phase['commands'].items() + phase['calls'].items()):
+            print '  %-22s %10s %10d' % (command, '', count)
+
+
+def tracefile(trace, command):
+    if not trace:
+        return None
+
+    base,ext = os.path.splitext(trace)
+
+    return '%s.%s%s' % (base, command, ext)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench_orchestration.py')
+
+    genplan.add_arguments(parser)
+
+    parser.add_argument('--parallel', type=int, default=1,
+                        help='containers started and removed concurrently. Default: 1')
+    parser.add_argument('--attach', choices=['connect', 'create'], default='connect',
+                        help='container network attach mode. Default: connect')
+    parser.add_argument('--maxhosts', type=int, default=8,
+                        help='remote hosts contacted concurrently by startfield and stopfield. Default: 8')
+    parser.add_argument('--slices', action='store_true', default=False,
+                        help='send remote hosts plan slices rather than the plan file')
+    parser.add_argument('--trace', default=None,
+                        help='write the startfield and stopfield traces next to this file name')
+    parser.add_argument('--textfiledir', default=None,
+                        help='write the Prometheus metrics of startfield and stopfield to this directory')
+    parser.add_argument('--docker-latency', type=float, default=0.0,
+                        help='seconds each fake external command takes. Default: 0')
+    parser.add_argument('--platform-latency', type=float, default=0.0,
+                        help='seconds each fake Platform call takes. Default: 0')
+    parser.add_argument('--ssh-latency', type=float, default=0.0,
+                        help='seconds each fake put or execute takes per host. Default: 0')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='remove an existing docker root directory')
+    parser.add_argument('--verbose', action='store_true', default=False,
+                        help='show the output of the tools being measured')
+    parser.add_argument('--json', default=None,
+                        help='write the results to this file')
+    parser.add_argument('--compare', default=None,
+                        help='print the change against this earlier --json file')
+
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='etcebench.')
+
+    bindir = os.path.join(workdir, 'bin')
+
+    os.mkdir(bindir)
+
+    fakes.install_commands(bindir)
+
+    os.environ['PATH'] = bindir + os.pathsep + os.environ.get('PATH', '')
+
+    os.environ['ETCE_BENCH_LOG'] = os.path.join(workdir, 'commands.log')
+
+    os.environ['ETCE_BENCH_LATENCY'] = str(args.docker_latency)
+
+    # startfield and stopfield keep their lock file here
+    os.environ['WORKDIR'] = workdir
+
+    try:
+        phases = run(args, workdir)
+    finally:
+        shutil.rmtree(workdir)
+
+    options = dict(vars(args))
+
+    del options['json'], options['compare'], options['force'], options['verbose']
+
+    results = {'revision':revision(),
+               'python':sys.version.split()[0],
+               'options':options,
+               'phases':[ (phase.name, phase.result()) for phase in phases ]}
+
+    baseline = None
+
+    if args.compare:
+        with open(args.compare) as fd:
+            baseline = dict(json.load(fd)['phases'])
+
+    report(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+''' Times parsing of a plan with one large <container> element and
+compares per-index rendering with format_string against the
+compiled TemplateRenderer.
+
+    python bench_templates.py [indices]
+'''
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from etce.dockerplanfiledoc import CompiledTemplate,DOCKERPlanFileDoc,TemplateRenderer
+from etce.templateutils import format_string
+
+
+PLAN = '''<dockerplan>
+  <hosts>
+    <host hostname="localhost">
+      <bridges>
+        <bridge name="ctl" persistent="false" subnet="10.0.0.0/8"/>
+      </bridges>
+      <containers>
+        <container docker_name="node-${docker_index}" docker_indices="1-%d">
+          <overlays>
+            <overlay name="image" value="etce/node:latest"/>
+          </overlays>
+          <parameters>
+            <parameter name="image" value="${image}"/>
+            <parameter name="--env=" value="NODE=${docker_index}"/>
+            <parameter name="--cpus=" value="1"/>
+          </parameters>
+          <interfaces>
+            <interface bridge="ctl" hosts_entry_ipv4="${docker_name}-ctl">
+              <parameter name="ipv4" value="10.${docker_index}/8"/>
+              <parameter name="mtu" value="1500"/>
+            </interface>
+          </interfaces>
+          <initscript>
+            echo starting ${docker_name}
+            ip link set eth0 mtu 1500
+            route add default gw 10.0.0.1
+          </initscript>
+        </container>
+      </containers>
+    </host>
+  </hosts>
+</dockerplan>
+'''
+
+
+def timed(label, function, *args):
+    start = time.time()
+
+    result = function(*args)
+
+    print '%-30s %8.3fs' % (label, time.time() - start)
+
+    return result
+
+
+def render_raw(templates, overlays):
+    for overlay in overlays:
+        for template in templates:
+            format_string(template, overlay)
+
+
+def render_compiled(templates, overlays):
+    compiled = [ CompiledTemplate(template) for template in templates ]
+
+    renderer = TemplateRenderer(['docker_index', 'docker_name', 'docker_directory'])
+
+    for overlay in overlays:
+        for template in compiled:
+            renderer.render(template, overlay)
+
+
+def main():
+    indices = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    workdir = tempfile.mkdtemp()
+
+    try:
+        planfile = os.path.join(workdir, 'plan.xml')
+
+        with open(planfile, 'w') as fd:
+            fd.write(PLAN % indices)
+
+        plandoc = timed('parse %d indices' % indices,
+                        DOCKERPlanFileDoc, planfile, False)
+
+        print '%-30s %8d' % ('containers', len(plandoc.containers('localhost')))
+    finally:
+        shutil.rmtree(workdir)
+
+    templates = [ '${image}', 'NODE=${docker_index}', '1', '${docker_name}-ctl',
+                  '10.${docker_index}/8', '1500', 'echo starting ${docker_name}',
+                  'ip link set eth0 mtu 1500', 'route add default gw 10.0.0.1' ]
+
+    overlays = [ {'image':'etce/node:latest',
+                  'docker_index':index,
+                  'docker_name':'node-%d' % index,
+                  'docker_directory':'/tmp/etce/node-%d' % index}
+                 for index in range(1, indices + 1) ]
+
+    timed('format_string', render_raw, templates, overlays)
+
+    timed('TemplateRenderer', render_compiled, templates, overlays)
+
+
+if __name__ == '__main__':
+    main()
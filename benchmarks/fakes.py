@@ -0,0 +1,231 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+''' Offline stand-ins used by the benchmark harness. Each records the
+calls made on it and sleeps a configurable latency per call.
+
+The external commands the docker tools run (docker, sysctl, etce-test
+and nsenter) are replaced by shell scripts put first on PATH. Every
+invocation appends one line to the file named by ETCE_BENCH_LOG and
+then sleeps ETCE_BENCH_LATENCY seconds. Queries print what an empty
+docker daemon would, except that "docker inspect" reports pid 1 and
+nsenter reports having run.
+'''
+
+import os
+import socket
+import stat
+import threading
+import time
+
+
+FAKE_COMMANDS = ('docker', 'sysctl', 'etce-test', 'nsenter')
+
+FAKE_KERNEL_PARAMETERS = (('net.ipv4.ip_forward', '0'),)
+
+# a shell script starts much faster than an interpreter, which keeps
+# the stand-in's own cost small against what is measured
+FAKE_COMMAND = '''#!/bin/sh
+# one log line per invocation, even for multi-line shell scripts
+printf '%%s\\t%%s\\n' %s "$(printf '%%s' "$*" | tr '\\n' ' ')" >> "$ETCE_BENCH_LOG"
+case "$ETCE_BENCH_LATENCY" in
+    ''|0|0.0) ;;
+    *) sleep "$ETCE_BENCH_LATENCY" ;;
+esac
+if [ "%s" = docker ] && [ "$1" = inspect ]; then
+    echo 1
+fi
+case "$0" in
+    */nsenter) echo @ ;;
+esac
+exit 0
+'''
+
+
+class CallRecorder(object):
+    def __init__(self, latency=0.0):
+        self._latency = latency
+
+        self._lock = threading.Lock()
+
+        self._calls = {}
+
+
+    @property
+    def calls(self):
+        with self._lock:
+            return dict(self._calls)
+
+
+    def record(self, name):
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + 1
+
+        if self._latency:
+            time.sleep(self._latency)
+
+
+class FakePlatform(CallRecorder):
+    ''' etce.platform.Platform without side effects. Devices always
+    report as up and present, commands produce no output.
+    '''
+    def hostname(self):
+        self.record('hostname')
+
+        return socket.gethostname().split('.')[0].lower()
+
+
+    def isdeviceup(self, devicename):
+        self.record('isdeviceup')
+
+        return True
+
+
+    def runcommand(self, command):
+        self.record('runcommand')
+
+        return []
+
+
+    def getnetworkdevicenames(self):
+        self.record('getnetworkdevicenames')
+
+        return []
+
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self.record(name)
+
+        return call
+
+
+class FakeResult(object):
+    def __init__(self):
+        self.retval = {'result':'fake'}
+
+
+class FakeClient(object):
+    def __init__(self, recorder):
+        self._recorder = recorder
+
+
+    def put(self, src, dst, hosts, doclobber=False):
+        for _ in hosts:
+            self._recorder.record('put')
+
+
+    def execute(self, command, hosts):
+        results = {}
+
+        for host in hosts:
+            self._recorder.record('execute')
+
+            results[host] = FakeResult()
+
+        return results
+
+
+    def collect(self, *args):
+        self._recorder.record('collect')
+
+
+    def close(self):
+        pass
+
+
+class FakeClientBuilder(CallRecorder):
+    ''' etce.clientbuilder.ClientBuilder handing out clients that
+    record put and execute once per host instead of using ssh.
+    '''
+    def __call__(self):
+        return self
+
+
+    def build(self, hosts, **kwargs):
+        self.record('build')
+
+        return FakeClient(self)
+
+
+class FakeInterfaceWait(CallRecorder):
+    ''' etce.dockernetns.waitforinterface for containers that have no
+    network namespace.
+    '''
+    def __call__(self, pid, ifname, timeout=10.0, pollinterval=0.001):
+        start = time.time()
+
+        self.record('waitforinterface')
+
+        return time.time() - start
+
+
+def install_procsys(procsys):
+    ''' Write a /proc/sys stand-in holding the kernel parameters
+    generated plans set, at values the plans change.
+    '''
+    for name,value in FAKE_KERNEL_PARAMETERS:
+        filename = os.path.join(procsys, *name.split('.'))
+
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+
+        with open(filename, 'w') as fd:
+            fd.write(value + '\n')
+
+
+def install_commands(bindir):
+    ''' Write each fake command into bindir. '''
+    for command in FAKE_COMMANDS:
+        filename = os.path.join(bindir, command)
+
+        with open(filename, 'w') as fd:
+            fd.write(FAKE_COMMAND % (command, command))
+
+        os.chmod(filename, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP)
+
+
+def count_commands(logfile):
+    counts = {}
+
+    if os.path.exists(logfile):
+        with open(logfile) as fd:
+            for line in fd:
+                program = line.split('\t', 1)[0]
+
+                counts[program] = counts.get(program, 0) + 1
+
+    return counts
@@ -0,0 +1,228 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+''' Writes synthetic docker plan files for the benchmarks.
+
+    python genplan.py [options] planfile
+
+The plan is a pure function of the options, so the same options give
+the same file on every revision.
+'''
+
+import argparse
+import socket
+
+
+def generate(planfile,
+             hosts=1,
+             containers=100,
+             bridges=2,
+             interfaces=1,
+             templatedepth=1,
+             overlaylists=1,
+             overlaylistsize=100):
+    ''' Write a plan with hosts hosts, each with containers containers
+    over the given number of bridges. Containers are grouped into
+    <container> elements of overlaylistsize docker indices, each
+    element carrying overlaylists overlaylists of that length.
+
+    Each container has interfaces interfaces, one per bridge starting
+    with the control bridge br0 (10.99.0.0/16). Containers use the
+    deepest of a chain of templatedepth containertemplates.
+
+    A one host plan names the host "localhost", otherwise the first
+    host is this machine.
+    '''
+    interfaces = max(1, min(interfaces, bridges))
+
+    overlaylistsize = max(1, overlaylistsize)
+
+    lines = ['<dockerplan>']
+
+    if templatedepth:
+        lines.append('  <containertemplates>')
+
+        for level in range(templatedepth):
+            parent = ' parent="bench%d"' % (level - 1) if level else ''
+
+            lines.append('    <containertemplate name="bench%d"%s>' % (level, parent))
+            lines.append('      <parameters>')
+
+            if not level:
+                lines.append('        <parameter name="image" value="etce/bench:latest"/>')
+
+            lines.append('        <parameter name="--env=" value="LEVEL%d=${docker_index}"/>' % level)
+            lines.append('      </parameters>')
+            lines.append('      <interfaces>')
+            lines.append('        <interface bridge="br0" hosts_entry_ipv4="${docker_name}">')
+            lines.append('          <parameter name="level%d" value="${docker_name}"/>' % level)
+            lines.append('        </interface>')
+            lines.append('      </interfaces>')
+
+            if not level:
+                lines.append('      <initscript>')
+                lines.append('        echo ${docker_name} > /tmp/name')
+                lines.append('        ip link show')
+                lines.append('      </initscript>')
+
+            lines.append('    </containertemplate>')
+
+        lines.append('  </containertemplates>')
+
+    lines.append('  <hosts>')
+
+    index = 1
+
+    for host in range(hosts):
+        if hosts == 1:
+            hostname = 'localhost'
+        elif host == 0:
+            hostname = socket.gethostname().split('.')[0].lower()
+        else:
+            hostname = 'benchhost%d' % host
+
+        lines.append('    <host hostname="%s" ip="192.168.%d.%d">' % \
+                     (hostname, host // 250, host % 250 + 1))
+        lines.append('      <kernelparameters>')
+        lines.append('        <parameter name="net.ipv4.ip_forward" value="1"/>')
+        lines.append('      </kernelparameters>')
+        lines.append('      <bridges>')
+
+        for bridge in range(bridges):
+            lines.append('        <bridge name="br%d" persistent="false" subnet="10.%d.0.0/16"/>' % \
+                         (bridge, 99 + bridge))
+
+        lines.append('      </bridges>')
+        lines.append('      <containers>')
+
+        remaining = containers
+
+        while remaining > 0:
+            count = min(overlaylistsize, remaining)
+
+            lines.append('        <container docker_name="bench-${docker_index}" ' \
+                         'docker_indices="%d-%d"%s>' % \
+                         (index,
+                          index + count - 1,
+                          ' template="bench%d"' % (templatedepth - 1) if templatedepth else ''))
+            lines.append('          <overlays>')
+
+            for overlaylist in range(overlaylists):
+                lines.append('            <overlaylist name="list%d" values="%s"/>' % \
+                             (overlaylist,
+                              ','.join([ 'v%d' % (index + i) for i in range(count) ])))
+
+            # addresses come from overlaylists, the values are unique
+            # per host and bridge
+            for bridge in range(interfaces):
+                lines.append('            <overlaylist name="ipv4br%d" values="%s"/>' % \
+                             (bridge,
+                              ','.join([ '10.%d.%d.%d' % (99 + bridge,
+                                                          (index + i) // 250,
+                                                          (index + i) % 250 + 1)
+                                         for i in range(count) ])))
+
+            lines.append('          </overlays>')
+            lines.append('          <parameters>')
+
+            if not templatedepth:
+                lines.append('            <parameter name="image" value="etce/bench:latest"/>')
+
+            for overlaylist in range(overlaylists):
+                lines.append('            <parameter name="--label=" value="list%d=${list%d}"/>' % \
+                             (overlaylist, overlaylist))
+
+            lines.append('          </parameters>')
+            lines.append('          <interfaces>')
+
+            for bridge in range(interfaces):
+                lines.append('            <interface bridge="br%d">' % bridge)
+                lines.append('              <parameter name="ipv4" value="${ipv4br%d}"/>' % bridge)
+                lines.append('            </interface>')
+
+            lines.append('          </interfaces>')
+            lines.append('        </container>')
+
+            index += count
+
+            remaining -= count
+
+        lines.append('      </containers>')
+        lines.append('    </host>')
+
+    lines.append('  </hosts>')
+    lines.append('</dockerplan>')
+
+    with open(planfile, 'w') as fd:
+        fd.write('\n'.join(lines) + '\n')
+
+
+def add_arguments(parser):
+    parser.add_argument('--hosts', type=int, default=1,
+                        help='hosts in the plan. Default: 1')
+    parser.add_argument('--containers', type=int, default=100,
+                        help='containers per host. Default: 100')
+    parser.add_argument('--bridges', type=int, default=2,
+                        help='bridges per host. Default: 2')
+    parser.add_argument('--interfaces', type=int, default=1,
+                        help='interfaces per container. Default: 1')
+    parser.add_argument('--templatedepth', type=int, default=1,
+                        help='length of the containertemplate parent chain. Default: 1')
+    parser.add_argument('--overlaylists', type=int, default=1,
+                        help='overlaylists per container element. Default: 1')
+    parser.add_argument('--overlaylistsize', type=int, default=100,
+                        help='docker indices, and overlaylist values, per ' \
+                             'container element. Default: 100')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='genplan.py')
+
+    add_arguments(parser)
+
+    parser.add_argument('planfile')
+
+    args = parser.parse_args()
+
+    generate(args.planfile,
+             args.hosts,
+             args.containers,
+             args.bridges,
+             args.interfaces,
+             args.templatedepth,
+             args.overlaylists,
+             args.overlaylistsize)
+
+
+if __name__ == '__main__':
+    main()
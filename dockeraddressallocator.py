@@ -0,0 +1,202 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+from netaddr import IPAddress,IPNetwork,AddrFormatError
+
+from etce.dockererror import DOCKERError
+
+
+class AddressCollisionError(DOCKERError):
+    def __init__(self, address, owner, previous):
+        DOCKERError.__init__(self,
+                             'Address %s of %s is already used by %s. Quitting.' % \
+                             (address, owner, previous))
+
+        self.address = address
+
+        self.owner = owner
+
+        self.previous = previous
+
+
+class AddressAllocator(object):
+    ''' Tracks the addresses in use in one network.
+
+    The network is parsed once. Addresses in use are indexed by their
+    integer value, mapped to an owner name, so membership and
+    collision checks are constant time. Allocation hands out the
+    lowest free addresses, scanning forward from the lowest address
+    that may be free rather than from the start of the network.
+    '''
+    def __init__(self, cidr):
+        try:
+            self._network = IPNetwork(cidr)
+        except (AddrFormatError, ValueError) as e:
+            raise DOCKERError('Invalid network "%s": %s. Quitting.' % (cidr, e))
+
+        self._first = self._network.first
+
+        self._last = self._network.last
+
+        self._version = self._network.version
+
+        self._used = {}
+
+        # no address below this is free
+        self._cursor = self._first
+
+
+    @property
+    def network(self):
+        return self._network
+
+
+    @property
+    def prefixlen(self):
+        return self._network.prefixlen
+
+
+    @property
+    def size(self):
+        return self._last - self._first + 1
+
+
+    @property
+    def available(self):
+        return self.size - len(self._used)
+
+
+    def owner(self, address):
+        return self._used.get(self._value(address), None)
+
+
+    def reserve(self, address, owner=None):
+        ''' Mark address as used by owner. An address outside the
+        network raises DOCKERError and one already in use raises
+        AddressCollisionError.
+        '''
+        value = self._value(address)
+
+        if not self._first <= value <= self._last:
+            raise DOCKERError('Address %s of %s is not in network %s. Quitting.' % \
+                              (address, owner, self._network))
+
+        if value in self._used:
+            raise AddressCollisionError(address, owner, self._used[value])
+
+        self._used[value] = owner
+
+
+    def reserverange(self, first, last, owner=None):
+        ''' Mark every address from first to last inclusive as used. '''
+        firstvalue = max(self._value(first), self._first)
+
+        lastvalue = min(self._value(last), self._last)
+
+        for value in xrange(firstvalue, lastvalue + 1):
+            if value in self._used:
+                raise AddressCollisionError(self._address(value), owner, self._used[value])
+
+        for value in xrange(firstvalue, lastvalue + 1):
+            self._used[value] = owner
+
+
+    def release(self, address):
+        value = self._value(address)
+
+        self._used.pop(value, None)
+
+        self._cursor = min(self._cursor, value)
+
+
+    def allocate(self, owner=None):
+        ''' Return the lowest free address as a string, marked as used
+        by owner.
+        '''
+        return self.allocatemany(1, owner)[0]
+
+
+    def allocatemany(self, count, owner=None):
+        ''' Return the count lowest free addresses, in order, marked as
+        used by owner.
+        '''
+        if count > self.available:
+            raise DOCKERError('Cannot allocate %d addresses in network %s, %d are free. Quitting.' % \
+                              (count, self._network, self.available))
+
+        addresses = []
+
+        value = self._cursor
+
+        while len(addresses) < count:
+            if not value in self._used:
+                self._used[value] = owner
+
+                addresses.append(self._address(value))
+
+            value += 1
+
+        self._cursor = value
+
+        return addresses
+
+
+    def __contains__(self, address):
+        try:
+            return self._first <= self._value(address) <= self._last
+        except DOCKERError:
+            return False
+
+
+    def __len__(self):
+        return len(self._used)
+
+
+    def _value(self, address):
+        if isinstance(address, (int, long)):
+            return address
+
+        try:
+            address = IPAddress(address)
+        except (AddrFormatError, ValueError, TypeError) as e:
+            raise DOCKERError('Invalid address "%s": %s. Quitting.' % (address, e))
+
+        if not address.version == self._version:
+            raise DOCKERError('Address %s is not an IPv%d address. Quitting.' % \
+                              (address, self._version))
+
+        return address.value
+
+
+    def _address(self, value):
+        return str(IPAddress(value, self._version))
@@ -0,0 +1,363 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+import errno
+import httplib
+import json
+import socket
+import time
+import urllib
+import Queue
+
+from etce.dockererror import DOCKERError
+
+
+DEFAULT_SOCKET = '/var/run/docker.sock'
+
+
+class DockerAPIError(DOCKERError):
+    def __init__(self, operation, status, message):
+        DOCKERError.__init__(self,
+                             '%s failed with status %d: %s' % \
+                             (operation, status, message))
+
+        self.operation = operation
+
+        self.status = status
+
+        self.error = message
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    def __init__(self, socketpath, timeout):
+        httplib.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+
+        self._socketpath = socketpath
+
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        sock.settimeout(self.timeout)
+
+        sock.connect(self._socketpath)
+
+        self.sock = sock
+
+
+class DockerEngineClient(object):
+    ''' Minimal Docker Engine API client over the daemon unix socket.
+
+    Connections are HTTP/1.1 keep-alive and are returned to a pool
+    after each request so concurrent callers share a small set of
+    persistent connections. Non 2xx responses are raised as
+    DockerAPIError carrying the operation, status and the daemon's
+    error message.
+    '''
+    def __init__(self, socketpath=DEFAULT_SOCKET, version=None, maxconnections=16, timeout=60):
+        self._socketpath = socketpath
+
+        self._prefix = '/v%s' % version if version else ''
+
+        self._timeout = timeout
+
+        self._idle = Queue.LifoQueue(maxconnections)
+
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Queue.Empty:
+                break
+
+
+    def ping(self):
+        return self._request('GET', '/_ping', operation='ping')
+
+
+    def create_container(self, name, config):
+        return self._request('POST',
+                             '/containers/create',
+                             query={'name':name},
+                             body=config,
+                             operation='create container %s' % name)
+
+
+    def start_container(self, name):
+        self._request('POST',
+                      '/containers/%s/start' % name,
+                      operation='start container %s' % name)
+
+
+    def inspect_container(self, name):
+        return self._request('GET',
+                             '/containers/%s/json' % name,
+                             operation='inspect container %s' % name)
+
+
+    def list_containers(self, filters=None, all=True):
+        query = {'all':'1' if all else '0'}
+
+        if filters:
+            query['filters'] = json.dumps(filters)
+
+        return self._request('GET',
+                             '/containers/json',
+                             query=query,
+                             operation='list containers')
+
+
+    def remove_container(self, name, force=True):
+        self._request('DELETE',
+                      '/containers/%s' % name,
+                      query={'force':'1' if force else '0'},
+                      operation='remove container %s' % name)
+
+
+    def list_networks(self):
+        return self._request('GET', '/networks', operation='list networks')
+
+
+    def create_network(self, name, config):
+        config = dict(config, Name=name)
+
+        return self._request('POST',
+                             '/networks/create',
+                             body=config,
+                             operation='create network %s' % name)
+
+
+    def remove_network(self, name):
+        self._request('DELETE',
+                      '/networks/%s' % name,
+                      operation='remove network %s' % name)
+
+
+    def connect_network(self, network, container, ipv4=None):
+        endpointconfig = {}
+
+        if ipv4:
+            endpointconfig['IPAMConfig'] = {'IPv4Address':ipv4}
+
+        self._request('POST',
+                      '/networks/%s/connect' % network,
+                      body={'Container':container,
+                            'EndpointConfig':endpointconfig},
+                      operation='connect %s to network %s' % (container, network))
+
+
+    def disconnect_network(self, network, container, force=True):
+        self._request('POST',
+                      '/networks/%s/disconnect' % network,
+                      body={'Container':container,
+                            'Force':force},
+                      operation='disconnect %s from network %s' % (container, network))
+
+
+    def pull_image(self, image, tag='latest'):
+        ''' Pull image:tag. The daemon answers with a stream of JSON
+        progress objects, one per line, and reports a failed pull as an
+        object with an "error" key inside a 200 response, so the stream
+        is read through to its end.
+        '''
+        operation = 'pull image %s:%s' % (image, tag)
+
+        def progress(response):
+            for line in readlines(response):
+                if not line.strip():
+                    continue
+
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+
+                if 'error' in message:
+                    raise DockerAPIError(operation, response.status, message['error'])
+
+        self._request('POST',
+                      '/images/create',
+                      query={'fromImage':image, 'tag':tag},
+                      operation=operation,
+                      consume=progress)
+
+
+    def execute(self, container, cmd, pollinterval=0.01, timeout=60):
+        ''' Run cmd (an argument list) in container and return its exit code. '''
+        operation = 'exec in container %s' % container
+
+        execid = self._request('POST',
+                               '/containers/%s/exec' % container,
+                               body={'Cmd':cmd,
+                                     'AttachStdout':False,
+                                     'AttachStderr':False},
+                               operation=operation)['Id']
+
+        self._request('POST',
+                      '/exec/%s/start' % execid,
+                      body={'Detach':True},
+                      operation=operation)
+
+        deadline = time.time() + timeout
+
+        while True:
+            state = self._request('GET',
+                                  '/exec/%s/json' % execid,
+                                  operation=operation)
+
+            if not state['Running'] and state['ExitCode'] is not None:
+                return state['ExitCode']
+
+            if time.time() > deadline:
+                raise DockerAPIError(operation, 0, 'timed out after %ds' % timeout)
+
+            time.sleep(pollinterval)
+
+
+    def _request(self, method, path, query=None, body=None, operation=None, consume=None):
+        ''' Issue one request and return its decoded body. consume,
+        when given, reads the body of a successful response itself and
+        None is returned.
+        '''
+        url = self._prefix + urllib.quote(path)
+
+        if query:
+            url += '?' + urllib.urlencode(query)
+
+        headers = {}
+
+        if body is not None:
+            body = json.dumps(body)
+
+            headers['Content-Type'] = 'application/json'
+
+        operation = operation or '%s %s' % (method, path)
+
+        # a pooled connection may have been closed by the daemon while
+        # idle, retry once on a fresh connection when that happens
+        for attempt in range(2):
+            conn,reused = self._acquire()
+
+            try:
+                conn.request(method, url, body, headers)
+
+                response = conn.getresponse()
+
+                if consume and response.status < 300:
+                    consume(response)
+
+                    data = None
+                else:
+                    data = response.read()
+            except (httplib.HTTPException, socket.error) as e:
+                conn.close()
+
+                if reused and attempt == 0 and self._isstale(e):
+                    continue
+
+                raise DockerAPIError(operation, 0, str(e))
+            except DockerAPIError:
+                # the rest of the body is left unread
+                conn.close()
+
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+
+            break
+
+        if response.status >= 300 and not response.status == 304:
+            raise DockerAPIError(operation, response.status, self._errormessage(data))
+
+        if not data:
+            return None
+
+        if response.getheader('Content-Type', '').startswith('application/json'):
+            try:
+                return json.loads(data)
+            except ValueError as e:
+                raise DockerAPIError(operation, response.status, 'invalid JSON response: %s' % e)
+
+        return data
+
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait(),True
+        except Queue.Empty:
+            return UnixHTTPConnection(self._socketpath, self._timeout),False
+
+
+    def _release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except Queue.Full:
+            conn.close()
+
+
+    def _isstale(self, error):
+        if isinstance(error, httplib.BadStatusLine):
+            return True
+
+        return getattr(error, 'errno', None) in (errno.EPIPE, errno.ECONNRESET)
+
+
+    def _errormessage(self, data):
+        try:
+            return json.loads(data)['message']
+        except (ValueError, KeyError, TypeError):
+            return data.strip()
+
+
+def readlines(response, size=8192):
+    ''' The lines of the body of response, as they arrive. '''
+    pending = ''
+
+    while True:
+        data = response.read(size)
+
+        if not data:
+            break
+
+        lines = (pending + data).split('\n')
+
+        pending = lines.pop()
+
+        for line in lines:
+            yield line
+
+    if pending:
+        yield pending
@@ -0,0 +1,221 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import Queue
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+
+class HostResult(object):
+    ''' The outcome of one host's pipeline. error is None on success,
+    timedout is set when the host did not finish in time.
+    '''
+    def __init__(self, host, result, error, seconds, timedout=False):
+        self.host = host
+
+        self.result = result
+
+        self.error = error
+
+        self.seconds = seconds
+
+        self.timedout = timedout
+
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class HostFanout(object):
+    ''' Runs a pipeline of steps on many hosts at once.
+
+    Each host gets its own client from connect(host) and runs
+    pipeline(client, host) on it, so a host moves from one step to
+    the next without waiting for the other hosts. Up to maxhosts hosts
+    run at the same time. Results are yielded in completion order. A
+    host still running timeout seconds after it started is reported as
+    timed out, and its late result is dropped.
+    '''
+    def __init__(self, connect, maxhosts=8, timeout=None):
+        self._connect = connect
+
+        self._maxhosts = max(1, maxhosts)
+
+        self._timeout = timeout
+
+
+    def run(self, hosts, pipeline):
+        hosts = list(hosts)
+
+        if not hosts:
+            return
+
+        results = Queue.Queue()
+
+        # host -> time its pipeline started, written by the workers
+        started = {}
+
+        pool = ThreadPool(min(self._maxhosts, len(hosts)))
+
+        for host in hosts:
+            pool.apply_async(self._runhost, (host, pipeline, started, results))
+
+        pool.close()
+
+        outstanding = set(hosts)
+
+        try:
+            while outstanding:
+                try:
+                    result = results.get(timeout=self._wait(started, outstanding))
+                except Queue.Empty:
+                    for result in self._expired(started, outstanding):
+                        outstanding.discard(result.host)
+
+                        yield result
+
+                    continue
+
+                if result.host in outstanding:
+                    outstanding.discard(result.host)
+
+                    yield result
+        finally:
+            # workers of timed out hosts are left to finish on their own
+            if not outstanding and not self._timeout:
+                pool.join()
+
+
+    def _runhost(self, host, pipeline, started, results):
+        start = time.time()
+
+        started[host] = start
+
+        client = None
+
+        try:
+            client = self._connect(host)
+
+            result = pipeline(client, host)
+
+            results.put(HostResult(host, result, None, time.time() - start))
+        except Exception as e:
+            results.put(HostResult(host, None, str(e) or e.__class__.__name__, time.time() - start))
+        finally:
+            if client:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+
+
+    def _wait(self, started, outstanding):
+        if not self._timeout:
+            return None
+
+        deadlines = [ started[host] + self._timeout
+                      for host in outstanding if host in started ]
+
+        if not deadlines:
+            # nothing running yet, look again shortly
+            return 0.1
+
+        return max(0.0, min(deadlines) - time.time())
+
+
+    def _expired(self, started, outstanding):
+        now = time.time()
+
+        return [ HostResult(host,
+                            None,
+                            'timed out after %ds' % self._timeout,
+                            now - started[host],
+                            timedout=True)
+                 for host in sorted(outstanding)
+                 if host in started and now - started[host] >= self._timeout ]
+
+
+def report(results):
+    ''' Print each host's result as it arrives and return the hosts
+    that failed.
+    '''
+    failed = []
+
+    for result in results:
+        if result.ok:
+            print '[%s] return: %s (%.1fs)' % (result.host, result.result, result.seconds)
+        else:
+            print '[%s] failed: %s' % (result.host, result.error)
+
+            failed.append(result.host)
+
+        sys.stdout.flush()
+
+    return failed
+
+
+class BackgroundCall(object):
+    ''' Runs function(*args) on its own thread. wait() returns its
+    result or raises what it raised.
+    '''
+    def __init__(self, function, *args):
+        self._result = None
+
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, args=(function, args))
+
+        self._thread.daemon = True
+
+        self._thread.start()
+
+
+    def wait(self):
+        # join with a timeout so the wait stays interruptible
+        while self._thread.is_alive():
+            self._thread.join(1.0)
+
+        if self._error:
+            raise self._error[0], self._error[1], self._error[2]
+
+        return self._result
+
+
+    def _run(self, function, args):
+        try:
+            self._result = function(*args)
+        except BaseException:
+            self._error = sys.exc_info()
@@ -35,20 +35,86 @@ import argparse
 import os
 import shutil
 import sys
-from netaddr import IPNetwork, IPAddress
+import time
 
 from etce.clientbuilder import ClientBuilder
 from etce.config import ConfigDictionary
+from etce.dockeraddressallocator import AddressAllocator
 from etce.dockererror import DOCKERError
-from etce.dockermanager import startdockers,stopdockers
+from etce.dockerfanout import BackgroundCall,HostFanout,report
+from etce.dockermanager import startdockers,stopdockers,startmetrics,recordrun,finishmetrics
+from etce.dockermanager import writecontainerhosts
+from etce.dockermetrics import METRICS
 from etce.dockerplanfiledoc import DOCKERPlanFileDoc
+from etce.dockerplanslice import DOCKERPlanSlice
+from etce.dockertrace import TRACER,span
 from etce.platform import Platform
+import etce.dockerhostsfile
+import etce.dockertrace
 import etce.utils
 from etce.parserpl import RFMatrix
 from etce.field import Field
 
 
 def startfield(args):
+    fieldcommand(_startfield, 'startfield', args)
+
+
+def stopfield(args):
+    fieldcommand(_stopfield, 'stopfield', args)
+
+
+def fieldcommand(function, command, args):
+    ''' Run function(args, remotetraces) as command, recording its
+    metrics and, with --trace, writing its spans and those returned by
+    the remote hosts into one trace.
+    '''
+    metering = startmetrics()
+
+    started = time.time()
+
+    ok = False
+
+    remotetraces = None
+
+    if args.trace:
+        TRACER.enable(Platform().hostname())
+
+        remotetraces = []
+
+    try:
+        with span(command):
+            function(args, remotetraces)
+
+        ok = True
+    finally:
+        recordrun(command, started, ok)
+
+        if metering:
+            finishmetrics(args.textfiledir)
+
+        if args.trace:
+            TRACER.disable()
+
+            etce.dockertrace.write(args.trace,
+                                   etce.dockertrace.merge([ TRACER.events() ] + remotetraces))
+
+            print 'Trace of %d hosts written to %s' % (len(remotetraces) + 1, args.trace)
+
+
+def remoteresult(result, remotetraces):
+    ''' A remote host returns its trace events in place of a result
+    when tracing.
+    '''
+    if remotetraces is not None and isinstance(result, list):
+        remotetraces.append(result)
+
+        return '%d trace events' % len(result)
+
+    return result
+
+
+def _startfield(args, remotetraces):
     this_hostname = Platform().hostname()
 
     config = ConfigDictionary()
@@ -66,41 +132,41 @@ def startfield(args):
     else:
         dockerplanfile = os.path.join(workdir, 'dockerplan.xml')
 
-    plandoc = DOCKERPlanFileDoc(dockerplanfile)
+    plandoc = DOCKERPlanFileDoc(dockerplanfile, stream=args.stream)
 
     # lockfile
     lockfilename = \
         os.path.join(workdir, 'etce.docker.lock')
 
-    if os.path.isfile(lockfilename):
+    if os.path.isfile(lockfilename) and not args.reconcile:
         err = 'Detected an active docker field with root at: %s. ' \
               'Run "etce-docker stop" first.' % \
               plandoc.docker_root_directory(this_hostname)
         raise DOCKERError(err)
 
     cidr = os.getenv('CIDR', '10.99.0.0/16')
-    containers = []
-    for hostname,_ in plandoc.hostnames():
-        for container in plandoc.containers(hostname):
-            for bridgename, interfaceparams in container.interfaces.items():
-                if IPAddress(interfaceparams['ipv4']) in IPNetwork(cidr):
-                    containers.append((container.docker_name, interfaceparams['ipv4']))
-                    break
 
+    # control network addresses in use, the network address is never
+    # handed out
+    allocator = AddressAllocator(cidr)
+
+    allocator.reserve(allocator.network.first, 'the network')
 
-        ipexist = []
-    for _,ip in containers:
-        ipexist.append(ip)
-    my_ip = ''
-    for ip in IPNetwork(cidr)[1:]:
-        if not str(ip) in ipexist:
-            my_ip = str(ip)
-            break
+    containers = []
+    with span('addresses'):
+        for hostname,_ in plandoc.hostnames():
+            for container in plandoc.containers(hostname):
+                for bridgename, interfaceparams in container.interfaces.items():
+                    if interfaceparams['ipv4'] in allocator:
+                        allocator.reserve(interfaceparams['ipv4'], container.docker_name)
+                        containers.append((container.docker_name, interfaceparams['ipv4']))
+                        break
 
-    my_ip = my_ip + '/' + cidr.split('/')[1]
+        my_ip = allocator.allocate(this_hostname) + '/' + str(allocator.prefixlen)
 
     # write to /etc/hosts in container/machine controller all external ip
-    writehosts(plandoc, containers)
+    with span('writehosts'):
+        writehosts(plandoc, containers)
 
     hostfile = \
         os.path.join(workdir, 'hosts')
@@ -109,72 +175,115 @@ def startfield(args):
         shutil.copy(dockerplanfile, lockfilename)
         shutil.copy('/etc/hosts', hostfile)
 
-    startdockers(plandoc,
-                 args.writehosts,
-                 args.forcedockerroot,
-                 args.dryrun)
+    other_hosts = remotehosts(plandoc, this_hostname)
+
+    # the other hosts are sent /etc/hosts as the local start leaves it.
+    # That start runs alongside them and with --writehosts rewrites the
+    # file, so the local containers' block is written here first and the
+    # local start finds the file already up to date
+    if args.writehosts and not args.dryrun:
+        with span('writecontainerhosts'):
+            writecontainerhosts(plandoc.containers(this_hostname))
+
+    # the local containers start while the other hosts are contacted
+    local = BackgroundCall(startdockers,
+                           plandoc,
+                           args.writehosts,
+                           args.forcedockerroot,
+                           args.dryrun,
+                           args.parallel,
+                           args.runtime,
+                           args.attach,
+                           args.netlink,
+                           args.reconcile)
 
-    other_hosts = []
+    # start containers on other hosts, if any
+    if not other_hosts:
+        local.wait()
 
-    for hostname,ip in plandoc.hostnames():
-        if hostname != (this_hostname and 'localhost'):
-            other_hosts.append(hostname)
+        return
 
-    # start containers on other hosts, if any
-    if other_hosts:
-        client = None
-        try:
-            client = ClientBuilder().build(\
-                        other_hosts,
-                        user=args.user,
-                        port=args.port,
-                        password=args.password)
+    failed = list(other_hosts)
+
+    try:
+        slicedir = makeslicedir(workdir, args.slices)
 
-            # push the file and execute
-            client.put(dockerplanfile, '.', other_hosts, doclobber=True)
+        def pipeline(client, host):
+            planfile = dockerplanfile
 
-            # push the file
-            client.put('/etc/hosts', '.', other_hosts, doclobber=True)
+            if slicedir:
+                planfile = os.path.join(slicedir, host + DOCKERPlanSlice.SUFFIX)
+
+                with span('writeslice', host=host):
+                    DOCKERPlanSlice.write(plandoc, host, planfile)
+
+            # push the files and execute
+            with span('put', host=host), \
+                 METRICS.timer('etce_docker_command_seconds', tool='ssh', operation='put'):
+                client.put(planfile, '.', [host], doclobber=True)
+
+                client.put('/etc/hosts', '.', [host], doclobber=True)
 
             # on the destination node the netplan file gets pushed to the
             # ETCE WORK_DIRECTORY
-            command = 'dockermanager startdockers %s writehosts=%s forcedockerroot=%s' \
-                      % (os.path.basename(dockerplanfile),
+            command = 'dockermanager startdockers %s writehosts=%s forcedockerroot=%s ' \
+                      'parallel=%d runtime=%s attach=%s netlink=%s reconcile=%s trace=%s' \
+                      % (os.path.basename(planfile),
                          args.writehosts,
-                         args.forcedockerroot)
+                         args.forcedockerroot,
+                         args.parallel,
+                         args.runtime,
+                         args.attach,
+                         args.netlink,
+                         args.reconcile,
+                         bool(args.trace))
 
-            ret = client.execute(command,
-                                 other_hosts)
+            if args.textfiledir:
+                command += ' textfiledir=%s' % args.textfiledir
 
-            for k in ret:
-                print '[%s] return: %s' % (k, ret[k].retval['result'])
+            with span('execute', host=host), \
+                 METRICS.timer('etce_docker_command_seconds', tool='ssh', operation='execute'):
+                result = client.execute(command, [host])[host].retval['result']
 
-        finally:
-            if client:
-                client.close()
+            return remoteresult(result, remotetraces)
 
-                # A valid ETCE Test Directory.
-                TESTDIRECTORY = os.path.join(workdir, 'pub-tdmact')
+        fanout = HostFanout(connector(args), args.maxhosts, args.hosttimeout)
 
-                # The output directory to place the built Test Directory.
-                TESTROOT = os.path.join(workdir, TESTDIRECTORY + '_' + etce.utils.timestamp())
+        failed = report(fanout.run(other_hosts, pipeline))
 
-                os.system('etce-test publish %s %s --verbose' %
-                          (TESTDIRECTORY, TESTROOT))
+        METRICS.inc('etce_docker_hosts_failed_total', len(failed), command='startfield')
+    finally:
+        local.wait()
 
-                # A user tag to prepend to the name of each test result directory.
-                TESTPREFIX = 'tdmact'
-                # Run scenario order steps
-                #if not args.collect:
-                os.system('etce-test run --user root --policy autoadd -v --kill before --nocollect %s %s %s' %
-                          (TESTPREFIX, HOSTFILE, TESTROOT))
-                #else:
-                #    os.system('etce-test run --user root --policy autoadd -v %s %s %s' %
-                #              (TESTPREFIX, HOSTFILE, TESTROOT))
+    if len(failed) < len(other_hosts):
+        # A valid ETCE Test Directory.
+        TESTDIRECTORY = os.path.join(workdir, 'pub-tdmact')
 
+        # The output directory to place the built Test Directory.
+        TESTROOT = os.path.join(workdir, TESTDIRECTORY + '_' + etce.utils.timestamp())
 
+        os.system('etce-test publish %s %s --verbose' %
+                  (TESTDIRECTORY, TESTROOT))
 
-def stopfield(args):
+        # A user tag to prepend to the name of each test result directory.
+        TESTPREFIX = 'tdmact'
+
+        # The hosts the test runs on, as stopfield reads them.
+        HOSTFILE = os.path.join(workdir, 'HOSTFILE')
+        # Run scenario order steps
+        #if not args.collect:
+        os.system('etce-test run --user root --policy autoadd -v --kill before --nocollect %s %s %s' %
+                  (TESTPREFIX, HOSTFILE, TESTROOT))
+        #else:
+        #    os.system('etce-test run --user root --policy autoadd -v %s %s %s' %
+        #              (TESTPREFIX, HOSTFILE, TESTROOT))
+
+    if failed:
+        raise DOCKERError('Failed to start containers on %s. Quitting.' %
+                          ', '.join(sorted(failed)))
+
+
+def _stopfield(args, remotetraces):
     workdir = ConfigDictionary().get('etce', 'WORK_DIRECTORY')
 
     workdir = os.getenv('WORKDIR', workdir)
@@ -189,16 +298,14 @@ def stopfield(args):
     else:
         dockerplanfile = os.path.join(workdir, 'dockerplan.xml')
 
-    plandoc = DOCKERPlanFileDoc(dockerplanfile)
+    plandoc = DOCKERPlanFileDoc(dockerplanfile, stream=args.stream)
 
     this_hostname = Platform().hostname()
 
-    other_hosts = []
+    other_hosts = remotehosts(plandoc, this_hostname)
+
+    local = None
 
-    for hostname,ip in plandoc.hostnames():
-        if hostname != (this_hostname and 'localhost'):
-            other_hosts.append(hostname)
-    
     # stop containers on other hosts, if any
     try:
         if other_hosts:
@@ -236,72 +343,104 @@ def stopfield(args):
                     if client_nodes:
                         client_nodes.close()
 
-            client = None
-            try:
-                client = ClientBuilder().build(other_hosts,
-                                               user=args.user,
-                                               port=args.port,
-                                               password=args.password)
+            # the local containers stop while the other hosts are
+            # contacted, once their results are collected
+            local = BackgroundCall(stopdockers, plandoc, args.runtime, args.parallel, args.netlink)
+
+            slicedir = makeslicedir(workdir, args.slices)
+
+            def pipeline(client, host):
+                planfile = dockerplanfile
 
                 # push the file and execute
-                client.put(lockfilename, '.', other_hosts, doclobber=True)
+                with span('put', host=host), \
+                     METRICS.timer('etce_docker_command_seconds', tool='ssh', operation='put'):
+                    client.put(lockfilename, '.', [host], doclobber=True)
+
+                    if slicedir:
+                        planfile = os.path.join(slicedir, host + DOCKERPlanSlice.SUFFIX)
+
+                        DOCKERPlanSlice.write(plandoc, host, planfile)
+
+                        client.put(planfile, '.', [host], doclobber=True)
+
                 # on the destination node the netplan file gets pushed to the
                 # ETCE WORK_DIRECTORY
-                command = 'dockermanager stopdockers %s' % os.path.basename(dockerplanfile)
+                command = 'dockermanager stopdockers %s runtime=%s parallel=%d netlink=%s trace=%s' % \
+                          (os.path.basename(planfile),
+                           args.runtime,
+                           args.parallel,
+                           args.netlink,
+                           bool(args.trace))
+
+                if args.textfiledir:
+                    command += ' textfiledir=%s' % args.textfiledir
+
+                with span('execute', host=host), \
+                     METRICS.timer('etce_docker_command_seconds', tool='ssh', operation='execute'):
+                    result = client.execute(command, [host])[host].retval['result']
+
+                return remoteresult(result, remotetraces)
+
+            fanout = HostFanout(connector(args), args.maxhosts, args.hosttimeout)
 
-                ret = client.execute(command, other_hosts)
+            failed = report(fanout.run(other_hosts, pipeline))
 
-                for k in ret:
-                    print '[%s] return: %s' % (k, ret[k].retval['result'])
-            finally:
-                if client:
-                    client.close()
+            METRICS.inc('etce_docker_hosts_failed_total', len(failed), command='stopfield')
+
+            if failed:
+                raise DOCKERError('Failed to stop containers on %s. Quitting.' %
+                                  ', '.join(sorted(failed)))
 
     finally:
  #       os.system('ip link del vxlan1')
-        stopdockers(plandoc)
+        if local:
+            local.wait()
+        else:
+            stopdockers(plandoc, args.runtime, args.parallel, args.netlink)
         os.system('rm -f %s' % lockfilename)
 
-def writehosts(plandoc, containers):
-    opentag = '#### Start auto-generated ETCE control mappings\n'
-    closetag = '#### Stop auto-generated ETCE control mappings\n'
-    etcehostlines = []
-    searchstate = 0
-    for line in open('/etc/hosts', 'r'):
-        if searchstate == 0:
-          if line.startswith(opentag):
-                searchstate = 1
-          else:
-                etcehostlines.append(line)
-        elif searchstate == 1:
-            if line.startswith(closetag):
-                searchstate == 2
-        else:
-            etcehostlines.append(line)
 
-    # strip off trailing white spaces
-    etcehostlines.reverse()
-    for i, line in enumerate(etcehostlines):
-        if len(line.strip()) > 0:
-            etcehostlines = etcehostlines[i:]
-            break
-    etcehostlines.reverse()
+def remotehosts(plandoc, this_hostname):
+    ''' The plan hosts other than this one, those the fan-out
+    contacts. This host's containers are started and stopped locally.
+    '''
+    return [ hostname for hostname,_ in plandoc.hostnames()
+             if not hostname in (this_hostname.lower(), 'localhost') ]
+
+
+def makeslicedir(workdir, slices):
+    ''' Returns the directory plan slices are written to, or None
+    when the whole plan file is sent.
+    '''
+    if not slices:
+        return None
+
+    slicedir = os.path.join(workdir, 'slices')
+
+    if not os.path.isdir(slicedir):
+        os.makedirs(slicedir)
+
+    return slicedir
+
 
-    with open('/etc/hosts', 'w') as ofd:
-        for line in etcehostlines:
-           ofd.write(line)
+def connector(args):
+    ''' Returns a function building a client for one host. '''
+    def connect(host):
+        return ClientBuilder().build([host],
+                                     user=args.user,
+                                     port=args.port,
+                                     password=args.password)
 
-        ofd.write('\n')
-        ofd.write(opentag)
+    return connect
 
-        for hostname, ip in plandoc.hostnames():
-            ofd.write('%s %s\n' % (ip, hostname))
+def writehosts(plandoc, containers):
+    entries = [ (ip, hostname) for hostname,ip in plandoc.hostnames() ]
 
-        # ipv4
-        for hostentry, hostaddr in sorted(containers):
-            ofd.write('%s %s\n' % (hostaddr, hostentry))
+    # ipv4
+    entries.extend([ (hostaddr, hostentry) for hostentry,hostaddr in sorted(containers) ])
 
-        ofd.write(closetag)
+    etce.dockerhostsfile.writehosts(entries)
 
 def createhostfile(containers, HOSTFILE):
     with open(HOSTFILE, 'w') as f:
@@ -339,6 +478,66 @@ def main():
                         help='''Specify the policy to use when a target
                         host is not listed in the local "known_hosts" file.
                         Default: reject''')
+    parser.add_argument('--runtime',
+                        action='store',
+                        choices=['cli', 'api'],
+                        default='cli',
+                        help='''How container operations reach the docker daemon.
+                        "cli" runs the docker command line for each operation,
+                        "api" talks to the Docker Engine API over
+                        /var/run/docker.sock on pooled connections.
+                        Default: cli''')
+    parser.add_argument('--stream',
+                        action='store_true',
+                        default=False,
+                        help='''Read the DOCKERPLANFILE one host at a time,
+                        releasing each host's XML once it is expanded, so
+                        memory tracks the largest host rather than the
+                        whole file. Default: no''')
+
+    parser.add_argument('--slices',
+                        action='store_true',
+                        default=False,
+                        help='''Send each remote host only its own part of the
+                        expanded plan, compiled once here, instead of the
+                        whole DOCKERPLANFILE for it to parse and expand
+                        again. Default: no''')
+    parser.add_argument('--trace',
+                        metavar='TRACEFILE',
+                        action='store',
+                        default=None,
+                        help='''Record how long each step of the command takes,
+                        on this host and on every remote host, and write
+                        them as one timeline to TRACEFILE in Chrome trace
+                        event format, viewable in chrome://tracing or
+                        Perfetto. Each remote host also keeps its own
+                        trace in its ETCE WORK_DIRECTORY.''')
+    parser.add_argument('--textfiledir',
+                        metavar='DIRECTORY',
+                        action='store',
+                        default=None,
+                        help='''Also write the metrics of the command, on this
+                        host and on every remote host, in Prometheus text
+                        format to etce_docker.prom in DIRECTORY, the
+                        directory a node exporter textfile collector reads.
+                        Metrics are always kept as JSON in
+                        etce.docker.metrics.json next to the lock file in
+                        the ETCE WORK_DIRECTORY. Default: none''')
+    parser.add_argument('--maxhosts',
+                        action='store',
+                        type=int,
+                        default=8,
+                        help='''If the DOCKERPLANFILE contains remote host(s),
+                        work on up to MAXHOSTS of them at once. Each host is
+                        sent its files and run as soon as it is reached, and
+                        its result is printed when it finishes. Default: 8''')
+    parser.add_argument('--hosttimeout',
+                        action='store',
+                        type=float,
+                        default=None,
+                        help='''Report a remote host as failed when it has not
+                        finished HOSTTIMEOUT seconds after it was reached.
+                        Default: no timeout''')
 
     subparsers = parser.add_subparsers()
 
@@ -364,6 +563,42 @@ def main():
                               DOCKERPLANFILE that contain a hosts_entry_ipv4 or hosts_entry_ipv6 
                               attribute. The has form "ipv4 hosts_entry_ipv4" or
                               "ipv6 hosts_entry_ipv6".''')
+    parser_start.add_argument('--parallel',
+                              action='store',
+                              type=int,
+                              default=1,
+                              help='''Start up to PARALLEL containers at once on each
+                              host. Each container's run and network attach steps
+                              are still issued in order. Default: 1.''')
+    parser_start.add_argument('--attach',
+                              action='store',
+                              choices=['connect', 'create'],
+                              default='connect',
+                              help='''How container interfaces are attached. "connect"
+                              starts each container without networking and then
+                              connects each interface. "create" declares every
+                              interface and its address when the container is
+                              created and starts it once; this needs a docker
+                              daemon that accepts multiple networks at create
+                              time (API 1.44 or later). Interfaces are named
+                              eth0..ethN in plan order in both modes.
+                              Default: connect''')
+    parser_start.add_argument('--netlink',
+                              action='store_true',
+                              default=False,
+                              help='''Build the linux bridges and vxlan tunnels of each
+                              host in batched netlink requests, then register
+                              each bridge as a docker network.''')
+    parser_start.add_argument('--reconcile',
+                              action='store_true',
+                              default=False,
+                              help='''Bring a running field in line with the plan
+                              instead of starting it from scratch. Keeps the
+                              docker root directory, creates missing bridges and
+                              containers, recreates only containers whose
+                              configuration, parameters or initscript changed
+                              or that are not running, and removes containers
+                              of the field no longer in the plan.''')
     parser_start.add_argument('--runsteps',
                               action='store_true',
                               default=False,
@@ -387,6 +622,18 @@ def main():
                               help='''On test completion, make the collection step that 
                               retrieves test data from the field nodes to the localhost.
                               Default: no collect.''')
+    parser_stop.add_argument('--parallel',
+                              action='store',
+                              type=int,
+                              default=1,
+                              help='''Remove containers in up to PARALLEL concurrent
+                              batches on each host. Default: 1.''')
+    parser_stop.add_argument('--netlink',
+                              action='store_true',
+                              default=False,
+                              help='''Remove the bridges' docker networks in one call
+                              and delete the linux bridges and vxlan tunnels in
+                              one netlink batch.''')
     parser_stop.add_argument('dockerplanfile',
                               metavar='DOCKERPLANFILE',
                               action='store',
@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import errno
+import hashlib
+import os
+import stat
+import tempfile
+
+
+HOSTSFILE = '/etc/hosts'
+
+OPENTAG = '#### Start auto-generated ETCE control mappings\n'
+
+CLOSETAG = '#### Stop auto-generated ETCE control mappings\n'
+
+
+def hostsblock(entries):
+    ''' The managed block for entries, an iterable of (address, name)
+    pairs written in the order given.
+    '''
+    return ''.join([ OPENTAG ] +
+                   [ '%s %s\n' % (address, name) for address,name in entries ] +
+                   [ CLOSETAG ])
+
+
+def unmanagedlines(content):
+    ''' The lines of hosts file content outside the managed block,
+    without trailing blank lines.
+    '''
+    lines = []
+
+    searchstate = 0
+
+    for line in content.splitlines(True):
+        if searchstate == 0:
+            if line.startswith(OPENTAG):
+                searchstate = 1
+            else:
+                lines.append(line)
+        elif searchstate == 1:
+            if line.startswith(CLOSETAG):
+                searchstate = 2
+        else:
+            lines.append(line)
+
+    while lines and not lines[-1].strip():
+        lines.pop()
+
+    return lines
+
+
+def writehosts(entries, hostsfile=HOSTSFILE):
+    ''' Replace the managed block of hostsfile with entries, keeping
+    every other line. The file is left alone when its content would
+    not change, otherwise it is replaced in one rename so readers never
+    see it partly written. Returns True when the file was written.
+    '''
+    try:
+        with open(hostsfile, 'r') as hostsf:
+            current = hostsf.read()
+    except IOError as e:
+        if not e.errno == errno.ENOENT:
+            raise
+
+        current = None
+
+    lines = unmanagedlines(current or '')
+
+    content = ''.join(lines + [ '\n', hostsblock(entries) ])
+
+    if current is not None and \
+       hashlib.sha1(current).digest() == hashlib.sha1(content).digest():
+        return False
+
+    hostsdir = os.path.dirname(os.path.abspath(hostsfile))
+
+    fd,tmpname = tempfile.mkstemp(prefix='.hosts.', dir=hostsdir)
+
+    try:
+        with os.fdopen(fd, 'w') as tmpf:
+            tmpf.write(content)
+
+            tmpf.flush()
+
+            os.fsync(tmpf.fileno())
+
+        if current is not None:
+            st = os.stat(hostsfile)
+
+            os.chmod(tmpname, stat.S_IMODE(st.st_mode))
+
+            try:
+                os.chown(tmpname, st.st_uid, st.st_gid)
+            except OSError:
+                pass
+        else:
+            os.chmod(tmpname, 0644)
+
+        try:
+            os.rename(tmpname, hostsfile)
+        except OSError as e:
+            # a bind mounted file, as /etc/hosts is inside a container,
+            # cannot be replaced, only rewritten in place
+            if not e.errno in (errno.EBUSY, errno.EXDEV):
+                raise
+
+            with open(hostsfile, 'w') as hostsf:
+                hostsf.write(content)
+    finally:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+    return True
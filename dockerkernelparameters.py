@@ -0,0 +1,221 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import errno
+import json
+import os
+
+
+PROCSYS = '/proc/sys'
+
+
+class KernelParameterReport(object):
+    ''' What one apply or restore did. changed holds (name, old, new),
+    unchanged the names already at their value and failed (name,
+    reason).
+    '''
+    def __init__(self):
+        self.changed = []
+
+        self.unchanged = []
+
+        self.failed = []
+
+
+    def show(self, title):
+        if not (self.changed or self.unchanged or self.failed):
+            return
+
+        print title
+
+        for name,old,new in self.changed:
+            print '  %s = %s (was %s)' % (name, new, old)
+
+        if self.unchanged:
+            print '  %d already set' % len(self.unchanged)
+
+        for name,reason in self.failed:
+            print '  %s failed: %s' % (name, reason)
+
+
+class KernelParameters(object):
+    ''' Reads and writes sysctl values directly under /proc/sys.
+
+    apply() reads every requested value first and writes only those
+    that differ. The values it replaced are recorded in a save file,
+    and restore() puts back each one that still holds the value this
+    field set, leaving values someone else changed since alone.
+    '''
+    # suffix of the file, beside the docker root directory, holding the
+    # values a start replaced
+    SAVEFILE = 'kernelparameters.json'
+
+    def __init__(self, procsys=None):
+        self._procsys = procsys if procsys else PROCSYS
+
+
+    def path(self, name):
+        # as with sysctl, a name holding a '/' uses it as the separator
+        # and keeps its dots, as in net/ipv4/conf/eth0.100/forwarding
+        parts = name.split('/') if '/' in name else name.split('.')
+
+        return os.path.join(self._procsys, *parts)
+
+
+    def read(self, names):
+        ''' Return {name: value} for names, None for names that cannot
+        be read.
+        '''
+        values = {}
+
+        for name in names:
+            try:
+                with open(self.path(name), 'r') as paramf:
+                    values[name] = normalize(paramf.read())
+            except IOError:
+                values[name] = None
+
+        return values
+
+
+    def apply(self, parameters, savefile=None):
+        ''' Set parameters, a mapping of name to value, and return a
+        KernelParameterReport. With savefile, the original values of
+        changed parameters are added to it.
+        '''
+        report = KernelParameterReport()
+
+        current = self.read(parameters.keys())
+
+        saved = load(savefile) if savefile else {}
+
+        for name,value in sorted(parameters.items()):
+            value = normalize(value)
+
+            old = current[name]
+
+            if old is None:
+                report.failed.append((name, 'unknown parameter'))
+            elif old == value:
+                report.unchanged.append(name)
+            else:
+                error = self._write(name, value)
+
+                if error:
+                    report.failed.append((name, error))
+
+                    continue
+
+                report.changed.append((name, old, value))
+
+                # a second start keeps the value from before the first
+                original = saved.get(name, (old, None))[0]
+
+                saved[name] = (original, value)
+
+        if savefile and report.changed:
+            save(savefile, saved)
+
+        return report
+
+
+    def restore(self, savefile):
+        ''' Put back the values recorded in savefile and remove it. '''
+        report = KernelParameterReport()
+
+        saved = load(savefile)
+
+        current = self.read(saved.keys())
+
+        for name,(original,applied) in sorted(saved.items()):
+            if current[name] == original:
+                report.unchanged.append(name)
+            elif not current[name] == applied:
+                report.failed.append((name, 'changed since start to %s' % current[name]))
+            else:
+                error = self._write(name, original)
+
+                if error:
+                    report.failed.append((name, error))
+                else:
+                    report.changed.append((name, applied, original))
+
+        try:
+            os.remove(savefile)
+        except OSError as e:
+            if not e.errno == errno.ENOENT:
+                raise
+
+        return report
+
+
+    def _write(self, name, value):
+        try:
+            with open(self.path(name), 'w') as paramf:
+                paramf.write(value)
+        except IOError as e:
+            return e.strerror or str(e)
+
+        return None
+
+
+def savefilename(dockerrootdir):
+    ''' The save file of the field rooted at dockerrootdir. It is kept
+    beside the directory, not in it, so a start that force removes the
+    directory of a field that was never stopped still holds the values
+    from before that field, and stop puts those back.
+    '''
+    return '%s.%s' % (dockerrootdir.rstrip('/'), KernelParameters.SAVEFILE)
+
+
+def normalize(value):
+    # /proc/sys separates the fields of a multi value parameter with
+    # tabs, plans usually use spaces
+    return ' '.join(str(value).split())
+
+
+def load(savefile):
+    try:
+        with open(savefile, 'r') as savef:
+            return dict((name, tuple(values))
+                        for name,values in json.load(savef).items())
+    except IOError as e:
+        if e.errno == errno.ENOENT:
+            return {}
+
+        raise
+
+
+def save(savefile, saved):
+    with open(savefile, 'w') as savef:
+        json.dump(saved, savef, indent=1, sort_keys=True)
@@ -30,63 +30,304 @@
 # POSSIBILITY OF SUCH DAMAGE.
 #
 
+import hashlib
 import os
 import socket
 import shutil
-import stat
 import sys
 import time
+import etce.dockerhostsfile
+import etce.dockermetrics
+import etce.dockertrace
 import etce.utils
+from multiprocessing.pool import ThreadPool
 
 from etce.platform import Platform
 from etce.config import ConfigDictionary
 from etce.dockerplanfiledoc import DOCKERPlanFileDoc
+from etce.dockerkernelparameters import KernelParameters,savefilename
+from etce.dockermaterialize import Materializer
+from etce.dockermetrics import METRICS,METRICSFILE,MeasuredCalls
+from etce.dockeroffloads import DEFAULT_OFFLOADS,OffloadTuner,parseoffloads
+from etce.dockerplanslice import DOCKERPlanSlice
+from etce.dockerreadiness import ReadinessWaiter
+from etce.dockertrace import TRACEFILE,TRACER,span,traced
 from etce.dockererror import DOCKERError
+from etce.dockerruntime import RUNTIMES
+from etce.dockernetns import waitforinterface
+from etce.dockernetlink import RTNetlink,NetlinkProvisioner,IFF_UP
 
 
-def startdockers(dockerplan, writehosts=False, forcedockerroot=False, dryrun=False):
-    dockerplanfiledoc = dockerplan
+def loadplan(dockerplan):
+    ''' Return dockerplan as a plan, reading it if it is a file name.
+    The file may be a plan file or a plan slice written for this host.
+    '''
+    if type(dockerplan) in (DOCKERPlanFileDoc, DOCKERPlanSlice):
+        return dockerplan
 
-    if not type(dockerplan) == DOCKERPlanFileDoc:
-        # assume file name
-        dockerplanfiledoc = DOCKERPlanFileDoc(dockerplan)
+    if DOCKERPlanSlice.isslice(dockerplan):
+        return DOCKERPlanSlice(dockerplan)
+
+    # assume plan file name, only this host's part of the plan is needed
+    return DOCKERPlanFileDoc(dockerplan, lazy=True)
+
+
+def starttrace(trace):
+    ''' Start tracing this process for a trace request from the
+    controller. Returns False when there is nothing to do, including
+    when the caller is already tracing this process.
+    '''
+    if not trace or TRACER.enabled:
+        return False
+
+    TRACER.enable(Platform().hostname())
+
+    return True
+
+
+def finishtrace():
+    ''' Write this host's trace to its work directory and return the
+    events, for the controller to merge.
+    '''
+    TRACER.disable()
+
+    events = TRACER.events()
+
+    etce.dockertrace.write(os.path.join(workdirectory(), TRACEFILE), events)
+
+    return events
+
+
+def startmetrics():
+    ''' Start collecting metrics for this process. Returns False when
+    an enclosing command is already collecting them.
+    '''
+    if METRICS.enabled:
+        return False
+
+    METRICS.enable()
+
+    return True
+
+
+def recordrun(command, started, ok):
+    now = time.time()
+
+    METRICS.inc('etce_docker_runs_total',
+                command=command,
+                result='success' if ok else 'failure')
+
+    METRICS.set('etce_docker_run_seconds', now - started, command=command)
+
+    METRICS.set('etce_docker_run_timestamp_seconds', now, command=command)
+
+
+def finishmetrics(textfiledir=None):
+    ''' Add this run's metrics to those kept in the work directory,
+    next to the lock file, and to the Prometheus textfile in
+    textfiledir when given. Failing to write them does not fail the
+    command.
+    '''
+    METRICS.disable()
+
+    jsonfile = os.path.join(workdirectory(), METRICSFILE)
 
     try:
-        DOCKERManagerImpl().start(dockerplanfiledoc,
+        snapshot = etce.dockermetrics.accumulate(etce.dockermetrics.load(jsonfile),
+                                                 METRICS.snapshot())
+
+        etce.dockermetrics.write(snapshot, jsonfile, textfiledir)
+    except (IOError, OSError) as e:
+        print 'Cannot write metrics: %s' % e
+
+
+def workdirectory():
+    return os.getenv('WORKDIR', ConfigDictionary().get('etce', 'WORK_DIRECTORY'))
+
+
+def startdockers(dockerplan, writehosts=False, forcedockerroot=False, dryrun=False, parallel=1,
+                 runtime='cli', attach='connect', netlink=False, reconcile=False, trace=False,
+                 textfiledir=None):
+    tracing = starttrace(trace)
+
+    metering = startmetrics()
+
+    started = time.time()
+
+    ok = False
+
+    events = None
+
+    try:
+        with span('loadplan'):
+            dockerplanfiledoc = loadplan(dockerplan)
+
+        DOCKERManagerImpl(runtime, attach, netlink).start(dockerplanfiledoc,
                                writehosts=writehosts,
                                forcedockerroot=forcedockerroot,
-                               dryrun=dryrun)
+                               dryrun=dryrun,
+                               parallel=int(parallel),
+                               reconcile=reconcile)
+
+        ok = True
     except Exception as e:
         raise DOCKERError(e.message)
+    finally:
+        recordrun('startdockers', started, ok)
+
+        if metering:
+            finishmetrics(textfiledir)
+
+        if tracing:
+            events = finishtrace()
+
+    return events
+
 
+def stopdockers(dockerplan, runtime='cli', parallel=1, netlink=False, trace=False,
+                textfiledir=None):
+    tracing = starttrace(trace)
 
-def stopdockers(dockerplan):
-    dockerplanfiledoc = dockerplan
+    metering = startmetrics()
 
-    if not type(dockerplan) == DOCKERPlanFileDoc:
-        # assume file name
-        dockerplanfiledoc = DOCKERPlanFileDoc(dockerplan)
+    started = time.time()
+
+    ok = False
+
+    events = None
 
     try:
-        DOCKERManagerImpl().stop(dockerplanfiledoc)
+        with span('loadplan'):
+            dockerplanfiledoc = loadplan(dockerplan)
+
+        DOCKERManagerImpl(runtime, netlink=netlink).stop(dockerplanfiledoc,
+                                                         parallel=int(parallel))
+
+        ok = True
     except Exception as e:
         raise DOCKERError(e.message)
+    finally:
+        recordrun('stopdockers', started, ok)
+
+        if metering:
+            finishmetrics(textfiledir)
+
+        if tracing:
+            events = finishtrace()
+
+    return events
+
+
+
+# label carrying the docker root directory of the field a container
+# belongs to, lets stop find containers no longer named in the plan
+FIELD_LABEL = 'etce.docker.field'
+
+# label carrying a digest of everything a container is built from,
+# lets a reconciling start tell changed containers from unchanged ones
+HASH_LABEL = 'etce.docker.hash'
+
+
+def writecontainerhosts(containers):
+    ''' Write the hosts entries of containers as the managed block of
+    /etc/hosts. Returns True when the file changed.
+    '''
+    # ipv4
+    ipv4_entries = []
+    for container in containers:
+        ipv4_entries.extend(container.hosts_entries_ipv4)
+
+    # ipv6
+    ipv6_entries = []
+    for container in containers:
+        ipv6_entries.extend(container.hosts_entries_ipv6)
+
+    entries = [ (hostaddr,hostentry) for hostentry,hostaddr in sorted(ipv4_entries) ]
+
+    entries.extend(sorted([ (hostaddr,hostentry) for hostentry,hostaddr in ipv6_entries ]))
+
+    return etce.dockerhostsfile.writehosts(entries)
+
+
+def bridgesfilename(dockerrootdir):
+    ''' The file naming the bridges the field rooted at dockerrootdir
+    brought up, one per line. It is kept beside the directory, like the
+    kernel parameter save file, and lets a reconciling start remove the
+    bridges dropped from the plan.
+    '''
+    return '%s.bridges' % dockerrootdir.rstrip('/')
+
+
+def containerhash(container):
+    filename,initscripttext = container.initscript
+
+    digest = hashlib.sha1()
 
+    for part in (container.docker_directory,
+                 str(container),
+                 filename or '',
+                 initscripttext or ''):
+        if isinstance(part, unicode):
+            part = part.encode('utf-8')
+
+        digest.update(part)
+
+        digest.update('\0')
+
+    return digest.hexdigest()
 
 
 class DOCKERManagerImpl(object):
-    def __init__(self):
+    # seconds to wait for a connected interface to appear in the container
+    INTERFACE_TIMEOUT = 10.0
+
+    # containers removed by one worker call during stop
+    REMOVE_BATCH_SIZE = 32
+
+    # concurrent writers of container directories during start
+    MATERIALIZE_WORKERS = 8
+
+    # seconds start waits for its containers to be ready
+    READY_TIMEOUT = 30.0
+
+    def __init__(self, runtime='cli', attach='connect', netlink=False, platform=None):
         # check root
         #if not os.geteuid() == 0:
         #    raise RuntimeError('You need to be root to perform this command.')
-        self._platform = Platform()
+        # the latency of every platform and docker operation is measured
+        self._platform = MeasuredCalls(platform if platform else Platform(), 'platform', METRICS)
+
+        if not runtime in RUNTIMES:
+            raise DOCKERError('Unknown docker runtime "%s", expected one of {%s}. Quitting.' % \
+                              (runtime, ', '.join(sorted(RUNTIMES))))
 
+        self._runtime = MeasuredCalls(RUNTIMES[runtime](), 'docker', METRICS)
 
-    def start(self, plandoc, writehosts, forcedockerroot=False, dryrun=False):
+        self._offloadtuner = OffloadTuner(self._runtime)
+
+        # connect: run on the none network, then disconnect it and
+        #          connect each interface in turn
+        # create:  declare every interface at create time, then start once
+        if not attach in ('connect', 'create'):
+            raise DOCKERError('Unknown attach mode "%s", expected one of {connect, create}. Quitting.' % \
+                              attach)
+
+        self._attach = attach
+
+        # build bridges and vxlan tunnels over netlink instead of
+        # one Platform call per device
+        self._netlink = netlink
+
+
+    @traced('start')
+    def start(self, plandoc, writehosts, forcedockerroot=False, dryrun=False, parallel=1,
+              reconcile=False):
         hostname = socket.gethostname().split('.')[0].lower()
         dockerrootdir = plandoc.docker_root_directory(hostname)
         containers = plandoc.containers(hostname)
 
+        METRICS.set('etce_docker_containers', len(containers), command='start')
+
         if not containers:
             print 'No containers assigned to "%s". Skipping.' % hostname
             return
@@ -113,8 +354,18 @@ class DOCKERManagerImpl(object):
             print 'No containers assigned to host %s. Quitting.' % hostname
             return
 
-        # delete and remake the node root
-        if os.path.exists(dockerrootdir):
+        # render the containers and their hashes once, before the host
+        # is touched, so a template error stops start here and the
+        # steps below do not render them again
+        with span('render'):
+            containers = list(containers)
+
+            hashes = dict([ (container.docker_name, containerhash(container))
+                            for container in containers ])
+
+        # delete and remake the node root, a reconciling start
+        # keeps it
+        if os.path.exists(dockerrootdir) and not reconcile:
             if forcedockerroot:
                 print 'Force removal of "%s" docker root directory.' \
                     % dockerrootdir
@@ -122,97 +373,368 @@ class DOCKERManagerImpl(object):
             else:
                 raise DOCKERError('%s docker root directory already exists, Quitting.' % dockerrootdir)
 
-        os.makedirs(dockerrootdir)
+        if not os.path.exists(dockerrootdir):
+            os.makedirs(dockerrootdir)
 
         # set kernelparameters
-        kernelparameters = plandoc.kernelparameters(hostname)
-        if len(kernelparameters) > 0:
-            print 'Setting kernel parameters:'
+        self._tunekernel(plandoc.kernelparameters(hostname), dockerrootdir)
 
-            for kernelparamname,kernelparamval in kernelparameters.items():
-                os.system('sysctl %s=%s' % (kernelparamname,kernelparamval))
-
-        #vxlan tunnel
-        if not dryrun:
-            for _,vxlantunnel in plandoc.vxlantunnels(hostname).items():
-                if not self._platform.isdeviceup('vxlan1'):
-                    self._platform.runcommand('ip link add %s ' \
-                                              'type vxlan id %s ' \
-                                              'group 239.1.1.1 ' \
-                                              'dev %s' % \
-                                              (vxlantunnel.name,
-                                               vxlantunnel.id,
-                                               vxlantunnel.device))
-                    self._platform.networkinterfaceup(vxlantunnel.name)
-
-        # bring up bridge
+        # vxlan tunnels and bridges
         if not dryrun:
-            for _,bridge in plandoc.bridges(hostname).items():
-                if not bridge.persistent:
-                    print 'Bringing up bridge: %s' % bridge.devicename
-
-                    self._platform.dockerbridgeup(bridge.devicename,
-                                                  bridge.subnet,
-                                                  bridge.iprange,
-                                                  bridge.gateway,
-                                                  bridge.mtu,
-                                                  bridge.addifs,
-                                                  enablemulticastsnooping=True)
-                    '''
-                    if not bridge.ipv4 is None:
-                        self._platform.adddeviceaddress(bridge.devicename,
-                                                        bridge.ipv4)
-
-                    if not bridge.ipv6 is None:
-                        self._platform.adddeviceaddress(bridge.devicename,
-                                                        bridge.ipv6)
-                    '''
-
-                    time.sleep(0.1)
-                        
-                elif not self._platform.isdeviceup(bridge.devicename):
-                    raise RuntimeError('Bridge %s marked persistent is not up. Quitting.')
+            if self._netlink:
+                self._provisionnetwork(plandoc, hostname, parallel)
+            else:
+                self._bringupnetwork(plandoc, hostname, reconcile)
 
         # write hosts file
         if not dryrun:
             if writehosts:
                 self._writehosts(containers)
 
+        # only the containers that are missing or changed are
+        # (re)created when reconciling
+        if reconcile and not dryrun:
+            containers = self._reconcile(containers,
+                                         hashes,
+                                         plandoc.bridges(hostname),
+                                         dockerrootdir,
+                                         parallel)
+
+        if not dryrun:
+            self._savebridges(plandoc.bridges(hostname), dockerrootdir)
+
         # create container files
-        for container in containers:
-            docker_directory = container.docker_directory
+        self._materialize(containers, dockerrootdir)
 
-            self._makedirs(docker_directory)
+        if dryrun:
+            print 'dryrun'
+        elif containers:
+            started = self._startnodes(containers, hashes, parallel)
 
-            # make the config
-            with open(os.path.join(docker_directory, 'config'), 'w') as configf:
-                configf.write(str(container))
+            self._waitready(containers, dockerrootdir, started)
 
-            # make init script
-            filename,initscripttext = container.initscript
 
-            if initscripttext:
-                scriptfile = os.path.join(docker_directory, filename)
+    @traced('reconcile')
+    def _reconcile(self, containers, hashes, bridges, dockerrootdir, parallel):
+        live = self._runtime.states('%s=%s' % (FIELD_LABEL, dockerrootdir), HASH_LABEL)
 
-                with open(scriptfile, 'w') as sf:
-                    sf.write(initscripttext)
+        # a container holding a planned name without this field's label
+        # is replaced too, it cannot be told apart from a changed one
+        foreign = set(hashes).intersection(self._runtime.containers()).difference(live)
 
-                    os.chmod(scriptfile, 
-                             stat.S_IRWXU | stat.S_IRGRP | \
-                             stat.S_IXGRP | stat.S_IROTH | \
-                             stat.S_IXOTH)
+        orphans = sorted(set(live).difference(hashes))
 
-        if dryrun:
-            print 'dryrun'
-        else:
-            self._startnodes(containers)
+        changed = sorted([ docker_name for docker_name,digest in hashes.items()
+                           if docker_name in foreign or \
+                           (docker_name in live and not live[docker_name] == (True, digest)) ])
+
+        missing = set(hashes).difference(live).difference(foreign)
 
+        print 'Reconciling: %d unchanged, %d changed, %d missing, %d orphaned containers.' % \
+            (len(hashes) - len(changed) - len(missing),
+             len(changed),
+             len(missing),
+             len(orphans))
+
+        if orphans or changed:
+            self._removecontainers(orphans + changed, parallel)
+
+        # the directories of containers dropped from the plan, the
+        # dot directories hold files shared by the containers
+        planned = set([ container.docker_directory for container in containers ])
+
+        for entry in sorted(os.listdir(dockerrootdir)):
+            directory = os.path.join(dockerrootdir, entry)
+
+            if entry.startswith('.') or directory in planned or not os.path.isdir(directory):
+                continue
+
+            print 'Removing container directory: %s' % directory
+
+            shutil.rmtree(directory)
+
+        # the bridges dropped from the plan, once no container is
+        # attached to them
+        bridgesfile = bridgesfilename(dockerrootdir)
+
+        if os.path.isfile(bridgesfile):
+            with open(bridgesfile) as fd:
+                dropped = set(fd.read().split())
+
+            dropped.difference_update([ bridge.devicename for _,bridge in bridges.items() ])
+
+            if dropped:
+                self._removebridges(sorted(dropped))
+
+        recreate = missing.union(changed)
+
+        return [ container for container in containers
+                 if container.docker_name in recreate ]
+
+
+    def _savebridges(self, bridges, dockerrootdir):
+        with open(bridgesfilename(dockerrootdir), 'w') as fd:
+            for bridgename in sorted([ bridge.devicename for _,bridge in bridges.items()
+                                       if not bridge.persistent ]):
+                fd.write(bridgename + '\n')
+
+
+    def _removebridges(self, bridgenames):
+        if not self._netlink:
+            for bridgename in bridgenames:
+                print 'Bringing down bridge: %s' % bridgename
+
+                self._platform.dockerbridgedown(bridgename)
+
+            return
+
+        networks = sorted(self._runtime.networks().intersection(bridgenames))
+
+        if networks:
+            print 'Removing docker networks: %s' % ', '.join(networks)
+
+            try:
+                self._runtime.removenetworks(networks)
+            except DOCKERError as e:
+                print e
+
+        netlink = RTNetlink()
+
+        try:
+            removed,_,failed = NetlinkProvisioner(netlink).deprovision(bridgenames)
+        finally:
+            netlink.close()
+
+        if removed:
+            print 'Removed links: %s' % ', '.join(removed)
+
+        for name,error in sorted(failed.items()):
+            print 'Failed to remove link %s: %s' % (name, error)
+
+
+    @traced('network')
+    def _bringupnetwork(self, plandoc, hostname, reconcile=False):
+        # a reconciling start leaves the bridges docker already has
+        existing = self._runtime.networks() if reconcile else set([])
+
+        #vxlan tunnel
+        for _,vxlantunnel in plandoc.vxlantunnels(hostname).items():
+            if not self._platform.isdeviceup('vxlan1'):
+                self._platform.runcommand('ip link add %s ' \
+                                          'type vxlan id %s ' \
+                                          'group 239.1.1.1 ' \
+                                          'dev %s' % \
+                                          (vxlantunnel.name,
+                                           vxlantunnel.id,
+                                           vxlantunnel.device))
+                self._platform.networkinterfaceup(vxlantunnel.name)
 
-    def stop(self, plandoc):
+        # bring up bridge
+        for _,bridge in plandoc.bridges(hostname).items():
+            if bridge.devicename in existing:
+                continue
+
+            if not bridge.persistent:
+                print 'Bringing up bridge: %s' % bridge.devicename
+
+                self._platform.dockerbridgeup(bridge.devicename,
+                                              bridge.subnet,
+                                              bridge.iprange,
+                                              bridge.gateway,
+                                              bridge.mtu,
+                                              bridge.addifs,
+                                              enablemulticastsnooping=True)
+                '''
+                if not bridge.ipv4 is None:
+                    self._platform.adddeviceaddress(bridge.devicename,
+                                                    bridge.ipv4)
+
+                if not bridge.ipv6 is None:
+                    self._platform.adddeviceaddress(bridge.devicename,
+                                                    bridge.ipv6)
+                '''
+
+                time.sleep(0.1)
+                    
+            elif not self._platform.isdeviceup(bridge.devicename):
+                raise RuntimeError('Bridge %s marked persistent is not up. Quitting.')
+
+
+    @traced('network')
+    def _provisionnetwork(self, plandoc, hostname, parallel):
+        bridges = [ bridge for _,bridge in sorted(plandoc.bridges(hostname).items()) ]
+
+        vxlantunnels = [ vxlantunnel for _,vxlantunnel
+                         in sorted(plandoc.vxlantunnels(hostname).items()) ]
+
+        netlink = RTNetlink()
+
+        try:
+            links = netlink.links()
+
+            for bridge in bridges:
+                if bridge.persistent:
+                    if not links.get(bridge.devicename, (0, 0))[1] & IFF_UP:
+                        raise RuntimeError('Bridge %s marked persistent is not up. Quitting.' % \
+                                           bridge.devicename)
+
+            bridges = [ bridge for bridge in bridges if not bridge.persistent ]
+
+            created,existed,failed = \
+                NetlinkProvisioner(netlink).provision(bridges,
+                                                      vxlantunnels,
+                                                      enablemulticastsnooping=True)
+        finally:
+            netlink.close()
+
+        if created:
+            print 'Created links: %s' % ', '.join(sorted(created))
+
+        if existed:
+            print 'Links already present: %s' % ', '.join(sorted(existed))
+
+        if failed:
+            raise DOCKERError('Failed to provision links: %s. Quitting.' % \
+                              ', '.join([ '%s (%s)' % (name, error)
+                                          for name,error in sorted(failed.items()) ]))
+
+        # register the bridges with docker, the bridge driver adopts the
+        # linux bridge that now exists under each name
+        networks = self._runtime.networks()
+
+        missing = [ bridge for bridge in bridges if not bridge.devicename in networks ]
+
+        pool = ThreadPool(max(1, min(parallel, len(missing))))
+
+        try:
+            errors = [ error for error in pool.map(self._createnetwork, missing) if error ]
+        finally:
+            pool.close()
+            pool.join()
+
+        if errors:
+            raise DOCKERError('Failed to create docker networks: %s. Quitting.' % \
+                              '; '.join(errors))
+
+
+    def _createnetwork(self, bridge):
+        try:
+            self._runtime.createnetwork(bridge.devicename,
+                                        bridge.subnet,
+                                        bridge.iprange,
+                                        bridge.gateway,
+                                        bridge.mtu)
+        except DOCKERError as e:
+            return '%s: %s' % (bridge.devicename, e)
+
+        return None
+
+
+    @traced('stop')
+    def stop(self, plandoc, parallel=1):
         hostname = self._platform.hostname()
 
         noderoot = plandoc.docker_root_directory(hostname)
 
+        # containers first, a docker network cannot be removed while
+        # endpoints are still attached
+        names = set(plandoc.containers(hostname).docker_names)
+
+        names.update(self._runtime.containers('%s=%s' % (FIELD_LABEL, noderoot)))
+
+        METRICS.set('etce_docker_containers', len(names), command='stop')
+
+        leftovers = self._removecontainers(sorted(names), parallel)
+
+        if self._netlink:
+            self._teardownnetwork(plandoc, hostname)
+        else:
+            self._bringdownnetwork(plandoc, hostname)
+
+        if noderoot:
+            self._restorekernel(noderoot)
+
+            if os.path.isfile(bridgesfilename(noderoot)):
+                os.remove(bridgesfilename(noderoot))
+
+        if leftovers:
+            print 'Leftover containers: %s' % ', '.join(leftovers)
+
+        #os.remove(plandoc.planfile())
+
+
+    @traced('kernelparameters')
+    def _tunekernel(self, kernelparameters, dockerrootdir):
+        if len(kernelparameters) == 0:
+            return
+
+        savefile = savefilename(dockerrootdir)
+
+        report = KernelParameters().apply(kernelparameters, savefile)
+
+        report.show('Setting kernel parameters:')
+
+
+    @traced('restorekernelparameters')
+    def _restorekernel(self, noderoot):
+        savefile = savefilename(noderoot)
+
+        if not os.path.isfile(savefile):
+            return
+
+        report = KernelParameters().restore(savefile)
+
+        report.show('Restoring kernel parameters:')
+
+
+    @traced('removecontainers')
+    def _removecontainers(self, names, parallel):
+        # docker rm -f fails the whole batch over one missing name, only
+        # pass those that exist and count the ones gone afterwards
+        existing = self._runtime.containers()
+
+        names = [ name for name in names if name in existing ]
+
+        if not names:
+            return []
+
+        batches = [ names[i:i+self.REMOVE_BATCH_SIZE]
+                    for i in range(0, len(names), self.REMOVE_BATCH_SIZE) ]
+
+        pool = ThreadPool(max(1, min(parallel, len(batches))))
+
+        try:
+            for error in pool.imap_unordered(self._removebatch, batches):
+                if error:
+                    print error
+        finally:
+            pool.close()
+            pool.join()
+
+        remaining = self._runtime.containers()
+
+        removed = [ name for name in names if not name in remaining ]
+
+        if removed:
+            print 'Removed containers: %s' % ', '.join(removed)
+
+        METRICS.inc('etce_docker_containers_removed_total', len(removed))
+
+        # the containers left behind
+        return [ name for name in names if name in remaining ]
+
+
+    def _removebatch(self, batch):
+        try:
+            self._runtime.removemany(batch)
+        except DOCKERError as e:
+            return str(e)
+
+        return None
+
+
+    @traced('network')
+    def _bringdownnetwork(self, plandoc, hostname):
         for _, vxlantunnel in plandoc.vxlantunnels(hostname).items():
             if vxlantunnel.name in self._platform.getnetworkdevicenames():
                 self._platform.networkinterfacedown(vxlantunnel.name)
@@ -224,131 +746,191 @@ class DOCKERManagerImpl(object):
                 print 'Bringing down bridge: %s' % bridge.devicename
                 self._platform.dockerbridgedown(bridge.devicename)
 
-        for container in plandoc.containers(hostname):
-            command = 'docker rm -f %s &> /dev/null' % container.docker_name
-            print command
-            os.system(command)
 
-        #os.remove(plandoc.planfile())
+    @traced('network')
+    def _teardownnetwork(self, plandoc, hostname):
+        bridgenames = sorted([ bridge.devicename
+                               for _,bridge in plandoc.bridges(hostname).items()
+                               if not bridge.persistent ])
 
+        networks = sorted(self._runtime.networks().intersection(bridgenames))
 
-    def _makedirs(self, noderoot):
-        os.makedirs(noderoot)
+        if networks:
+            print 'Removing docker networks: %s' % ', '.join(networks)
 
+            try:
+                self._runtime.removenetworks(networks)
+            except DOCKERError as e:
+                print e
 
-    def _startnodes(self, containers):
-        for container in containers:
-            image = ''
-            params = ''
-            for name,value in container.params:
-                if name == 'image':
-                    image = value
-                else:
-                    if '=' in name:
-                        params += name + value + ' '
-                    #else:
-                    #    params += name + ' ' + value + ' '
-            if image == '':
-                raise RuntimeError('Image not defined. Quitting.')
-            command = 'docker run ' \
-                      '--detach ' \
-                      '--tty ' \
-                      '--name=%s ' \
-                      '--hostname=%s ' \
-                      '--cap-add=ALL ' \
-                      '--privileged=true ' \
-                      '--network=none ' \
-                      '--volume %s ' \
-                      '%s ' \
-                      '%s > /dev/null' % \
-                      (container.docker_name,
-                       container.docker_name,
-                       container.docker_directory,
-                       params,
-                       image)
-            os.system(command)
-            print command
-
-            command = 'docker network disconnect -f none %s > /dev/null' % container.docker_name
-            os.system(command)
-
-            i = 0
-            for bridgename, interfaceparams in container.interfaces.items():
-
-                command = 'docker network connect --ip %s %s %s > /dev/null' % \
-                           (interfaceparams['ipv4'], bridgename, container.docker_name)
-                os.system(command)
-                time.sleep(1)
-                command = 'docker exec -t %s bash -c "ethtool -K eth%d tx off" > /dev/null' % \
-                          (container.docker_name, i)
-                os.system(command)
-                i += 1
-
-            
-
-    def _waitstart(self, nodecount, dockerroot):
-        numstarted = 0
-        for i in range(10):
-            command = 'docker ps --format "{{.Names}}" '
-            numstarted = len(self._platform.runcommand(command))
-            print 'Waiting for docker containers: %d of %d are running.' % \
-                (numstarted, nodecount)
-
-            if numstarted == nodecount:
-                break
-
-            time.sleep(1)
-
-        print 'Continuing with %d of %d running docker containers.' % \
-            (numstarted, nodecount)
+        linknames = sorted(plandoc.vxlantunnels(hostname).keys()) + bridgenames
 
-        
-    def _writehosts(self, containers):
-        opentag = '#### Start auto-generated ETCE control mappings\n'
-        closetag = '#### Stop auto-generated ETCE control mappings\n'
-        etcehostlines = []
-        searchstate = 0
-        for line in open('/etc/hosts', 'r'):
-            if searchstate == 0:
-                if line.startswith(opentag):
-                    searchstate = 1
+        netlink = RTNetlink()
+
+        try:
+            removed,_,failed = NetlinkProvisioner(netlink).deprovision(linknames)
+
+            if removed:
+                print 'Removed links: %s' % ', '.join(removed)
+
+            for name,error in sorted(failed.items()):
+                print 'Failed to remove link %s: %s' % (name, error)
+
+            leftovers = sorted(set(linknames).intersection(netlink.links()))
+        finally:
+            netlink.close()
+
+        if leftovers:
+            print 'Leftover links: %s' % ', '.join(leftovers)
+
+        leftovers = sorted(self._runtime.networks().intersection(bridgenames))
+
+        if leftovers:
+            print 'Leftover docker networks: %s' % ', '.join(leftovers)
+
+
+    @traced('materialize')
+    def _materialize(self, containers, dockerrootdir):
+        report = Materializer(dockerrootdir, self.MATERIALIZE_WORKERS).materialize(containers)
+
+        print 'Container files: %s' % report
+
+
+    @traced('startnodes')
+    def _startnodes(self, containers, hashes, parallel=1):
+        # each container's run/attach sequence is issued in order by a
+        # single worker, with up to parallel containers in flight at once
+        pool = ThreadPool(max(1, min(parallel, len(containers))))
+
+        failed = []
+
+        # container name -> the time its start began
+        started = {}
+
+        try:
+            for docker_name,began,error,readiness,offloads in pool.imap_unordered(self._startnode,
+                                    [ (container, hashes[container.docker_name])
+                                      for container in containers ]):
+                started[docker_name] = began
+
+                for _,latency in readiness:
+                    METRICS.observe('etce_docker_interface_wait_seconds', latency)
+
+                if error:
+                    print '[%s] failed: %s' % (docker_name, error)
+                    failed.append(docker_name)
                 else:
-                    etcehostlines.append(line)   
-            elif searchstate == 1:
-                if line.startswith(closetag):
-                    searchstate == 2
+                    print '[%s] started, interfaces ready: %s%s' % \
+                        (docker_name,
+                         ' '.join([ '%s=%.3fs' % (ifname,latency)
+                                    for ifname,latency in readiness ]),
+                         ', offloads: %s' % offloads if offloads else '')
+        finally:
+            pool.close()
+            pool.join()
+
+        METRICS.inc('etce_docker_containers_started_total', len(containers) - len(failed))
+
+        METRICS.inc('etce_docker_containers_failed_total', len(failed))
+
+        if failed:
+            raise DOCKERError('Failed to start %d of %d containers: %s. Quitting.' % \
+                              (len(failed), len(containers), ','.join(sorted(failed))))
+
+        return started
+
+
+    def _startnode(self, item):
+        container,digest = item
+
+        began = time.time()
+
+        image = ''
+        params = []
+        for name,value in container.params:
+            if name == 'image':
+                image = value
             else:
-                etcehostlines.append(line)
-
-        # strip off trailing white spaces
-        etcehostlines.reverse()
-        for i,line in enumerate(etcehostlines):
-            if len(line.strip()) > 0:
-                etcehostlines = etcehostlines[i:]
-                break
-        etcehostlines.reverse()
-
-        with open('/etc/hosts', 'w') as ofd:
-            for line in etcehostlines:
-                ofd.write(line)
-
-            ofd.write('\n')
-            ofd.write(opentag)
-            
-            # ipv4
-            ipv4_entries = []
-            for container in containers:
-                for hostentry,hostaddr in container.hosts_entries_ipv4:
-                    ipv4_entries.append((hostentry,hostaddr))
-            for hostentry,hostaddr in sorted(ipv4_entries):
-                ofd.write('%s %s\n' % (hostaddr,hostentry))
-
-            #ipv6 = []
-            ipv6_entries = []
-            for container in containers:
-                for hostentry,hostaddr in container.hosts_entries_ipv6:
-                    ipv6_entries.append((hostaddr,hostentry))
-            for hostentry,hostaddr in sorted(ipv6_entries):
-                ofd.write('%s %s\n' % (hostaddr,hostentry))
-
-            ofd.write(closetag)
+                if '=' in name:
+                    params.append((name, value))
+        if image == '':
+            return container.docker_name, began, 'Image not defined.', [], None
+
+        params.append(('--label=', '%s=%s' % \
+                       (FIELD_LABEL, os.path.dirname(container.docker_directory))))
+
+        params.append(('--label=', '%s=%s' % (HASH_LABEL, digest)))
+
+        # interfaces are named in container.interfaces order, the same
+        # order in both attach modes
+        networks = [ (bridgename, interfaceparams['ipv4'], 'eth%d' % i)
+                     for i,(bridgename,interfaceparams)
+                     in enumerate(container.interfaces.items()) ]
+
+        # (interface name, seconds until it appeared in the container)
+        readiness = []
+
+        offloads = None
+
+        try:
+            with span('container', container=container.docker_name):
+                if self._attach == 'create':
+                    with span('create'):
+                        self._runtime.create(container, image, params, networks)
+
+                        self._runtime.start(container.docker_name)
+                else:
+                    with span('run'):
+                        self._runtime.run(container, image, params)
+
+                        self._runtime.disconnect('none', container.docker_name)
+
+                pid = self._runtime.pid(container.docker_name)
+
+                for bridgename,ipv4,ifname in networks:
+                    with span('attach', interface=ifname):
+                        if self._attach == 'connect':
+                            self._runtime.connect(bridgename, container.docker_name, ipv4)
+
+                        readiness.append(
+                            (ifname, waitforinterface(pid, ifname, self.INTERFACE_TIMEOUT)))
+
+                # the offloads of every interface in one step once all are up
+                requests = [ (ifname, parseoffloads(interfaceparams.get('offloads', DEFAULT_OFFLOADS), ifname))
+                             for (_,interfaceparams),(_,_,ifname)
+                             in zip(container.interfaces.items(), networks) ]
+
+                try:
+                    with span('offloads'):
+                        offloads = self._offloadtuner.apply(container.docker_name, pid, requests)
+                except DOCKERError:
+                    # offload tuning is best effort
+                    pass
+        except DOCKERError as e:
+            return container.docker_name, began, str(e), readiness, offloads
+
+        return container.docker_name, began, None, readiness, offloads
+
+
+    @traced('waitready')
+    def _waitready(self, containers, dockerrootdir, started=None):
+        waiter = ReadinessWaiter(self._runtime,
+                                 '%s=%s' % (FIELD_LABEL, dockerrootdir),
+                                 HASH_LABEL,
+                                 self.READY_TIMEOUT)
+
+        report = waiter.wait(containers, started)
+
+        print 'Readiness: %s' % report
+
+        notready = report.notready()
+
+        if notready:
+            print 'Not ready after %gs: %s' % (self.READY_TIMEOUT, ', '.join(notready))
+
+        return report
+
+
+    @traced('writehosts')
+    def _writehosts(self, containers):
+        writecontainerhosts(containers)
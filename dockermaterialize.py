@@ -0,0 +1,257 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import errno
+import hashlib
+import os
+import stat
+import threading
+from multiprocessing.pool import ThreadPool
+
+
+INITSCRIPT_MODE = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH
+
+
+class MaterializeReport(object):
+    def __init__(self):
+        self.written = 0
+
+        self.byteswritten = 0
+
+        self.skipped = 0
+
+        self.linked = 0
+
+        self.stored = 0
+
+
+    def add(self, other):
+        self.written += other.written
+
+        self.byteswritten += other.byteswritten
+
+        self.skipped += other.skipped
+
+        self.linked += other.linked
+
+        self.stored += other.stored
+
+
+    def __str__(self):
+        return 'wrote %d files (%d bytes), skipped %d unchanged, ' \
+               'linked %d initscripts to %d stored copies' % \
+               (self.written, self.byteswritten, self.skipped, self.linked, self.stored)
+
+
+class Materializer(object):
+    ''' Writes each container's directory, config and initscript.
+
+    Containers are written by a bounded pool of workers. A file whose
+    content on disk is already correct is left alone. An initscript
+    shared by several containers is stored once under STOREDIR in the
+    docker root directory, named by its content digest, and hardlinked
+    into each of their directories, so thousands of containers sharing
+    a script cost one write.
+    '''
+    STOREDIR = '.initscripts'
+
+    def __init__(self, dockerrootdir, workers=8):
+        self._storedir = os.path.join(dockerrootdir, self.STOREDIR)
+
+        self._workers = max(1, workers)
+
+        self._lock = threading.Lock()
+
+        # content digest -> the file later containers with that script
+        # link to, the first container's copy until a second one moves
+        # it into the store
+        self._stored = {}
+
+
+    def materialize(self, containers):
+        report = MaterializeReport()
+
+        if not containers:
+            return report
+
+        pool = ThreadPool(min(self._workers, len(containers)))
+
+        try:
+            for containerreport in pool.imap_unordered(self._materialize, containers):
+                report.add(containerreport)
+        finally:
+            pool.close()
+
+            pool.join()
+
+        return report
+
+
+    def _materialize(self, container):
+        report = MaterializeReport()
+
+        docker_directory = container.docker_directory
+
+        if not os.path.isdir(docker_directory):
+            makedirs(docker_directory)
+
+        # make the config
+        self._writefile(os.path.join(docker_directory, 'config'), str(container), report)
+
+        # make init script
+        filename,initscripttext = container.initscript
+
+        if initscripttext:
+            self._linkinitscript(os.path.join(docker_directory, filename), initscripttext, report)
+
+        return report
+
+
+    def _writefile(self, filename, content, report, mode=None):
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+
+        try:
+            st = os.stat(filename)
+        except OSError:
+            st = None
+
+        if st:
+            if st.st_size == len(content) and samecontent(filename, content) and \
+               (mode is None or stat.S_IMODE(st.st_mode) == mode):
+                report.skipped += 1
+
+                return
+
+            # a linked initscript is shared, replace it rather than
+            # change every container's copy
+            if st.st_nlink > 1:
+                os.remove(filename)
+
+        with open(filename, 'w') as fd:
+            fd.write(content)
+
+        if mode is not None:
+            os.chmod(filename, mode)
+
+        report.written += 1
+
+        report.byteswritten += len(content)
+
+
+    def _linkinitscript(self, scriptfile, initscripttext, report):
+        if isinstance(initscripttext, unicode):
+            initscripttext = initscripttext.encode('utf-8')
+
+        digest = hashlib.sha1(initscripttext).hexdigest()
+
+        with self._lock:
+            source = self._stored.get(digest)
+
+            if source is None:
+                # the first container with a script gets a copy of its
+                # own, the store is only used once a second one shares it
+                self._stored[digest] = scriptfile
+
+                self._writefile(scriptfile, initscripttext, report, INITSCRIPT_MODE)
+
+                return
+
+            if not os.path.dirname(source) == self._storedir:
+                source = self._store(digest, source, report)
+
+        try:
+            if os.path.exists(scriptfile):
+                if os.path.samefile(scriptfile, source):
+                    report.skipped += 1
+
+                    return
+
+                os.remove(scriptfile)
+
+            os.link(source, scriptfile)
+
+            report.linked += 1
+        except OSError as e:
+            # no hardlinks across filesystems or on some filesystems,
+            # a copy of its own then
+            if not e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+            self._writefile(scriptfile, initscripttext, report, INITSCRIPT_MODE)
+
+
+    def _store(self, digest, firstfile, report):
+        if not os.path.isdir(self._storedir):
+            makedirs(self._storedir)
+
+        storefile = os.path.join(self._storedir, digest)
+
+        try:
+            if os.path.exists(storefile):
+                if os.path.samefile(storefile, firstfile):
+                    self._stored[digest] = storefile
+
+                    return storefile
+
+                os.remove(storefile)
+
+            os.link(firstfile, storefile)
+        except OSError as e:
+            if not e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+            return firstfile
+
+        report.stored += 1
+
+        self._stored[digest] = storefile
+
+        return storefile
+
+
+def makedirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError as e:
+        if not e.errno == errno.EEXIST:
+            raise
+
+
+def samecontent(filename, content):
+    ''' True when filename holds exactly content. '''
+    try:
+        with open(filename, 'r') as fd:
+            return fd.read() == content
+    except (IOError, OSError):
+        return False
@@ -0,0 +1,416 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import bisect
+import json
+import os
+import threading
+import time
+
+
+# the file a host keeps its metrics in, next to the lock file in its
+# work directory
+METRICSFILE = 'etce.docker.metrics.json'
+
+# the file written to a Prometheus node exporter textfile collector
+# directory
+TEXTFILE = 'etce_docker.prom'
+
+# latency histogram bucket upper bounds, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    'etce_docker_runs_total':
+        'Commands run, by command and result.',
+    'etce_docker_run_seconds':
+        'Duration of the last run of a command.',
+    'etce_docker_run_timestamp_seconds':
+        'Time the last run of a command finished.',
+    'etce_docker_containers':
+        'Containers planned for this host by the last run of a command.',
+    'etce_docker_containers_started_total':
+        'Containers started.',
+    'etce_docker_containers_failed_total':
+        'Containers that failed to start.',
+    'etce_docker_containers_removed_total':
+        'Containers removed.',
+    'etce_docker_hosts_failed_total':
+        'Remote hosts a field command failed on.',
+    'etce_docker_command_seconds':
+        'Latency of external commands, by tool and operation.',
+    'etce_docker_command_failures_total':
+        'External commands that failed, by tool and operation.',
+    'etce_docker_interface_wait_seconds':
+        'Time for a connected interface to appear in its container.',
+}
+
+
+class _Timer(object):
+    __slots__ = ('_metrics', '_name', '_labels', '_start')
+
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+
+        self._name = name
+
+        self._labels = labels
+
+        self._start = time.time()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exctype, excvalue, tb):
+        self._metrics.observe(self._name, time.time() - self._start, **self._labels)
+
+        return False
+
+
+class _NoTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exctype, excvalue, tb):
+        return False
+
+
+NOTIMER = _NoTimer()
+
+
+class Metrics(object):
+    ''' Counters, gauges and latency histograms of one command run,
+    written as a Prometheus textfile and as JSON.
+
+    Samples are keyed by name and a sorted tuple of label pairs.
+    Recording is one dictionary update under a lock, and until
+    enable() is called nothing is recorded at all.
+    '''
+    def __init__(self, buckets=BUCKETS):
+        self._buckets = tuple(buckets)
+
+        self._enabled = False
+
+        self._lock = threading.Lock()
+
+        self._counters = {}
+
+        self._gauges = {}
+
+        self._histograms = {}
+
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+
+    def enable(self):
+        ''' Start recording from empty. '''
+        with self._lock:
+            self._enabled = True
+
+            self._counters = {}
+
+            self._gauges = {}
+
+            self._histograms = {}
+
+
+    def disable(self):
+        self._enabled = False
+
+
+    def inc(self, name, value=1, **labels):
+        if not self._enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+
+    def set(self, name, value, **labels):
+        if not self._enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self._gauges[key] = value
+
+
+    def observe(self, name, seconds, **labels):
+        if not self._enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+
+        # the count of the first bucket holding seconds, cumulated on output
+        index = bisect.bisect_left(self._buckets, seconds)
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+
+            if histogram is None:
+                # [per bucket counts, +Inf last], sum, count
+                histogram = [ [0] * (len(self._buckets) + 1), 0.0, 0 ]
+
+                self._histograms[key] = histogram
+
+            histogram[0][index] += 1
+
+            histogram[1] += seconds
+
+            histogram[2] += 1
+
+
+    def timer(self, name, **labels):
+        ''' A context manager observing the duration of its block. '''
+        if not self._enabled:
+            return NOTIMER
+
+        return _Timer(self, name, labels)
+
+
+    def snapshot(self):
+        ''' The recorded samples as a JSON serializable dictionary. '''
+        with self._lock:
+            return {
+                'buckets':list(self._buckets),
+                'counters':[ {'name':name, 'labels':dict(labels), 'value':value}
+                             for (name,labels),value in sorted(self._counters.items()) ],
+                'gauges':[ {'name':name, 'labels':dict(labels), 'value':value}
+                           for (name,labels),value in sorted(self._gauges.items()) ],
+                'histograms':[ {'name':name,
+                                'labels':dict(labels),
+                                'counts':list(counts),
+                                'sum':total,
+                                'count':count}
+                               for (name,labels),(counts,total,count)
+                               in sorted(self._histograms.items()) ],
+            }
+
+
+def accumulate(previous, current):
+    ''' Add the samples of current, a snapshot, to those of previous,
+    so counters and histograms keep growing from run to run as
+    Prometheus expects. Gauges take the latest value. A previous
+    snapshot with other histogram buckets is discarded.
+    '''
+    if not previous or not previous.get('buckets') == current['buckets']:
+        return current
+
+    def key(sample):
+        return (sample['name'], tuple(sorted(sample['labels'].items())))
+
+    counters = dict([ (key(sample), dict(sample)) for sample in previous['counters'] ])
+
+    for sample in current['counters']:
+        if key(sample) in counters:
+            counters[key(sample)]['value'] += sample['value']
+        else:
+            counters[key(sample)] = sample
+
+    gauges = dict([ (key(sample), sample) for sample in previous['gauges'] ])
+
+    gauges.update([ (key(sample), sample) for sample in current['gauges'] ])
+
+    histograms = dict([ (key(sample), dict(sample)) for sample in previous['histograms'] ])
+
+    for sample in current['histograms']:
+        histogram = histograms.get(key(sample))
+
+        if histogram is None:
+            histograms[key(sample)] = sample
+        else:
+            histogram['counts'] = [ a + b for a,b in zip(histogram['counts'], sample['counts']) ]
+
+            histogram['sum'] += sample['sum']
+
+            histogram['count'] += sample['count']
+
+    return {
+        'buckets':current['buckets'],
+        'counters':[ counters[k] for k in sorted(counters) ],
+        'gauges':[ gauges[k] for k in sorted(gauges) ],
+        'histograms':[ histograms[k] for k in sorted(histograms) ],
+    }
+
+
+def exposition(snapshot):
+    ''' snapshot in the Prometheus text exposition format. '''
+    lines = []
+
+    typed = set([])
+
+    def header(name, metrictype):
+        if name in typed:
+            return
+
+        typed.add(name)
+
+        if name in HELP:
+            lines.append('# HELP %s %s' % (name, HELP[name]))
+
+        lines.append('# TYPE %s %s' % (name, metrictype))
+
+    def labelset(labels, extra=()):
+        pairs = sorted(labels.items()) + list(extra)
+
+        if not pairs:
+            return ''
+
+        return '{%s}' % ','.join([ '%s="%s"' % (label, escape(value))
+                                   for label,value in pairs ])
+
+    for sample in snapshot['counters']:
+        header(sample['name'], 'counter')
+
+        lines.append('%s%s %s' % (sample['name'], labelset(sample['labels']), number(sample['value'])))
+
+    for sample in snapshot['gauges']:
+        header(sample['name'], 'gauge')
+
+        lines.append('%s%s %s' % (sample['name'], labelset(sample['labels']), number(sample['value'])))
+
+    bounds = [ number(bound) for bound in snapshot['buckets'] ] + [ '+Inf' ]
+
+    for sample in snapshot['histograms']:
+        name = sample['name']
+
+        header(name, 'histogram')
+
+        cumulative = 0
+
+        for bound,count in zip(bounds, sample['counts']):
+            cumulative += count
+
+            lines.append('%s_bucket%s %d' % (name, labelset(sample['labels'], [('le', bound)]), cumulative))
+
+        lines.append('%s_sum%s %s' % (name, labelset(sample['labels']), number(sample['sum'])))
+
+        lines.append('%s_count%s %d' % (name, labelset(sample['labels']), sample['count']))
+
+    return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def number(value):
+    if isinstance(value, float):
+        return repr(value)
+
+    return str(value)
+
+
+def load(jsonfile):
+    ''' The snapshot kept in jsonfile, None when there is none. '''
+    try:
+        with open(jsonfile) as jsonf:
+            return json.load(jsonf)
+    except (IOError, ValueError):
+        return None
+
+
+def write(snapshot, jsonfile, textfiledir=None):
+    ''' Write snapshot to jsonfile and, given textfiledir, to the
+    Prometheus textfile there. Both are replaced by rename so a
+    reader never sees a partial file.
+    '''
+    writefile(jsonfile, json.dumps(snapshot, indent=1, sort_keys=True))
+
+    if textfiledir:
+        writefile(os.path.join(textfiledir, TEXTFILE), exposition(snapshot))
+
+
+def writefile(filename, content):
+    tmpname = filename + '.tmp'
+
+    with open(tmpname, 'w') as outf:
+        outf.write(content)
+
+    os.rename(tmpname, filename)
+
+
+class MeasuredCalls(object):
+    ''' Wraps target so each public method call is observed in the
+    etce_docker_command_seconds histogram, labelled with tool and the
+    method name, and each one raising counts as a failure.
+    '''
+    def __init__(self, target, tool, metrics):
+        self._target = target
+
+        self._tool = tool
+
+        self._metrics = metrics
+
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+
+        metrics = self._metrics
+
+        if not metrics.enabled or name.startswith('_') or not callable(attribute):
+            return attribute
+
+        tool = self._tool
+
+        def measured(*args, **kwargs):
+            start = time.time()
+
+            try:
+                return attribute(*args, **kwargs)
+            except Exception:
+                metrics.inc('etce_docker_command_failures_total', tool=tool, operation=name)
+
+                raise
+            finally:
+                metrics.observe('etce_docker_command_seconds',
+                                time.time() - start,
+                                tool=tool,
+                                operation=name)
+
+        return measured
+
+
+# the metrics of this process
+METRICS = Metrics()
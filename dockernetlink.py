@@ -0,0 +1,359 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+import errno
+import os
+import socket
+import struct
+
+
+NETLINK_ROUTE = 0
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_MASTER = 10
+IFLA_LINKINFO = 18
+
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+
+IFLA_VXLAN_ID = 1
+IFLA_VXLAN_GROUP = 2
+IFLA_VXLAN_LINK = 3
+
+IFLA_BR_MCAST_SNOOPING = 23
+
+IFF_UP = 0x1
+
+NLMSGHDR = struct.Struct('=LHHLL')
+IFINFOMSG = struct.Struct('=BxHiII')
+RTATTR = struct.Struct('=HH')
+
+# requests sent per sendmsg, the acks for one batch must fit in the
+# socket receive buffer
+BATCH_SIZE = 256
+
+VXLAN_GROUP = '239.1.1.1'
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _rtattr(attrtype, data):
+    length = RTATTR.size + len(data)
+
+    return RTATTR.pack(length, attrtype) + data + '\0' * (_align(length) - length)
+
+
+def _ifinfomsg(index=0, flags=0, change=0):
+    return IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change)
+
+
+class RTNetlink(object):
+    ''' A route netlink socket that sends link requests in batches.
+
+    Each request asks for an ack, so every request in a batch gets its
+    own errno back without waiting on a round trip per request.
+    '''
+    def __init__(self):
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+
+        self._sock.bind((0, 0))
+
+        self._seq = 0
+
+
+    def close(self):
+        self._sock.close()
+
+
+    def links(self):
+        ''' Return a map of link name to (index, flags) for every link
+        in the current network namespace.
+        '''
+        self._seq += 1
+
+        self._sock.send(self._message(RTM_GETLINK,
+                                      NLM_F_REQUEST | NLM_F_DUMP,
+                                      self._seq,
+                                      _ifinfomsg()))
+
+        links = {}
+
+        while True:
+            for msgtype,_,payload in self._receive():
+                if msgtype == NLMSG_DONE:
+                    return links
+
+                if msgtype == NLMSG_ERROR:
+                    error, = struct.unpack_from('=i', payload)
+
+                    raise OSError(-error, os.strerror(-error))
+
+                _,_,index,flags,_ = IFINFOMSG.unpack_from(payload)
+
+                for attrtype,data in self._attributes(payload[IFINFOMSG.size:]):
+                    if attrtype == IFLA_IFNAME:
+                        links[data.rstrip('\0')] = (index, flags)
+
+
+    def transact(self, requests):
+        ''' Send requests, a list of (key, msgtype, flags, body), and
+        return a map of key to the errno reported for it, 0 on success.
+        '''
+        results = {}
+
+        for i in range(0, len(requests), BATCH_SIZE):
+            pending = {}
+
+            buf = []
+
+            for key,msgtype,flags,body in requests[i:i+BATCH_SIZE]:
+                self._seq += 1
+
+                pending[self._seq] = key
+
+                buf.append(self._message(msgtype,
+                                         flags | NLM_F_REQUEST | NLM_F_ACK,
+                                         self._seq,
+                                         body))
+
+            self._sock.send(''.join(buf))
+
+            while pending:
+                for msgtype,seq,payload in self._receive():
+                    if msgtype == NLMSG_ERROR and seq in pending:
+                        error, = struct.unpack_from('=i', payload)
+
+                        results[pending.pop(seq)] = -error
+
+        return results
+
+
+    def _message(self, msgtype, flags, seq, body):
+        return NLMSGHDR.pack(NLMSGHDR.size + len(body), msgtype, flags, seq, 0) + body
+
+
+    def _receive(self):
+        data = self._sock.recv(1 << 16)
+
+        offset = 0
+
+        while offset + NLMSGHDR.size <= len(data):
+            length,msgtype,_,seq,_ = NLMSGHDR.unpack_from(data, offset)
+
+            yield msgtype,seq,data[offset+NLMSGHDR.size:offset+length]
+
+            offset += _align(length)
+
+
+    def _attributes(self, data):
+        offset = 0
+
+        while offset + RTATTR.size <= len(data):
+            length,attrtype = RTATTR.unpack_from(data, offset)
+
+            if length < RTATTR.size:
+                break
+
+            yield attrtype,data[offset+RTATTR.size:offset+length]
+
+            offset += _align(length)
+
+
+class NetlinkProvisioner(object):
+    ''' Build the bridges and vxlan tunnels of a host over a single
+    RTNetlink socket.
+
+    Missing links are created with their mtu, multicast snooping and up
+    state in one batch. A second batch brings links that already existed
+    to the same state and enslaves each bridge's addifs.
+    '''
+    def __init__(self, netlink):
+        self._netlink = netlink
+
+
+    def provision(self, bridges, vxlantunnels, enablemulticastsnooping=True):
+        ''' Return (created, existed, failed) where created and existed
+        are lists of link names and failed maps a link name to an
+        error message.
+        '''
+        links = self._netlink.links()
+
+        created = []
+
+        existed = []
+
+        failed = {}
+
+        requests = []
+
+        for vxlantunnel in vxlantunnels:
+            if vxlantunnel.name in links:
+                existed.append(vxlantunnel.name)
+            elif not vxlantunnel.device in links:
+                failed[vxlantunnel.name] = 'device "%s" not found' % vxlantunnel.device
+            else:
+                requests.append((vxlantunnel.name,
+                                 RTM_NEWLINK,
+                                 NLM_F_CREATE | NLM_F_EXCL,
+                                 self._vxlanbody(vxlantunnel, links)))
+
+        for bridge in bridges:
+            if bridge.devicename in links:
+                existed.append(bridge.devicename)
+            else:
+                requests.append((bridge.devicename,
+                                 RTM_NEWLINK,
+                                 NLM_F_CREATE | NLM_F_EXCL,
+                                 self._bridgebody(bridge, enablemulticastsnooping)))
+
+        for name,error in sorted(self._netlink.transact(requests).items()):
+            if error == 0:
+                created.append(name)
+            elif error == errno.EEXIST:
+                existed.append(name)
+            else:
+                failed[name] = os.strerror(error)
+
+        # second pass, needs the indices of the links just created
+        links = self._netlink.links()
+
+        requests = []
+
+        for vxlantunnel in vxlantunnels:
+            if vxlantunnel.name in existed:
+                requests.append((vxlantunnel.name,
+                                 RTM_NEWLINK,
+                                 0,
+                                 _ifinfomsg(links[vxlantunnel.name][0], IFF_UP, IFF_UP)))
+
+        for bridge in bridges:
+            if bridge.devicename in existed:
+                requests.append((bridge.devicename,
+                                 RTM_NEWLINK,
+                                 0,
+                                 self._bridgebody(bridge,
+                                                  enablemulticastsnooping,
+                                                  links[bridge.devicename][0])))
+
+            if not bridge.devicename in links:
+                continue
+
+            for addif in bridge.addifs:
+                if not addif in links:
+                    failed[addif] = 'addif of bridge %s not found' % bridge.devicename
+                    continue
+
+                requests.append((addif,
+                                 RTM_NEWLINK,
+                                 0,
+                                 _ifinfomsg(links[addif][0], IFF_UP, IFF_UP) + \
+                                 _rtattr(IFLA_MASTER,
+                                         struct.pack('=I', links[bridge.devicename][0]))))
+
+        for name,error in self._netlink.transact(requests).items():
+            if not error == 0:
+                failed[name] = os.strerror(error)
+
+        return created,existed,failed
+
+
+    def deprovision(self, names):
+        ''' Delete the named links in one batch. Return (removed, absent,
+        failed) where failed maps a link name to an error message.
+        '''
+        links = self._netlink.links()
+
+        absent = [ name for name in names if not name in links ]
+
+        requests = [ (name, RTM_DELLINK, 0, _ifinfomsg(links[name][0]))
+                     for name in names if name in links ]
+
+        removed = []
+
+        failed = {}
+
+        for name,error in sorted(self._netlink.transact(requests).items()):
+            if error == 0:
+                removed.append(name)
+            elif error == errno.ENODEV:
+                absent.append(name)
+            else:
+                failed[name] = os.strerror(error)
+
+        return removed,absent,failed
+
+
+    def _vxlanbody(self, vxlantunnel, links):
+        data = _rtattr(IFLA_VXLAN_ID, struct.pack('=I', int(vxlantunnel.id))) + \
+               _rtattr(IFLA_VXLAN_GROUP, socket.inet_aton(VXLAN_GROUP)) + \
+               _rtattr(IFLA_VXLAN_LINK, struct.pack('=I', links[vxlantunnel.device][0]))
+
+        return _ifinfomsg(0, IFF_UP, IFF_UP) + \
+               _rtattr(IFLA_IFNAME, vxlantunnel.name + '\0') + \
+               _rtattr(IFLA_LINKINFO,
+                       _rtattr(IFLA_INFO_KIND, 'vxlan') + \
+                       _rtattr(IFLA_INFO_DATA, data))
+
+
+    def _bridgebody(self, bridge, enablemulticastsnooping, index=0):
+        body = _ifinfomsg(index, IFF_UP, IFF_UP)
+
+        if not index:
+            body += _rtattr(IFLA_IFNAME, bridge.devicename + '\0')
+
+        if bridge.mtu:
+            body += _rtattr(IFLA_MTU, struct.pack('=I', int(bridge.mtu)))
+
+        data = _rtattr(IFLA_BR_MCAST_SNOOPING,
+                       struct.pack('=B', 1 if enablemulticastsnooping else 0))
+
+        return body + _rtattr(IFLA_LINKINFO,
+                              _rtattr(IFLA_INFO_KIND, 'bridge') + \
+                              _rtattr(IFLA_INFO_DATA, data))
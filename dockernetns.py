@@ -0,0 +1,74 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+import time
+
+from etce.dockererror import DOCKERError
+
+
+def interfacenames(pid):
+    ''' Return the names of the network interfaces visible in the
+    network namespace of process pid.
+    '''
+    # /proc/<pid>/net/dev is rendered from the namespace of pid, the
+    # first two lines are column headers
+    with open('/proc/%d/net/dev' % pid, 'r') as devf:
+        lines = devf.readlines()[2:]
+
+    return set([ line.split(':')[0].strip() for line in lines ])
+
+
+def waitforinterface(pid, ifname, timeout=10.0, pollinterval=0.001):
+    ''' Block until ifname exists in the network namespace of process
+    pid and return the number of seconds waited. Polling starts at
+    pollinterval and backs off to 50ms. Raises DOCKERError if the
+    interface does not appear within timeout seconds.
+    '''
+    start = time.time()
+
+    deadline = start + timeout
+
+    while True:
+        try:
+            if ifname in interfacenames(pid):
+                return time.time() - start
+        except IOError as e:
+            raise DOCKERError('Cannot read interfaces of pid %d: %s' % (pid, e))
+
+        if time.time() > deadline:
+            raise DOCKERError('Interface %s did not appear in the network ' \
+                              'namespace of pid %d within %gs.' % \
+                              (ifname, pid, timeout))
+
+        time.sleep(pollinterval)
+
+        pollinterval = min(pollinterval * 2, 0.05)
@@ -0,0 +1,209 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import errno
+import subprocess
+
+from etce.dockererror import DOCKERError
+from etce.dockermetrics import METRICS
+
+
+# applied to an interface without an "offloads" parameter
+DEFAULT_OFFLOADS = 'tx off'
+
+# ethtool -K short feature names and the names ethtool -k reports
+# them under, other names are passed and looked up as given
+FEATURES = {'rx':'rx-checksumming',
+            'tx':'tx-checksumming',
+            'sg':'scatter-gather',
+            'tso':'tcp-segmentation-offload',
+            'ufo':'udp-fragmentation-offload',
+            'gso':'generic-segmentation-offload',
+            'gro':'generic-receive-offload',
+            'lro':'large-receive-offload',
+            'rxvlan':'rx-vlan-offload',
+            'txvlan':'tx-vlan-offload',
+            'ntuple':'ntuple-filters',
+            'rxhash':'receive-hashing'}
+
+
+def parseoffloads(offloads, ifname):
+    ''' Split an "offloads" value such as "tx off gso off" into
+    (feature, setting) pairs. "none" or an empty value leaves the
+    interface alone.
+    '''
+    words = offloads.split()
+
+    if words == ['none']:
+        return []
+
+    if len(words) % 2 or \
+       not all([ setting in ('on', 'off') for setting in words[1::2] ]):
+        raise DOCKERError('Invalid offloads "%s" for interface %s, expected ' \
+                          '"feature on|off ...". Quitting.' % (offloads, ifname))
+
+    return zip(words[0::2], words[1::2])
+
+
+class OffloadResult(object):
+    ''' The effective state of the requested features of each
+    interface, None where it could not be read, and any interfaces
+    whose settings were refused.
+    '''
+    def __init__(self):
+        # [(ifname, [(feature, setting, state)])] in interface order
+        self.features = []
+
+        self.failed = []
+
+
+    def __nonzero__(self):
+        return bool(self.features or self.failed)
+
+
+    def __str__(self):
+        parts = []
+
+        for ifname,features in self.features:
+            states = []
+
+            for feature,setting,state in features:
+                if state is None:
+                    states.append('%s=?' % feature)
+                elif state.split()[0] == setting:
+                    states.append('%s=%s' % (feature, state))
+                else:
+                    states.append('%s=%s(wanted %s)' % (feature, state, setting))
+
+            parts.append('%s[%s]' % (ifname, ','.join(states)))
+
+        for ifname in self.failed:
+            parts.append('%s[refused]' % ifname)
+
+        return ' '.join(parts)
+
+
+class OffloadTuner(object):
+    ''' Applies the offload settings of all interfaces of a container
+    in one shell run in the container's network namespace, entered
+    from the host with nsenter, and reads back the resulting feature
+    state with ethtool -k. Where the namespace cannot be entered the
+    settings are applied through a single exec in the container
+    instead, and their state is not reported.
+    '''
+    def __init__(self, runtime):
+        self._runtime = runtime
+
+
+    def apply(self, docker_name, pid, requests):
+        ''' requests is [(ifname, [(feature, setting)])]. '''
+        result = OffloadResult()
+
+        requests = [ (ifname,features) for ifname,features in requests if features ]
+
+        if not requests:
+            return result
+
+        script = self._script(requests)
+
+        try:
+            with METRICS.timer('etce_docker_command_seconds', tool='nsenter', operation='offloads'):
+                proc = subprocess.Popen(['nsenter', '-t', str(pid), '-n', 'sh', '-c', script],
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+
+                out,_ = proc.communicate()
+        except OSError as e:
+            if not e.errno == errno.ENOENT:
+                raise
+
+            out = ''
+
+        if not out:
+            # no nsenter or not allowed to enter the namespace
+            self._runtime.execute(docker_name, self._setscript(requests))
+
+            result.features = [ (ifname, [ (FEATURES.get(f, f), s, None) for f,s in features ])
+                                for ifname,features in requests ]
+
+            return result
+
+        return self._parse(out, requests, result)
+
+
+    def _setscript(self, requests):
+        return '; '.join([ 'ethtool -K %s %s' % (ifname, ' '.join([ '%s %s' % fs for fs in features ]))
+                           for ifname,features in requests ])
+
+
+    def _script(self, requests):
+        # '!' marks an interface whose settings were refused, '@' starts
+        # the ethtool -k listing of an interface
+        lines = []
+
+        for ifname,features in requests:
+            lines.append('ethtool -K %s %s 2>/dev/null || echo "!%s"' % \
+                         (ifname, ' '.join([ '%s %s' % fs for fs in features ]), ifname))
+
+        for ifname,_ in requests:
+            lines.append('echo "@%s"; ethtool -k %s 2>/dev/null' % (ifname, ifname))
+
+        return '\n'.join(lines)
+
+
+    def _parse(self, out, requests, result):
+        states = {}
+
+        current = None
+
+        for line in out.splitlines():
+            if line.startswith('!'):
+                result.failed.append(line[1:])
+            elif line.startswith('@'):
+                current = states.setdefault(line[1:], {})
+            elif current is not None and ':' in line:
+                name,state = line.split(':', 1)
+
+                current[name.strip()] = state.strip()
+
+        for ifname,features in requests:
+            ifstates = states.get(ifname, {})
+
+            result.features.append(
+                (ifname,
+                 [ (FEATURES.get(feature, feature),
+                    setting,
+                    ifstates.get(FEATURES.get(feature, feature)) or None)
+                   for feature,setting in features ]))
+
+        return result
@@ -0,0 +1,152 @@
+#
+# Copyright (c) 2014-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+import cPickle
+import errno
+import hashlib
+import os
+import tempfile
+
+
+class DOCKERPlanCache(object):
+    ''' An on-disk store of compiled docker plans.
+
+    Entries are keyed by a content hash of the plan file and of the
+    configuration the plan expands against, so an edit to either one
+    simply misses the cache. Each hit refreshes the entry's mtime and
+    the least recently used entries are evicted once the store holds
+    more than maxentries entries or maxbytes bytes.
+    '''
+    # bump whenever the pickled plan model changes shape
+    VERSION = '4'
+
+    SUFFIX = '.plan'
+
+    def __init__(self, cachedir, maxentries=32, maxbytes=256*1024*1024):
+        self._cachedir = cachedir
+
+        self._maxentries = maxentries
+
+        self._maxbytes = maxbytes
+
+
+    def key(self, planfile, *parts):
+        digest = hashlib.sha1(self.VERSION)
+
+        with open(planfile, 'rb') as planf:
+            for chunk in iter(lambda: planf.read(1 << 16), ''):
+                digest.update(chunk)
+
+        for part in parts:
+            digest.update('\0' + repr(part))
+
+        return digest.hexdigest()
+
+
+    def load(self, key):
+        ''' Return the object stored under key or None. '''
+        entry = self._entry(key)
+
+        try:
+            with open(entry, 'rb') as entryf:
+                obj = cPickle.load(entryf)
+        except IOError:
+            return None
+        except Exception:
+            # an entry written by an incompatible version, drop it
+            self._remove(entry)
+
+            return None
+
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+
+        return obj
+
+
+    def store(self, key, obj):
+        try:
+            if not os.path.isdir(self._cachedir):
+                os.makedirs(self._cachedir)
+
+            fd,tmpname = tempfile.mkstemp(dir=self._cachedir)
+
+            with os.fdopen(fd, 'wb') as tmpf:
+                cPickle.dump(obj, tmpf, cPickle.HIGHEST_PROTOCOL)
+
+            os.rename(tmpname, self._entry(key))
+        except (IOError, OSError):
+            # the cache is only an optimization
+            return
+
+        self._evict()
+
+
+    def _entry(self, key):
+        return os.path.join(self._cachedir, key + self.SUFFIX)
+
+
+    def _evict(self):
+        entries = []
+
+        for name in os.listdir(self._cachedir):
+            if not name.endswith(self.SUFFIX):
+                continue
+
+            entry = os.path.join(self._cachedir, name)
+
+            try:
+                st = os.stat(entry)
+            except OSError:
+                continue
+
+            entries.append((st.st_mtime, st.st_size, entry))
+
+        entries.sort(reverse=True)
+
+        totalbytes = 0
+
+        for i,(_,size,entry) in enumerate(entries):
+            totalbytes += size
+
+            if i >= self._maxentries or totalbytes > self._maxbytes:
+                self._remove(entry)
+
+
+    def _remove(self, entry):
+        try:
+            os.remove(entry)
+        except OSError as e:
+            if not e.errno == errno.ENOENT:
+                raise
@@ -31,19 +31,127 @@
 #
 
 import copy
+import itertools
 import os.path
+import re
 import socket
 import sys
-from collections import defaultdict
+from collections import Mapping
+
+import lxml.etree
 
 import etce.utils
 import etce.xmldoc
 from etce.config import ConfigDictionary
 from etce.dockererror import DOCKERError
+from etce.dockerplancache import DOCKERPlanCache
+from etce.dockertrace import span,traced
 from etce.templateutils import format_string,TemplateError
 
 
+class FrozenDict(Mapping):
+    ''' An immutable mapping that iterates in the order its items were
+    given, a dict passed in keeps its own iteration order.
+
+    The order survives pickling, so a cached plan iterates its
+    interfaces, and so assigns ethN names, exactly like a freshly
+    parsed one.
+    '''
+    __slots__ = ('_keys', '_dict')
+
+    def __init__(self, items=()):
+        if isinstance(items, Mapping) or isinstance(items, dict):
+            items = items.items()
+
+        self._dict = {}
+
+        keys = []
+
+        for key,value in items:
+            if not key in self._dict:
+                keys.append(key)
+
+            self._dict[key] = value
+
+        self._keys = tuple(keys)
+
+
+    def __getitem__(self, key):
+        return self._dict[key]
+
+
+    def __contains__(self, key):
+        return key in self._dict
+
+
+    def __iter__(self):
+        return iter(self._keys)
+
+
+    def __len__(self):
+        return len(self._keys)
+
+
+    def __reduce__(self):
+        return (self.__class__, (self.items(),))
+
+
+    def __repr__(self):
+        return '{%s}' % ', '.join([ '%r: %r' % item for item in self.items() ])
+
+
+class OverlayScope(Mapping):
+    ''' A read only view over overlay layers, the last layer wins.
+
+    Layers are shared, not copied, so a scope per docker index costs
+    one small dict of the values that change per index.
+    '''
+    __slots__ = ('_layers',)
+
+    def __init__(self, *layers):
+        self._layers = layers
+
+
+    def __getitem__(self, key):
+        for layer in reversed(self._layers):
+            if key in layer:
+                return layer[key]
+
+        raise KeyError(key)
+
+
+    def __contains__(self, key):
+        for layer in self._layers:
+            if key in layer:
+                return True
+
+        return False
+
+
+    def __iter__(self):
+        keys = set([])
+
+        for layer in self._layers:
+            keys.update(layer)
+
+        return iter(keys)
+
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
 class Bridge(object):
+    __slots__ = ('_name',
+                 '_persistent',
+                 '_ipv4',
+                 '_ipv6',
+                 '_addifs',
+                 '_subnet',
+                 '_iprange',
+                 '_gateway',
+                 '_mtu')
+
     def __init__(self, bridgeelem):
         self._parse(bridgeelem)
 
@@ -69,23 +177,23 @@ class Bridge(object):
 
     @property
     def addifs(self):
-        return copy.copy(self._addifs)
+        return self._addifs
 
     @property
     def subnet(self):
-        return copy.copy(self._subnet)
+        return self._subnet
 
     @property
     def iprange(self):
-        return copy.copy(self._iprange)
+        return self._iprange
 
     @property
     def gateway(self):
-        return copy.copy(self._gateway)
+        return self._gateway
 
     @property
     def mtu(self):
-        return copy.copy(self._mtu)
+        return self._mtu
 
     def _parse(self, bridgeelem):
         self._name = str(bridgeelem.attrib['name'])
@@ -102,8 +210,8 @@ class Bridge(object):
         for ipv6 in bridgeelem.findall('./ipaddress/ipv6'):
             self._ipv6 = ipv6.text
 
-        self._addifs = [ str(addif.text) 
-                         for addif in bridgeelem.findall('./addif') ]
+        self._addifs = tuple([ str(addif.text)
+                               for addif in bridgeelem.findall('./addif') ])
 
         self._subnet = str(bridgeelem.attrib['subnet'])
 
@@ -139,12 +247,22 @@ class Bridge(object):
 
 
 class BridgeImplicit(object):
+    __slots__ = ('_name',
+                 '_persistent',
+                 '_ipv4',
+                 '_ipv6',
+                 '_addifs',
+                 '_subnet',
+                 '_iprange',
+                 '_gateway',
+                 '_mtu')
+
     def __init__(self, bridgename):
         self._name = bridgename
         self._persistent = False
         self._ipv4 = None
         self._ipv6 = None
-        self._addifs = []
+        self._addifs = ()
         self._subnet = None
         self._iprange = None
         self._gateway = None
@@ -204,7 +322,105 @@ class BridgeImplicit(object):
         return s
 
 
+# characters that can start template syntax, a string without any of
+# them renders to itself
+TEMPLATE_MARKERS = re.compile(r'[$%{}<#\\]')
+
+TEMPLATE_NAMES = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+# names through which a template can reach every overlay
+TEMPLATE_DYNAMIC_NAMES = frozenset(['context', 'pageargs', 'locals', 'globals', 'vars'])
+
+
+def format_text(text, overlays):
+    if isinstance(text, basestring) and not TEMPLATE_MARKERS.search(text):
+        return text
+
+    return format_string(text, overlays)
+
+
+class CompiledTemplate(object):
+    ''' A template string scanned once for the overlay names it can
+    reference.
+    '''
+    __slots__ = ('text', 'names', 'constant')
+
+    def __init__(self, text):
+        self.text = text
+
+        self.constant = \
+            not isinstance(text, basestring) or not TEMPLATE_MARKERS.search(text)
+
+        self.names = \
+            frozenset() if self.constant else frozenset(TEMPLATE_NAMES.findall(text))
+
+
+class TemplateRenderer(object):
+    ''' Renders the compiled templates of one container element.
+
+    varying holds the overlay names that differ between the element's
+    docker indices. A template that references none of them renders
+    the same for every index, so it is rendered once and reused.
+    '''
+    __slots__ = ('_varying', '_rendered')
+
+    def __init__(self, varying):
+        self._varying = frozenset(varying).union(TEMPLATE_DYNAMIC_NAMES)
+
+        self._rendered = {}
+
+
+    def render(self, template, overlays):
+        if template.constant:
+            return template.text
+
+        if not template.names.isdisjoint(self._varying):
+            return format_string(template.text, overlays)
+
+        if not template in self._rendered:
+            self._rendered[template] = format_string(template.text, overlays)
+
+        return self._rendered[template]
+
+
+def compile_initscript(text):
+    if not text:
+        return ()
+
+    return tuple([ CompiledTemplate(line.strip())
+                   for line in text.split('\n') if len(line.strip()) > 0 ])
+
+
+def freeze_interfaces(interfaces):
+    return FrozenDict([ (bridgename,FrozenDict(iparams))
+                        for bridgename,iparams in interfaces.items() ])
+
+
+def release(elem):
+    ''' Free a consumed element of a streamed parse. Clearing it
+    alone leaves an empty shell attached to its parent for the rest
+    of the parse.
+    '''
+    elem.clear()
+
+    parent = elem.getparent()
+
+    if parent is not None:
+        parent.remove(elem)
+
+
 class ContainerTemplate(object):
+    __slots__ = ('_params',
+                 '_interfaces',
+                 '_initscript',
+                 '_hosts_entries_ipv4',
+                 '_hosts_entries_ipv6',
+                 '_compiled_params',
+                 '_compiled_interfaces',
+                 '_compiled_hosts_entries_ipv4',
+                 '_compiled_hosts_entries_ipv6',
+                 '_compiled_initscript')
+
     def __init__(self, containertemplateelem, parent=None):
         self._params, \
         self._interfaces, \
@@ -212,38 +428,93 @@ class ContainerTemplate(object):
         self._hosts_entries_ipv4, \
         self._hosts_entries_ipv6 = self._parse(containertemplateelem, parent)
 
+        self._compile()
+
     @property
     def params(self):
-        return copy.copy(self._params)
+        return self._params
 
     @property
     def interfaces(self):
         # interfaces is a map of interface template name  to (name,val)
         # interface params
-        return copy.deepcopy(self._interfaces)
+        return self._interfaces
 
     @property
     def initscript(self):
-        return copy.copy(self._initscript)
+        return self._initscript
 
     @property
     def hosts_entries_ipv4(self):
-        return copy.copy(self._hosts_entries_ipv4)
+        return self._hosts_entries_ipv4
 
     @property
     def hosts_entries_ipv6(self):
-        return copy.copy(self._hosts_entries_ipv6)
+        return self._hosts_entries_ipv6
+
+    @property
+    def compiled_params(self):
+        return self._compiled_params
+
+    @property
+    def compiled_interfaces(self):
+        return self._compiled_interfaces
+
+    @property
+    def compiled_hosts_entries_ipv4(self):
+        return self._compiled_hosts_entries_ipv4
+
+    @property
+    def compiled_hosts_entries_ipv6(self):
+        return self._compiled_hosts_entries_ipv6
+
+    @property
+    def compiled_initscript(self):
+        return self._compiled_initscript
+
+    def _compile(self):
+        # compiled once per template, every container element using the
+        # template shares them. Tuples keep the iteration order of the
+        # mappings they are built from.
+        self._compiled_params = \
+            tuple([ (k,CompiledTemplate(v)) for k,v in self._params ])
+
+        self._compiled_interfaces = \
+            tuple([ (CompiledTemplate(bridgename),
+                     tuple([ (CompiledTemplate(iname),CompiledTemplate(ival))
+                             for iname,ival in paramdict.items() ]))
+                    for bridgename,paramdict in self._interfaces.items() ])
+
+        self._compiled_hosts_entries_ipv4 = \
+            tuple([ (CompiledTemplate(bridgename),CompiledTemplate(entryname))
+                    for bridgename,entryname in self._hosts_entries_ipv4.items() ])
+
+        self._compiled_hosts_entries_ipv6 = \
+            tuple([ (CompiledTemplate(bridgename),CompiledTemplate(entryname))
+                    for bridgename,entryname in self._hosts_entries_ipv6.items() ])
+
+        self._compiled_initscript = compile_initscript(self._initscript[1])
 
     def _parse(self, containertemplateelem, parent):
-        params = parent.params if parent else []
+        # build new values on top of the parent's, the parent is
+        # shared by its other children and is never changed
+        params = []
 
-        interfaces = parent.interfaces if parent else defaultdict(lambda: {})
+        interfaces = {}
 
         initscript = parent.initscript if parent else (None,None)
 
-        hosts_entries_ipv4 = parent.hosts_entries_ipv4 if parent else {}
+        hosts_entries_ipv4 = {}
+
+        hosts_entries_ipv6 = {}
+
+        if parent:
+            for bridgename,iparams in parent.interfaces.items():
+                interfaces[bridgename] = dict(iparams.items())
 
-        hosts_entries_ipv6 = parent.hosts_entries_ipv6 if parent else {}
+            hosts_entries_ipv4.update(parent.hosts_entries_ipv4.items())
+
+            hosts_entries_ipv6.update(parent.hosts_entries_ipv6.items())
 
         for paramelem in containertemplateelem.findall('./parameters/parameter'):
             # docker.utsname set by container element attribute
@@ -269,7 +540,7 @@ class ContainerTemplate(object):
             if entry_ipv6:
                 hosts_entries_ipv6[bridgename] = entry_ipv6
 
-            iparams = interfaces[bridgename]
+            iparams = interfaces.setdefault(bridgename, {})
 
             for paramelem in interfaceelem.findall('./parameter'):
                 iname = str(paramelem.attrib['name'])
@@ -281,37 +552,137 @@ class ContainerTemplate(object):
         for initscriptelem in containertemplateelem.findall('./initscript'):
             initscript = ('init.sh', initscriptelem.text)
 
-        return (params,
-                interfaces,
+        return ((parent.params if parent else ()) + tuple(params),
+                freeze_interfaces(interfaces),
                 initscript,
-                hosts_entries_ipv4,
-                hosts_entries_ipv6)
+                FrozenDict(hosts_entries_ipv4),
+                FrozenDict(hosts_entries_ipv6))
+
+
+class ContainerSpec(object):
+    ''' The contents of a <container> element, read once and shared
+    by all of its docker indices, with every template string compiled.
+    '''
+    __slots__ = ('_params',
+                 '_interfaces',
+                 '_initscript',
+                 '_compiled_initscript',
+                 '_readyfile')
+
+    def __init__(self, containerelem):
+        self._parse(containerelem)
+
+    @property
+    def params(self):
+        return self._params
+
+    @property
+    def interfaces(self):
+        return self._interfaces
+
+    @property
+    def initscript(self):
+        return self._initscript
+
+    @property
+    def compiled_initscript(self):
+        return self._compiled_initscript
+
+    @property
+    def readyfile(self):
+        return self._readyfile
+
+    def _parse(self, containerelem):
+        readyfile = containerelem.attrib.get('readyfile', None)
+
+        self._readyfile = CompiledTemplate(str(readyfile)) if readyfile else None
+
+        params = []
+
+        for paramelem in containerelem.findall('./parameters/parameter'):
+            if(str(paramelem.attrib['name']) == 'docker.utsname'):
+                # the docker_name is set by the container element atribute
+                print >>sys.stderr, \
+                    'Found docker.utsname in containertemplate. Ignoring'
+                continue
+
+            params.append((str(paramelem.attrib['name']),
+                           CompiledTemplate(str(paramelem.attrib['value']))))
+
+        self._params = tuple(params)
+
+        # (bridgename, hosts_entry_ipv4, hosts_entry_ipv6, ((name,value),...)),
+        # the hosts entries are None when the attribute is absent
+        interfaces = []
+
+        for interfaceelem in containerelem.findall('./interfaces/interface'):
+            entries = []
+
+            for attrname in ('hosts_entry_ipv4', 'hosts_entry_ipv6'):
+                entry = interfaceelem.attrib.get(attrname, None)
+
+                entries.append(CompiledTemplate(entry) if entry else None)
+
+            interfaces.append(
+                (CompiledTemplate(str(interfaceelem.attrib['bridge'])),
+                 entries[0],
+                 entries[1],
+                 tuple([ (CompiledTemplate(str(iparamelem.attrib['name'])),
+                          CompiledTemplate(str(iparamelem.attrib['value'])))
+                         for iparamelem in interfaceelem.findall('./parameter') ])))
+
+        self._interfaces = tuple(interfaces)
+
+        self._initscript = None
+
+        for initscriptelem in containerelem.findall('./initscript'):
+            self._initscript = ('init.sh', initscriptelem.text)
+
+        self._compiled_initscript = \
+            compile_initscript(self._initscript[1] if self._initscript else None)
 
 
 class Container(object):
+    __slots__ = ('_docker_name',
+                 '_docker_directory',
+                 '_params',
+                 '_interfaces',
+                 '_hosts_entries_ipv4',
+                 '_hosts_entries_ipv6',
+                 '_initscript',
+                 '_readyfile')
+
     def __init__(self, 
-                 containerelem,
+                 containerspec,
                  overlays,
                  commonparams, 
                  containertemplate, 
-                 bridges,
-                 hostname):
+                 hostname,
+                 renderer):
         self._docker_name = overlays['docker_name']
 
         self._docker_directory = overlays['docker_directory']
 
-        self._bridges = bridges
-
         self._params, \
         self._interfaces, \
         self._hosts_entries_ipv4, \
         self._hosts_entries_ipv6, \
-        self._initscript = self._parse(containerelem, 
+        self._initscript = self._parse(containerspec, 
                                        overlays, 
                                        commonparams, 
                                        containertemplate, 
-                                       bridges,
-                                       hostname)
+                                       hostname,
+                                       renderer)
+
+        self._readyfile = None
+
+        if containerspec.readyfile:
+            try:
+                self._readyfile = \
+                    os.path.join(self._docker_directory,
+                                 renderer.render(containerspec.readyfile, overlays))
+            except TemplateError as ne:
+                raise DOCKERError(str(ne))
 
 
     @property
@@ -342,13 +713,20 @@ class Container(object):
     def hosts_entries_ipv6(self):
         return self._hosts_entries_ipv6
 
+    @property
+    def readyfile(self):
+        ''' The file whose appearance marks the container ready, or
+        None when running is enough.
+        '''
+        return self._readyfile
+
     def _parse(self, 
-               containerelem, 
+               containerspec, 
                overlays, 
                commonparams, 
                containertemplate, 
-               bridges,
-               hostname):
+               hostname,
+               renderer):
         # assemble common (non-interface) params in order
         # 1. common template params
         # 2. commonparams passed in 
@@ -358,23 +736,25 @@ class Container(object):
         containerparams = \
             self._collate_container_params(containertemplate, 
                                            commonparams, 
-                                           containerelem, 
-                                           overlays)
+                                           containerspec, 
+                                           overlays,
+                                           renderer)
 
         # get all interface params and host names
         interfaces,hosts_entries_ipv4,hosts_entries_ipv6 = \
             self._process_interfaces(containertemplate, 
-                                     containerelem, 
-                                     overlays)
+                                     containerspec, 
+                                     overlays,
+                                     renderer)
 
         # get initscript
         initscript = \
-            self._get_initscript(containertemplate, containerelem, overlays)
+            self._get_initscript(containertemplate, containerspec, overlays, renderer)
 
-        return (containerparams,
+        return (tuple(containerparams),
                 interfaces,
-                hosts_entries_ipv4,
-                hosts_entries_ipv6,
+                tuple(hosts_entries_ipv4),
+                tuple(hosts_entries_ipv6),
                 initscript)
 
 
@@ -396,93 +776,75 @@ class Container(object):
     def _collate_container_params(self, 
                                   containertemplate, 
                                   commonparams, 
-                                  containerelem, 
-                                  overlays):
-
-        containerparams = [ ('docker.utsname', self.docker_name) ]
-
-        if containertemplate:
-            containerparams.extend(containertemplate.params)
-
-        for k,v in commonparams:
-            containerparams.append((k,v))
-
-        for paramelem in containerelem.findall('./parameters/parameter'):
-            if(str(paramelem.attrib['name']) == 'docker.utsname'):
-                # the docker_name is set by the container element atribute
-                print >>sys.stderr, \
-                    'Found docker.utsname in containertemplate. Ignoring'
-                continue
+                                  containerspec, 
+                                  overlays,
+                                  renderer):
+        try:
+            containerparams = [ ('docker.utsname', format_text(self.docker_name, overlays)) ]
 
-            containerparams.append((str(paramelem.attrib['name']),
-                                    str(paramelem.attrib['value'])))
+            if containertemplate:
+                for k,v in containertemplate.compiled_params:
+                    containerparams.append((k,renderer.render(v, overlays)))
 
-        for i,parampair in enumerate(containerparams):
-            k,v = parampair
+            for k,v in commonparams:
+                containerparams.append((k,format_text(v, overlays)))
 
-            try:
-                containerparams[i] = (k,format_string(v, overlays))
-            except TemplateError as ne:
-                raise DOCKERError(str(ne))
+            for k,v in containerspec.params:
+                containerparams.append((k,renderer.render(v, overlays)))
+        except TemplateError as ne:
+            raise DOCKERError(str(ne))
 
         return containerparams
 
 
-    def _process_interfaces(self, containertemplate, containerelem, overlays):
-        interfaces = defaultdict(lambda: {})
+    def _process_interfaces(self, containertemplate, containerspec, overlays, renderer):
+        interfaces = {}
 
         bridge_entry_ipv4 = {}
 
         bridge_entry_ipv6 = {}
 
+        render = renderer.render
+
         try:
             if containertemplate:
-                for bridgename,paramdict in containertemplate.interfaces.items():
-                    bridgename = format_string(bridgename, overlays)
-                    for iname,ival in paramdict.items():
-                        interfaces[bridgename][format_string(iname, overlays)] = \
-                            format_string(ival, overlays)
+                for bridgename,paramlist in containertemplate.compiled_interfaces:
+                    bridgename = render(bridgename, overlays)
+                    iparams = interfaces.setdefault(bridgename, {})
+                    for iname,ival in paramlist:
+                        iparams[render(iname, overlays)] = render(ival, overlays)
 
                 for bridgename, entryname in \
-                    containertemplate.hosts_entries_ipv4.items():
-                    bridgename = format_string(bridgename, overlays)
-                    bridge_entry_ipv4[bridgename] = format_string(entryname, overlays)
+                    containertemplate.compiled_hosts_entries_ipv4:
+                    bridgename = render(bridgename, overlays)
+                    bridge_entry_ipv4[bridgename] = render(entryname, overlays)
 
                 for bridgename, entryname in \
-                    containertemplate.hosts_entries_ipv6.items():
-                    bridgename = format_string(bridgename, overlays)
-                    bridge_entry_ipv6[bridgename] = format_string(entryname, overlays)
+                    containertemplate.compiled_hosts_entries_ipv6:
+                    bridgename = render(bridgename, overlays)
+                    bridge_entry_ipv6[bridgename] = render(entryname, overlays)
 
             # overwrite with local values from container
-            for interfaceelem in containerelem.findall('./interfaces/interface'):
-                bridgename = format_string(str(interfaceelem.attrib['bridge']), overlays)
-
-                interfaceparams = interfaces[bridgename]
-
-                for iparamelem in interfaceelem.findall('./parameter'):
-                    iname = format_string(str(iparamelem.attrib['name']), overlays)
+            for bridgename,entry_ipv4,entry_ipv6,paramlist in containerspec.interfaces:
+                bridgename = render(bridgename, overlays)
 
-                    ival = format_string(str(iparamelem.attrib['value']), overlays)
+                interfaceparams = interfaces.setdefault(bridgename, {})
 
-                    interfaceparams[iname] =  ival
+                for iname,ival in paramlist:
+                    interfaceparams[render(iname, overlays)] = render(ival, overlays)
 
-                entry_name_ipv4 = \
-                    interfaceelem.attrib.get(
-                        'hosts_entry_ipv4', 
-                        bridge_entry_ipv4.get(bridgename, None))
-
-                if entry_name_ipv4:
+                # an entry inherited from the template is rendered again
+                if entry_ipv4:
+                    bridge_entry_ipv4[bridgename] = render(entry_ipv4, overlays)
+                elif bridge_entry_ipv4.get(bridgename, None):
                     bridge_entry_ipv4[bridgename] = \
-                        format_string(entry_name_ipv4, overlays)
-
-                entry_name_ipv6 = \
-                    interfaceelem.attrib.get(
-                        'hosts_entry_ipv6', 
-                        bridge_entry_ipv6.get(bridgename, None))
+                        format_text(bridge_entry_ipv4[bridgename], overlays)
 
-                if entry_name_ipv6:
+                if entry_ipv6:
+                    bridge_entry_ipv6[bridgename] = render(entry_ipv6, overlays)
+                elif bridge_entry_ipv6.get(bridgename, None):
                     bridge_entry_ipv6[bridgename] = \
-                        format_string(entry_name_ipv6, overlays)
+                        format_text(bridge_entry_ipv6[bridgename], overlays)
 
         except TemplateError as ne:
             raise DOCKERError(str(ne))
@@ -491,7 +853,7 @@ class Container(object):
         hosts_entries_ipv4 = []
 
         for bridgename,entry_name_ipv4 in bridge_entry_ipv4.items():
-            if not 'ipv4' in interfaces[bridgename]:
+            if not 'ipv4' in interfaces.get(bridgename, {}):
                 error = 'Found hosts_entry_ipv4 attribute for ' \
                         'bridge "%s" for container "%s" but ' \
                         'no corresponding "ipv4" ' \
@@ -506,7 +868,7 @@ class Container(object):
         hosts_entries_ipv6 = []
 
         for bridgename,entry_name_ipv6 in bridge_entry_ipv6.items():
-            if not 'ipv6' in interfaces[bridgename]:
+            if not 'ipv6' in interfaces.get(bridgename, {}):
                 error = 'Found hosts_entry_ipv6 attribute for ' \
                         'bridge "%s" for container "%s" but ' \
                         'no corresponding "ipv6" ' \
@@ -518,48 +880,212 @@ class Container(object):
 
             hosts_entries_ipv6.append((entry_name_ipv6,  addr))
 
-        return interfaces,hosts_entries_ipv4,hosts_entries_ipv6
+        return freeze_interfaces(interfaces),hosts_entries_ipv4,hosts_entries_ipv6
 
 
 
-    def _get_initscript(self, containertemplate, containerelem, overlays):
+    def _get_initscript(self, containertemplate, containerspec, overlays, renderer):
         initscript= ('',None)
 
+        lines = []
+
         if containertemplate:
             initscript = containertemplate.initscript
 
-        for initscriptelem in containerelem.findall('./initscript'):
-            initscript = ('init.sh', initscriptelem.text)
-
-        if initscript[1]:
-            lines = []
+            lines = containertemplate.compiled_initscript
 
-            for line in initscript[1].split('\n'):
-                line = line.strip()
+        if containerspec.initscript:
+            initscript = containerspec.initscript
 
-                if len(line) > 0:
-                    lines.append(format_string(line.strip(), overlays))
+            lines = containerspec.compiled_initscript
 
-            initscript = (initscript[0], '\n'.join(lines))
+        if initscript[1]:
+            initscript = (initscript[0],
+                          '\n'.join([ renderer.render(line, overlays)
+                                      for line in lines ]))
 
         return initscript
 
 
 
     def __str__(self):
-        s = ''
-        for k,v in self._params:
-            s += '%s=%s\n' % (k,v)
+        # collected and joined once, the config of a container with many
+        # parameters and interfaces is rendered in linear time
+        lines = [ '%s=%s\n' % (k,v) for k,v in self._params ]
         for bridgename,interfaceparams in self._interfaces.items():
-            s += '\n# %s interface\n' % bridgename
-            for k,v in sorted(interfaceparams.items()):
-                s += '%s=%s\n' % (k,v)
-            s += 'link=%s\n' % self._bridges[bridgename].name
+            lines.append('\n# %s interface\n' % bridgename)
+            lines.extend([ '%s=%s\n' % (k,v) for k,v in sorted(interfaceparams.items()) ])
+            lines.append('link=%s\n' % bridgename)
+
+        return ''.join(lines)
+
+
+class ContainerGroup(object):
+    ''' The containers of one <container> element.
+
+    State shared by all docker indices (the element, its template,
+    overlays and compiled templates) is held once. Containers are
+    materialized one index at a time as the group is iterated and are
+    not kept, so a large docker_indices range costs little memory.
+    '''
+    __slots__ = ('_containerspec',
+                 '_containertemplate',
+                 '_commonparams',
+                 '_renderer',
+                 '_layers',
+                 '_overlaylists',
+                 '_dockerids',
+                 '_docker_names',
+                 '_root_directory',
+                 '_hostname')
+
+    def __init__(self,
+                 containerspec,
+                 containertemplate,
+                 commonparams,
+                 renderer,
+                 layers,
+                 overlaylists,
+                 dockerids,
+                 docker_name_template,
+                 root_directory,
+                 hostname):
+        self._containerspec = containerspec
 
-        return s
+        self._containertemplate = containertemplate
+
+        self._commonparams = commonparams
+
+        self._renderer = renderer
+
+        self._layers = layers
+
+        self._overlaylists = overlaylists
+
+        self._dockerids = tuple(dockerids)
+
+        self._root_directory = root_directory
+
+        self._hostname = hostname
+
+        self._docker_names = \
+            tuple([ format_string(docker_name_template, self._overlays(i)[1])
+                    for i in range(len(self._dockerids)) ])
+
+    @property
+    def docker_names(self):
+        return self._docker_names
+
+    def rerooted(self, root_directory):
+        ''' A copy of the group whose container directories are under
+        root_directory.
+        '''
+        group = copy.copy(self)
+
+        group._root_directory = root_directory
+
+        return group
+
+    def bridgenames(self):
+        ''' The bridge names the group's containers attach to, in the
+        order the containers list them.
+        '''
+        render = self._renderer.render
+
+        bridgenames = []
+
+        try:
+            for i in range(len(self._dockerids)):
+                _,overlays = self._overlays(i)
+
+                # collected in a dict, like Container interfaces are, to
+                # iterate in the same order
+                names = {}
+
+                if self._containertemplate:
+                    for bridgename,_ in self._containertemplate.compiled_interfaces:
+                        names.setdefault(render(bridgename, overlays))
+
+                for bridgename,_,_,_ in self._containerspec.interfaces:
+                    names.setdefault(render(bridgename, overlays))
+
+                bridgenames.extend(names)
+        except TemplateError as ne:
+            raise DOCKERError(str(ne))
+
+        return bridgenames
+
+    def _overlays(self, i):
+        # the only layer that is built per index
+        indexoverlays = {}
+
+        for oname,ovals in self._overlaylists.items():
+            indexoverlays[oname] = ovals[i]
+
+        # dockerindex, docker_name and docker_directory (cannot be overwritten)
+        indexoverlays['docker_index'] = self._dockerids[i]
+
+        return indexoverlays,OverlayScope(*(self._layers + (indexoverlays,)))
+
+    def _container(self, i):
+        indexoverlays,overlays = self._overlays(i)
+
+        indexoverlays['docker_name'] = self._docker_names[i]
+
+        indexoverlays['docker_directory'] = \
+            os.path.join(self._root_directory, self._docker_names[i])
+
+        return Container(self._containerspec,
+                         overlays,
+                         self._commonparams,
+                         self._containertemplate,
+                         self._hostname,
+                         self._renderer)
+
+    def __iter__(self):
+        for i in range(len(self._dockerids)):
+            yield self._container(i)
+
+    def __len__(self):
+        return len(self._dockerids)
+
+
+class ContainerSequence(object):
+    ''' The containers of a host, in plan order, over its container
+    groups. Every iteration materializes the containers afresh.
+    '''
+    __slots__ = ('_groups',)
+
+    def __init__(self, groups=()):
+        self._groups = tuple(groups)
+
+    @property
+    def groups(self):
+        return self._groups
+
+    @property
+    def docker_names(self):
+        return [ docker_name
+                 for group in self._groups
+                 for docker_name in group.docker_names ]
+
+    def rerooted(self, root_directory):
+        return ContainerSequence([ group.rerooted(root_directory)
+                                   for group in self._groups ])
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._groups)
+
+    def __len__(self):
+        return sum([ len(group) for group in self._groups ])
+
+    def __nonzero__(self):
+        return any([ len(group) for group in self._groups ])
 
 
 class VXLanTunnel(object):
+    __slots__ = ('_name', '_device', '_id')
+
     def __init__(self, vxlantunnelelem):
         self._parse(vxlantunnelelem)
 
@@ -584,7 +1110,7 @@ class VXLanTunnel(object):
 
 
 class DOCKERPlanFileDoc(etce.xmldoc.XMLDoc):
-    def __init__(self, dockerplanfile):
+    def __init__(self, dockerplanfile, cache=True, lazy=False, stream=False):
         etce.xmldoc.XMLDoc.__init__(self, 'dockerplanfile.xsd')
 
         if not os.path.isfile(dockerplanfile):
@@ -592,13 +1118,73 @@ class DOCKERPlanFileDoc(etce.xmldoc.XMLDoc):
         
         self._dockerplanfile = dockerplanfile
 
-        # just xml parse first
-        self._hostnames, \
-        self._kernelparameters, \
-        self._vxlantunnels, \
-        self._bridges, \
-        self._containers, \
-        self._rootdirectories = self._parseplan(dockerplanfile)
+        self._plancache = None
+
+        # streaming expands every host as it is read
+        self._lazy = lazy and not stream
+
+        self._kernelparameters = {}
+
+        self._vxlantunnels = {}
+
+        self._bridges = {}
+
+        self._containers = {}
+
+        self._rootdirectories = {}
+
+        # read the etce configuration once, every host and container
+        # expands against the same values
+        config = ConfigDictionary()
+
+        self._workdir = config.get('etce', 'WORK_DIRECTORY')
+
+        self._configoverlays = config.asdict()['overlays']
+
+        if cache:
+            # the expanded plan depends on the plan file and on the
+            # etce configuration values it is expanded against
+            self._plancache = DOCKERPlanCache(os.path.join(self._workdir, 'dockerplancache'))
+
+            self._cachekey = \
+                self._plancache.key(dockerplanfile,
+                                    self._workdir,
+                                    sorted(self._configoverlays.items()))
+
+            if not self._lazy:
+                plan = self._plancache.load(self._cachekey)
+
+                if plan:
+                    self._hostnames, \
+                    self._kernelparameters, \
+                    self._vxlantunnels, \
+                    self._bridges, \
+                    self._containers, \
+                    self._rootdirectories = plan
+
+                    return
+
+        if stream:
+            self._hostnames = self._streamplan(dockerplanfile)
+        else:
+            # just xml parse first, hosts are expanded on first access
+            self._hostnames, \
+            self._containertemplates, \
+            self._hostelems = self._parseplan(dockerplanfile)
+
+            if not lazy:
+                for hostname,_ in self._hostnames:
+                    self._expandhost(hostname)
+
+        if not self._lazy:
+            if cache:
+                self._plancache.store(self._cachekey,
+                                      (self._hostnames,
+                                       self._kernelparameters,
+                                       self._vxlantunnels,
+                                       self._bridges,
+                                       self._containers,
+                                       self._rootdirectories))
 
 
     def planfile(self):
@@ -606,89 +1192,62 @@ class DOCKERPlanFileDoc(etce.xmldoc.XMLDoc):
 
 
     def hostnames(self):
-        return copy.copy(self._hostnames)
+        return self._hostnames
 
 
     def kernelparameters(self, hostname):
-        if hostname in self._kernelparameters:
-            return self._kernelparameters[hostname]
-
-        return self._kernelparameters.get('localhost',{})
+        return self._kernelparameters.get(self._host(hostname), FrozenDict())
 
 
     def vxlantunnels(self, hostname):
-        if hostname in self._vxlantunnels:
-            return self._vxlantunnels[hostname]
-
-        return self._vxlantunnels.get('localhost',{})
+        return self._vxlantunnels.get(self._host(hostname), FrozenDict())
 
 
     def bridges(self, hostname):
-        if hostname in self._bridges:
-            return self._bridges[hostname]
-
-        return self._bridges.get('localhost', {})
+        return self._bridges.get(self._host(hostname), FrozenDict())
 
 
     def docker_root_directory(self, hostname):
-        if hostname in self._rootdirectories:
-            return self._rootdirectories[hostname]
-
-        return self._rootdirectories.get('localhost', None)
+        return self._rootdirectories.get(self._host(hostname), None)
 
 
     def containers(self, hostname):
-        if hostname in self._containers:
-            return self._containers[hostname]
+        return self._containers.get(self._host(hostname), ContainerSequence())
 
-        return self._containers.get('localhost', [])
 
+    def _host(self, hostname):
+        # 'localhost' stands in for any host not named in the plan
+        if not hostname in self._rootdirectories:
+            if not hostname in dict(self._hostnames):
+                hostname = 'localhost'
 
-    def _parseplan(self, dockerplanfile): 
-        dockerplanelem = self.parse(dockerplanfile)
+                if not hostname in dict(self._hostnames):
+                    return None
 
-        kernelparameters = {}
+            if not hostname in self._rootdirectories:
+                self._expandhost(hostname)
 
-        vxlantunnels = {}
+        return hostname
 
-        containertemplates = {}
 
-        rootdirectories = {}
+    @traced('parseplan')
+    def _parseplan(self, dockerplanfile): 
+        dockerplanelem = self.parse(dockerplanfile)
+
+        containertemplates = {}
 
         dockerplanelems = \
             dockerplanelem.findall('./containertemplates/containertemplate')
 
         for containertemplateelem in dockerplanelems:
-            containertemplate_name = containertemplateelem.attrib['name']
-
-            containertemplate_parent_name = \
-                containertemplateelem.attrib.get('parent', None)
-
-            containertemplate_parent = None
-
-            if containertemplate_parent_name:
-                if not containertemplate_parent_name in containertemplates:
-                    errmsg = 'parent "%s" of containertemplate "%s" not ' \
-                             'previously listed. Quitting.' % \
-                             (containertemplate_parent_name,
-                              containertemplate_name)
-                    raise DOCKERError(errmsg)
-
-                containertemplate_parent = \
-                    containertemplates[containertemplate_parent_name]
-
-            containertemplates[containertemplate_name] = \
-                ContainerTemplate(containertemplateelem, 
-                                  containertemplate_parent)
+            self._addcontainertemplate(containertemplates, containertemplateelem)
                                             
         hostelems = dockerplanelem.findall('./hosts/host')
 
-        bridges = {}
-
-        containers = {}
-
         hostnames = []
 
+        hostelemmap = {}
+
         for hostelem in hostelems:
             hostname = hostelem.attrib.get('hostname').lower()
             ip = hostelem.attrib.get('ip')
@@ -703,133 +1262,278 @@ class DOCKERPlanFileDoc(etce.xmldoc.XMLDoc):
                             'host is specified. Quitting'
                     raise DOCKERError(error)
 
-            # kernel params
-            kernelparameters[hostname] = {}
+            hostelemmap[hostname] = hostelem
 
-            for paramelem in hostelem.findall('./kernelparameters/parameter'):
-                kernelparameters[hostname][paramelem.attrib['name']] = \
-                    paramelem.attrib['value']
+        return tuple(hostnames),containertemplates,hostelemmap
 
-            vxlantunnels[hostname] = {}
-            for vxlantunnelelem in hostelem.findall('./vxlantunnels/vxlantunnel'):
-                vxlantunnel = VXLanTunnel(vxlantunnelelem)
-                vxlantunnels[hostname][vxlantunnel.name] = vxlantunnel
 
-            # bridges (explicit)
-            bridges[hostname] = {}
+    def _addcontainertemplate(self, containertemplates, containertemplateelem):
+        containertemplate_name = containertemplateelem.attrib['name']
 
-            for bridgeelem in hostelem.findall('./bridges/bridge'):
-                bridge = Bridge(bridgeelem)
+        containertemplate_parent_name = \
+            containertemplateelem.attrib.get('parent', None)
 
-                bridges[hostname][bridge.name] = bridge
+        containertemplate_parent = None
 
-            containers[hostname] = []
+        if containertemplate_parent_name:
+            if not containertemplate_parent_name in containertemplates:
+                errmsg = 'parent "%s" of containertemplate "%s" not ' \
+                         'previously listed. Quitting.' % \
+                         (containertemplate_parent_name,
+                          containertemplate_name)
+                raise DOCKERError(errmsg)
 
-            params = []
+            containertemplate_parent = \
+                containertemplates[containertemplate_parent_name]
 
-            containerselem = hostelem.findall('./containers')[0]
+        containertemplates[containertemplate_name] = \
+            ContainerTemplate(containertemplateelem, 
+                              containertemplate_parent)
 
-            root_directory = \
-                os.path.join(ConfigDictionary().get('etce', 'WORK_DIRECTORY'), 'dockerroot')
-            
-            rootdirectories[hostname] = root_directory
 
-            # ensure no repeated docker_name
-            alldockerids = set([])
+    @traced('streamplan')
+    def _streamplan(self, dockerplanfile):
+        ''' Validate and expand the plan one <containertemplate> and one
+        <host> at a time, releasing each element once it is consumed,
+        so memory tracks the largest host rather than the whole file.
+        '''
+        schema = lxml.etree.XMLSchema(
+            lxml.etree.parse(os.path.join(os.path.dirname(__file__), 'dockerplanfile.xsd')))
+
+        self._containertemplates = {}
+
+        self._hostelems = {}
+
+        hostnames = []
+
+        # hosts read before <containertemplates>, that use a template
+        # not yet seen, wait for it to close
+        templatesread = False
+
+        deferred = []
+
+        context = lxml.etree.iterparse(dockerplanfile,
+                                       events=('end',),
+                                       tag=('containertemplate',
+                                            'containertemplates',
+                                            'host'),
+                                       schema=schema,
+                                       remove_comments=True)
+
+        try:
+            for _,elem in context:
+                # some schema violations are only raised once the parse
+                # completes, do not consume an element after one
+                errors = context.error_log.filter_from_errors()
+
+                if errors:
+                    raise DOCKERError('dockerplanfile "%s" is not valid: %s. Quitting.' % \
+                                      (dockerplanfile, errors[0].message.rstrip('.')))
 
-            # Create containers from container elems
-            for containerelem in hostelem.findall('./containers/container'):
-                templatename = containerelem.attrib.get('template', None)
+                if elem.tag == 'containertemplate':
+                    self._addcontainertemplate(self._containertemplates, elem)
 
-                template = containertemplates.get(templatename, None)
+                    release(elem)
 
-                dockerids = etce.utils.nodestr_to_nodelist(
-                    str(containerelem.attrib['docker_indices']))
+                elif elem.tag == 'containertemplates':
+                    templatesread = True
 
-                # fetch the overlays, use etce file values as default
-                overlays = ConfigDictionary().asdict()['overlays']
+                    for hostname,hostelem in deferred:
+                        self._streamhost(hostname, hostelem)
 
-                for overlayelem in containerelem.findall('./overlays/overlay'):
-                    oname = overlayelem.attrib['name']
+                    deferred = []
 
-                    ovalue = overlayelem.attrib['value']
+                else:
+                    hostname = elem.attrib.get('hostname').lower()
 
-                    overlays[oname] = etce.utils.configstrtoval(ovalue)
+                    hostnames.append((hostname, elem.attrib.get('ip')))
 
-                # fetch the overlaylists
-                overlaylists = {}
+                    templatenames = set([ containerelem.attrib['template']
+                                          for containerelem
+                                          in elem.findall('./containers/container')
+                                          if 'template' in containerelem.attrib ])
 
-                for overlaylistelem in containerelem.findall('./overlays/overlaylist'):
-                    oname = overlaylistelem.attrib['name']
+                    if templatesread or templatenames.issubset(self._containertemplates):
+                        self._streamhost(hostname, elem)
+                    else:
+                        deferred.append((hostname, elem))
 
-                    separator = overlaylistelem.attrib.get('separator',',')
+        except lxml.etree.XMLSyntaxError as e:
+            raise DOCKERError('dockerplanfile "%s" is not valid: %s. Quitting.' % \
+                              (dockerplanfile, e))
 
-                    ovalues = overlaylistelem.attrib['values'].split(separator)
+        for hostname,hostelem in deferred:
+            self._streamhost(hostname, hostelem)
 
-                    overlaylists[oname] = ovalues
+        # 'localhost' is permitted as a catchall hostname to mean the
+        # local machine only when one host is specified in the file
+        if 'localhost' in dict(hostnames) and len(hostnames) > 1:
+            error = '"localhost" hostname only permitted when one ' \
+                    'host is specified. Quitting'
+            raise DOCKERError(error)
 
-                # treat all values for each name as an int if possible,
-                # else all strings
-                for oname,ovals in overlaylists.items():
-                    converted_vals = []
-                    try:
-                        converted_vals = [ etce.utils.configstrtoval(oval)
-                                           for oval in ovals ]
+        return tuple(hostnames)
 
-                        overlaylists[oname] = converted_vals
-                    except ValueError:
-                        # leave as strings
-                        pass
 
-                # Why must a default value be supplied here when
-                # schema declares this attribute with a default value?
-                for i,dockerid in enumerate(dockerids):
-                    # start with overlays
-                    dockeroverlays = copy.copy(overlays)
+    def _streamhost(self, hostname, hostelem):
+        self._hostelems[hostname] = hostelem
 
-                    # then add list items for this node
-                    for oname,ovals in overlaylists.items():
-                        dockeroverlays[oname] = ovals[i]
+        self._expandhost(hostname)
 
-                    # then dockerindex, docker_name and docker_directory (cannot be overwritten)
-                    dockeroverlays.update(
-                        {'docker_index':dockerid})
+        del self._hostelems[hostname]
 
-                    dockeroverlays.update(
-                        {'docker_name':format_string(containerelem.attrib['docker_name'], dockeroverlays)})
+        release(hostelem)
 
-                    dockeroverlays.update(
-                        {'docker_directory':os.path.join(root_directory, dockeroverlays['docker_name'])})
 
-                    containerdockerids = [str(dockeroverlays['docker_name'])]
+    def _expandhost(self, hostname):
+        with span('expandhost', host=hostname):
+            # in lazy mode each host is cached on its own
+            if self._plancache and self._lazy:
+                key = '%s-%s' % (self._cachekey, hostname)
 
-                    repeatedids = alldockerids.intersection(containerdockerids)
+                host = self._plancache.load(key)
 
-                    if len(repeatedids) > 0:
-                        error = 'Duplicate docker_name {%s} found in DOCKER Plan File "%s" are not permitted. Quitting.' % \
-                                (','.join([str(nid) for nid in list(repeatedids)]),
-                                 dockerplanfile)
+                if host is None:
+                    host = self._parsehost(hostname)
 
-                        raise DOCKERError(error)
+                    self._plancache.store(key, host)
+            else:
+                host = self._parsehost(hostname)
+
+        self._kernelparameters[hostname], \
+        self._vxlantunnels[hostname], \
+        self._bridges[hostname], \
+        self._containers[hostname], \
+        self._rootdirectories[hostname] = host
+
+
+    def _parsehost(self, hostname):
+        hostelem = self._hostelems[hostname]
+
+        containertemplates = self._containertemplates
+
+        dockerplanfile = self._dockerplanfile
+
+        # kernel params
+        kernelparameters = {}
+
+        for paramelem in hostelem.findall('./kernelparameters/parameter'):
+            kernelparameters[paramelem.attrib['name']] = \
+                paramelem.attrib['value']
+
+        vxlantunnels = {}
+        for vxlantunnelelem in hostelem.findall('./vxlantunnels/vxlantunnel'):
+            vxlantunnel = VXLanTunnel(vxlantunnelelem)
+            vxlantunnels[vxlantunnel.name] = vxlantunnel
+
+        # bridges (explicit)
+        bridges = {}
+
+        for bridgeelem in hostelem.findall('./bridges/bridge'):
+            bridge = Bridge(bridgeelem)
+
+            bridges[bridge.name] = bridge
+
+        groups = []
+
+        params = []
+
+        root_directory = os.path.join(self._workdir, 'dockerroot')
+
+        # ensure no repeated docker_name
+        alldockerids = set([])
+
+        # Create containers from container elems
+        for containerelem in hostelem.findall('./containers/container'):
+            templatename = containerelem.attrib.get('template', None)
+
+            template = containertemplates.get(templatename, None)
+
+            dockerids = etce.utils.nodestr_to_nodelist(
+                str(containerelem.attrib['docker_indices']))
+
+            # overlays resolve, lowest precedence first, from the etce
+            # configuration, the element's overlays, the element's
+            # overlaylist item for the index and then docker_index,
+            # docker_name and docker_directory
+            elementoverlays = {}
+
+            for overlayelem in containerelem.findall('./overlays/overlay'):
+                oname = overlayelem.attrib['name']
+
+                ovalue = overlayelem.attrib['value']
+
+                elementoverlays[oname] = etce.utils.configstrtoval(ovalue)
+
+            # fetch the overlaylists
+            overlaylists = {}
+
+            for overlaylistelem in containerelem.findall('./overlays/overlaylist'):
+                oname = overlaylistelem.attrib['name']
+
+                separator = overlaylistelem.attrib.get('separator',',')
+
+                ovalues = overlaylistelem.attrib['values'].split(separator)
+
+                overlaylists[oname] = ovalues
+
+            # treat all values for each name as an int if possible,
+            # else all strings
+            for oname,ovals in overlaylists.items():
+                converted_vals = []
+                try:
+                    converted_vals = [ etce.utils.configstrtoval(oval)
+                                       for oval in ovals ]
+
+                    overlaylists[oname] = converted_vals
+                except ValueError:
+                    # leave as strings
+                    pass
+
+            docker_name_template = containerelem.attrib['docker_name']
+
+            containerspec = ContainerSpec(containerelem)
+
+            # names that take a different value for each index
+            renderer = TemplateRenderer(
+                overlaylists.keys() + ['docker_index', 'docker_name', 'docker_directory'])
+
+            group = ContainerGroup(containerspec,
+                                   template,
+                                   params,
+                                   renderer,
+                                   (self._configoverlays, elementoverlays),
+                                   overlaylists,
+                                   dockerids,
+                                   docker_name_template,
+                                   root_directory,
+                                   hostname)
+
+            for docker_name in group.docker_names:
+                if docker_name in alldockerids:
+                    error = 'Duplicate docker_name {%s} found in DOCKER Plan File "%s" are not permitted. Quitting.' % \
+                            (docker_name,
+                             dockerplanfile)
+
+                    raise DOCKERError(error)
 
-                    alldockerids.update(containerdockerids)
+                alldockerids.add(docker_name)
 
-                    containers[hostname].append(Container(containerelem,
-                                                          dockeroverlays,
-                                                          params,
-                                                          template,
-                                                          bridges[hostname],
-                                                          hostname))
+            groups.append(group)
 
-            # Roll over containers to get names of implicit bridges added
-            # from the container interface bridge names and augment
-            # the bridges list
-            for container in containers[hostname]:
-                for iname,iparams in container.interfaces.items():
-                    if not iname in bridges[hostname]:
-                        bridges[hostname][iname] = BridgeImplicit(iname)
+        # Roll over containers to get names of implicit bridges added
+        # from the container interface bridge names and augment
+        # the bridges list
+        for group in groups:
+            for iname in group.bridgenames():
+                if not iname in bridges:
+                    bridges[iname] = BridgeImplicit(iname)
             
-        return hostnames,kernelparameters,vxlantunnels,bridges,containers,rootdirectories
+        return (FrozenDict(kernelparameters),
+                FrozenDict(vxlantunnels),
+                FrozenDict(bridges),
+                ContainerSequence(groups),
+                root_directory)
 
 
 def main():
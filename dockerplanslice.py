@@ -0,0 +1,164 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import cPickle
+import os
+import zlib
+
+from etce.config import ConfigDictionary
+from etce.dockererror import DOCKERError
+from etce.dockerplancache import DOCKERPlanCache
+from etce.dockerplanfiledoc import ContainerSequence,FrozenDict
+
+
+class DOCKERPlanSlice(object):
+    ''' One host's part of an expanded docker plan.
+
+    The controller expands the plan once and writes each remote host
+    a slice holding only that host's kernel parameters, vxlan tunnels,
+    bridges, containers and docker root directory, pickled and zlib
+    compressed. A slice answers the same accessors as
+    DOCKERPlanFileDoc, so the docker manager takes either one.
+
+    The docker root directory is not part of the slice, the receiving
+    host resolves it under its own WORK_DIRECTORY as it would when
+    reading the full plan.
+    '''
+    MAGIC = 'ETCEPLANSLICE'
+
+    SUFFIX = '.slice'
+
+    def __init__(self, slicefile):
+        if not os.path.isfile(slicefile):
+            raise DOCKERError('Cannot find plan slice "%s". Quitting.' % slicefile)
+
+        self._slicefile = slicefile
+
+        with open(slicefile, 'rb') as slicef:
+            header = slicef.readline().split()
+
+            if not header == [ self.MAGIC, DOCKERPlanCache.VERSION ]:
+                raise DOCKERError('"%s" is not a plan slice of this version. ' \
+                                  'Quitting.' % slicefile)
+
+            try:
+                self._hostname, \
+                self._hostnames, \
+                self._kernelparameters, \
+                self._vxlantunnels, \
+                self._bridges, \
+                self._containers = cPickle.loads(zlib.decompress(slicef.read()))
+            except Exception as e:
+                raise DOCKERError('Cannot read plan slice "%s": %s. Quitting.' %
+                                  (slicefile, e))
+
+        self._rootdirectory = \
+            os.path.join(ConfigDictionary().get('etce', 'WORK_DIRECTORY'), 'dockerroot')
+
+        self._containers = self._containers.rerooted(self._rootdirectory)
+
+
+    @staticmethod
+    def isslice(filename):
+        try:
+            with open(filename, 'rb') as slicef:
+                return slicef.read(len(DOCKERPlanSlice.MAGIC)) == DOCKERPlanSlice.MAGIC
+        except IOError:
+            return False
+
+
+    @staticmethod
+    def write(plandoc, hostname, slicefile):
+        ''' Write hostname's part of plandoc to slicefile. '''
+        data = cPickle.dumps((hostname,
+                              plandoc.hostnames(),
+                              plandoc.kernelparameters(hostname),
+                              plandoc.vxlantunnels(hostname),
+                              plandoc.bridges(hostname),
+                              plandoc.containers(hostname)),
+                             cPickle.HIGHEST_PROTOCOL)
+
+        with open(slicefile, 'wb') as slicef:
+            slicef.write('%s %s\n' % (DOCKERPlanSlice.MAGIC, DOCKERPlanCache.VERSION))
+
+            slicef.write(zlib.compress(data))
+
+
+    def planfile(self):
+        return self._slicefile
+
+
+    def hostnames(self):
+        return self._hostnames
+
+
+    def kernelparameters(self, hostname):
+        if not self._ishost(hostname):
+            return FrozenDict()
+
+        return self._kernelparameters
+
+
+    def vxlantunnels(self, hostname):
+        if not self._ishost(hostname):
+            return FrozenDict()
+
+        return self._vxlantunnels
+
+
+    def bridges(self, hostname):
+        if not self._ishost(hostname):
+            return FrozenDict()
+
+        return self._bridges
+
+
+    def docker_root_directory(self, hostname):
+        if not self._ishost(hostname):
+            return None
+
+        return self._rootdirectory
+
+
+    def containers(self, hostname):
+        if not self._ishost(hostname):
+            return ContainerSequence()
+
+        return self._containers
+
+
+    def _ishost(self, hostname):
+        # as in the plan, a host not named in it stands for the slice's
+        # own host, another host named in the plan has nothing here
+        return hostname == self._hostname or \
+            not hostname in dict(self._hostnames)
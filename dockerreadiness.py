@@ -0,0 +1,127 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import os
+import time
+
+
+class ReadinessReport(object):
+    ''' Seconds from the start of each container until it was ready,
+    None for containers that were not ready by the deadline.
+    '''
+    def __init__(self, ready):
+        self.ready = ready
+
+
+    def notready(self):
+        return sorted([ name for name,seconds in self.ready.items() if seconds is None ])
+
+
+    def __str__(self):
+        times = sorted([ (seconds,name) for name,seconds in self.ready.items()
+                         if seconds is not None ])
+
+        if not times:
+            return '0 of %d containers ready' % len(self.ready)
+
+        return '%d of %d containers ready, median %.3fs, slowest %s %.3fs' % \
+            (len(times),
+             len(self.ready),
+             times[len(times) // 2][0],
+             times[-1][1],
+             times[-1][0])
+
+
+class ReadinessWaiter(object):
+    ''' Waits until a field's containers are ready.
+
+    A container is ready once the runtime reports it running and, when
+    it names a readyfile, once that file exists, typically created by
+    the end of its initscript. Each poll is one runtime query filtered
+    to the field's label, so other containers on the host are never
+    counted. Polling starts at pollinterval and backs off to
+    maxpollinterval; the wait returns as soon as every container is
+    ready or the timeout passes.
+    '''
+    def __init__(self, runtime, label, key, timeout=30.0, pollinterval=0.01, maxpollinterval=0.5):
+        self._runtime = runtime
+
+        self._label = label
+
+        self._key = key
+
+        self._timeout = timeout
+
+        self._pollinterval = pollinterval
+
+        self._maxpollinterval = maxpollinterval
+
+
+    def wait(self, containers, started=None):
+        ''' started maps a container name to the time its start began,
+        those it does not name are timed from the start of the wait.
+        '''
+        pending = dict([ (container.docker_name, container.readyfile)
+                         for container in containers ])
+
+        ready = dict.fromkeys(pending)
+
+        start = time.time()
+
+        started = dict([ (name, (started or {}).get(name, start)) for name in pending ])
+
+        deadline = start + self._timeout
+
+        pollinterval = self._pollinterval
+
+        while pending:
+            states = self._runtime.states(self._label, self._key)
+
+            now = time.time()
+
+            for name,readyfile in pending.items():
+                running = states.get(name, (False, None))[0]
+
+                if running and (readyfile is None or os.path.exists(readyfile)):
+                    ready[name] = now - started[name]
+
+                    del pending[name]
+
+            if not pending or now >= deadline:
+                break
+
+            time.sleep(min(pollinterval, max(0.0, deadline - now)))
+
+            pollinterval = min(pollinterval * 2, self._maxpollinterval)
+
+        return ReadinessReport(ready)
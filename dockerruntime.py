@@ -0,0 +1,429 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+import os
+import subprocess
+
+from etce.dockerapi import DockerEngineClient,DockerAPIError,DEFAULT_SOCKET
+from etce.dockererror import DOCKERError
+
+
+# bridge driver options naming the linux bridge a network uses and
+# its mtu, a bridge that already exists is adopted as is
+BRIDGE_NAME_OPTION = 'com.docker.network.bridge.name'
+
+MTU_OPTION = 'com.docker.network.driver.mtu'
+
+# driver option naming the interface an endpoint gets inside the
+# container, fixes the ethN order of endpoints declared at create time
+IFNAME_OPTION = 'com.docker.network.endpoint.ifname'
+
+
+class DockerCLIRuntime(object):
+    ''' Container operations issued through the docker command line. '''
+    def run(self, container, image, params):
+        command = 'docker run ' \
+                  '--detach ' \
+                  '%s ' \
+                  '--network=none ' \
+                  '%s > /dev/null' % \
+                  (self._options(container, params),
+                   image)
+        self._command(command)
+
+
+    def create(self, container, image, params, networks):
+        # networks is an ordered list of (network, ipv4, ifname)
+        netoptions = ' '.join([ '--network name=%s,ip=%s,driver-opt=%s=%s' % \
+                                (network, ipv4, IFNAME_OPTION, ifname)
+                                for network,ipv4,ifname in networks ])
+
+        command = 'docker create ' \
+                  '%s ' \
+                  '%s ' \
+                  '%s > /dev/null' % \
+                  (self._options(container, params),
+                   netoptions or '--network=none',
+                   image)
+        self._command(command)
+
+
+    def start(self, docker_name):
+        self._command('docker start %s > /dev/null' % docker_name)
+
+
+    def connect(self, network, docker_name, ipv4):
+        self._command('docker network connect --ip %s %s %s > /dev/null' % \
+                      (ipv4, network, docker_name))
+
+
+    def disconnect(self, network, docker_name):
+        self._command('docker network disconnect -f %s %s > /dev/null' % \
+                      (network, docker_name))
+
+
+    def execute(self, docker_name, command):
+        self._command('docker exec -t %s bash -c "%s" > /dev/null' % \
+                      (docker_name, command))
+
+
+    def remove(self, docker_name):
+        self._command('docker rm -f %s > /dev/null 2>&1' % docker_name)
+
+
+    def removemany(self, docker_names):
+        # one docker process for the whole batch, failures are found by
+        # the caller listing what is left
+        self._command('docker rm -f %s > /dev/null 2>&1' % ' '.join(docker_names))
+
+
+    def containers(self, label=None):
+        command = ['docker', 'ps', '--all', '--format', '{{.Names}}']
+
+        if label:
+            command.extend(['--filter', 'label=%s' % label])
+
+        try:
+            return set(subprocess.check_output(command).split())
+        except subprocess.CalledProcessError as e:
+            raise DOCKERError('Cannot list docker containers: %s' % e)
+
+
+    def states(self, label, key):
+        # {name: (running, value of label key)} of the containers
+        # carrying label
+        command = ['docker', 'ps', '--all',
+                   '--filter', 'label=%s' % label,
+                   '--format', '{{.Names}}\t{{.Status}}\t{{.Label "%s"}}' % key]
+
+        try:
+            output = subprocess.check_output(command)
+        except subprocess.CalledProcessError as e:
+            raise DOCKERError('Cannot list docker containers: %s' % e)
+
+        states = {}
+
+        for line in output.splitlines():
+            name,status,value = (line.split('\t') + ['', ''])[:3]
+
+            if name:
+                states[name] = (status.startswith('Up'), value)
+
+        return states
+
+
+    def pid(self, docker_name):
+        try:
+            return int(subprocess.check_output(
+                ['docker', 'inspect', '--format', '{{.State.Pid}}', docker_name]))
+        except (subprocess.CalledProcessError, ValueError) as e:
+            raise DOCKERError('Cannot find the pid of container %s: %s' % (docker_name, e))
+
+
+    def networks(self):
+        try:
+            return set(subprocess.check_output(
+                ['docker', 'network', 'ls', '--format', '{{.Name}}']).split())
+        except subprocess.CalledProcessError as e:
+            raise DOCKERError('Cannot list docker networks: %s' % e)
+
+
+    def createnetwork(self, name, subnet, iprange, gateway, mtu):
+        options = ''
+
+        for option,value in (('--subnet', subnet),
+                             ('--ip-range', iprange),
+                             ('--gateway', gateway)):
+            if value:
+                options += '%s=%s ' % (option, value)
+
+        self._command('docker network create ' \
+                      '--driver=bridge ' \
+                      '%s' \
+                      '--opt %s=%s ' \
+                      '--opt %s=%s ' \
+                      '%s > /dev/null' % \
+                      (options,
+                       BRIDGE_NAME_OPTION, name,
+                       MTU_OPTION, mtu,
+                       name))
+
+
+    def removenetworks(self, names):
+        self._command('docker network rm %s > /dev/null 2>&1' % ' '.join(names))
+
+
+    def close(self):
+        pass
+
+
+    def _options(self, container, params):
+        return '--tty ' \
+               '--name=%s ' \
+               '--hostname=%s ' \
+               '--cap-add=ALL ' \
+               '--privileged=true ' \
+               '--volume %s ' \
+               '%s' % \
+               (container.docker_name,
+                container.docker_name,
+                container.docker_directory,
+                ''.join([ name + value + ' ' for name,value in params ]))
+
+
+    def _command(self, command):
+        status = os.system(command)
+
+        if status:
+            raise DOCKERError('"%s" exited with status %d' % (command, status >> 8))
+
+
+class DockerAPIRuntime(object):
+    ''' Container operations issued to the Docker Engine API over its
+    unix socket, sharing one pool of persistent connections.
+    '''
+    def __init__(self, socketpath=DEFAULT_SOCKET):
+        self._client = DockerEngineClient(socketpath)
+
+
+    @property
+    def client(self):
+        return self._client
+
+
+    def run(self, container, image, params):
+        self._create(container, image, params, None)
+
+        self._client.start_container(container.docker_name)
+
+
+    def create(self, container, image, params, networks):
+        # networks is an ordered list of (network, ipv4, ifname)
+        self._create(container, image, params, networks)
+
+
+    def start(self, docker_name):
+        self._client.start_container(docker_name)
+
+
+    def connect(self, network, docker_name, ipv4):
+        self._client.connect_network(network, docker_name, ipv4)
+
+
+    def disconnect(self, network, docker_name):
+        self._client.disconnect_network(network, docker_name)
+
+
+    def execute(self, docker_name, command):
+        exitcode = self._client.execute(docker_name, ['bash', '-c', command])
+
+        if exitcode:
+            raise DockerAPIError('exec "%s" in container %s' % (command, docker_name),
+                                 0,
+                                 'exit code %d' % exitcode)
+
+
+    def remove(self, docker_name):
+        self._client.remove_container(docker_name)
+
+
+    def removemany(self, docker_names):
+        errors = []
+
+        for docker_name in docker_names:
+            try:
+                self._client.remove_container(docker_name)
+            except DockerAPIError as e:
+                if not e.status == 404:
+                    errors.append(str(e))
+
+        if errors:
+            raise DOCKERError('; '.join(errors))
+
+
+    def containers(self, label=None):
+        filters = {'label':[label]} if label else None
+
+        return set([ container['Names'][0].lstrip('/')
+                     for container in self._client.list_containers(filters) ])
+
+
+    def states(self, label, key):
+        # {name: (running, value of label key)} of the containers
+        # carrying label
+        return dict([ (container['Names'][0].lstrip('/'),
+                       (container['State'] == 'running',
+                        (container.get('Labels') or {}).get(key, '')))
+                      for container in self._client.list_containers({'label':[label]}) ])
+
+
+    def pid(self, docker_name):
+        return self._client.inspect_container(docker_name)['State']['Pid']
+
+
+    def networks(self):
+        return set([ network['Name'] for network in self._client.list_networks() ])
+
+
+    def createnetwork(self, name, subnet, iprange, gateway, mtu):
+        ipamconfig = {}
+
+        for key,value in (('Subnet', subnet),
+                          ('IPRange', iprange),
+                          ('Gateway', gateway)):
+            if value:
+                ipamconfig[key] = value
+
+        self._client.create_network(name,
+                                    {'Driver':'bridge',
+                                     'CheckDuplicate':True,
+                                     'IPAM':{'Config':[ipamconfig] if ipamconfig else []},
+                                     'Options':{BRIDGE_NAME_OPTION:name,
+                                                MTU_OPTION:str(mtu)}})
+
+
+    def removenetworks(self, names):
+        errors = []
+
+        for name in names:
+            try:
+                self._client.remove_network(name)
+            except DockerAPIError as e:
+                if not e.status == 404:
+                    errors.append(str(e))
+
+        if errors:
+            raise DOCKERError('; '.join(errors))
+
+
+    def close(self):
+        self._client.close()
+
+
+    def _create(self, container, image, params, networks):
+        config = {
+            'Image':image,
+            'Hostname':container.docker_name,
+            'Tty':True,
+            'Env':[],
+            'Labels':{},
+            'Volumes':{},
+            'HostConfig':{
+                'CapAdd':['ALL'],
+                'Privileged':True,
+                'NetworkMode':'none',
+                'Binds':[],
+            },
+        }
+
+        if networks:
+            endpoints = {}
+
+            for network,ipv4,ifname in networks:
+                endpoints[network] = {
+                    'IPAMConfig':{'IPv4Address':ipv4},
+                    'DriverOpts':{IFNAME_OPTION:ifname},
+                }
+
+            # the first endpoint doubles as the container's network mode
+            config['HostConfig']['NetworkMode'] = networks[0][0]
+
+            config['NetworkingConfig'] = {'EndpointsConfig':endpoints}
+
+        self._addvolume(config, container.docker_directory)
+
+        for name,value in params:
+            flag,_,arg = (name + value).partition('=')
+
+            self._applyparam(config, flag, arg)
+
+        try:
+            self._client.create_container(container.docker_name, config)
+        except DockerAPIError as e:
+            # the cli pulls missing images implicitly, do the same
+            if not e.status == 404:
+                raise
+
+            self._pull(image)
+
+            self._client.create_container(container.docker_name, config)
+
+
+    def _pull(self, image):
+        fromimage,_,tag = image.rpartition(':')
+
+        # a ':' that belongs to a registry port is not a tag separator
+        if not fromimage or '/' in tag:
+            fromimage,tag = image,'latest'
+
+        self._client.pull_image(fromimage, tag)
+
+
+    def _addvolume(self, config, volume):
+        if ':' in volume:
+            config['HostConfig']['Binds'].append(volume)
+        else:
+            config['Volumes'][volume] = {}
+
+
+    def _applyparam(self, config, flag, arg):
+        hostconfig = config['HostConfig']
+
+        if flag in ('--env', '-e'):
+            config['Env'].append(arg)
+        elif flag in ('--label', '-l'):
+            key,_,value = arg.partition('=')
+            config['Labels'][key] = value
+        elif flag in ('--volume', '-v'):
+            self._addvolume(config, arg)
+        elif flag == '--cap-add':
+            hostconfig['CapAdd'].append(arg)
+        elif flag == '--cap-drop':
+            hostconfig.setdefault('CapDrop', []).append(arg)
+        elif flag in ('--workdir', '-w'):
+            config['WorkingDir'] = arg
+        elif flag in ('--user', '-u'):
+            config['User'] = arg
+        elif flag == '--sysctl':
+            key,_,value = arg.partition('=')
+            hostconfig.setdefault('Sysctls', {})[key] = value
+        elif flag == '--dns':
+            hostconfig.setdefault('Dns', []).append(arg)
+        else:
+            raise DOCKERError('docker run option "%s" is not supported by ' \
+                              'the api runtime. Quitting.' % flag)
+
+
+RUNTIMES = {
+    'cli':DockerCLIRuntime,
+    'api':DockerAPIRuntime,
+}
@@ -0,0 +1,220 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+import functools
+import json
+import os
+import threading
+import time
+
+
+# the file a host writes its own trace to, in its work directory
+TRACEFILE = 'etce.docker.trace.json'
+
+
+class _Span(object):
+    __slots__ = ('_tracer', '_name', '_args', '_start')
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+
+        self._name = name
+
+        self._args = args
+
+
+    def __enter__(self):
+        self._start = time.time()
+
+        return self
+
+
+    def __exit__(self, exctype, excvalue, tb):
+        args = self._args
+
+        if exctype:
+            args = dict(args, error=str(excvalue))
+
+        self._tracer.add(self._name, self._start, time.time(), args)
+
+        return False
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exctype, excvalue, tb):
+        return False
+
+
+NOSPAN = _NoSpan()
+
+
+class Tracer(object):
+    ''' Collects timed spans as Chrome trace events, the JSON format
+    chrome://tracing and Perfetto load.
+
+    Timestamps are wall clock microseconds, so traces written on
+    different hosts line up on one timeline once merged. Each thread
+    gets its own track. Until enable() is called span() returns a
+    shared no-op and nothing is recorded.
+    '''
+    def __init__(self):
+        self._enabled = False
+
+        self._lock = threading.Lock()
+
+        self._events = []
+
+        self._threads = {}
+
+        self._process = None
+
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+
+    def enable(self, process):
+        ''' Start recording, labelling this process's track process. '''
+        with self._lock:
+            self._enabled = True
+
+            self._process = process
+
+            self._events = []
+
+            self._threads = {}
+
+
+    def disable(self):
+        self._enabled = False
+
+
+    def span(self, name, **args):
+        if not self._enabled:
+            return NOSPAN
+
+        return _Span(self, name, args)
+
+
+    def add(self, name, start, end, args):
+        thread = threading.current_thread()
+
+        event = {'name':name,
+                 'ph':'X',
+                 'ts':int(start * 1000000),
+                 'dur':int((end - start) * 1000000),
+                 'pid':1,
+                 'args':args}
+
+        with self._lock:
+            if not thread.ident in self._threads:
+                self._threads[thread.ident] = (len(self._threads) + 1, thread.name)
+
+            event['tid'] = self._threads[thread.ident][0]
+
+            self._events.append(event)
+
+
+    def events(self):
+        ''' The recorded events with their process and thread names. '''
+        with self._lock:
+            metadata = [ {'name':'process_name', 'ph':'M', 'pid':1, 'tid':0,
+                          'args':{'name':self._process}} ]
+
+            metadata.extend([ {'name':'thread_name', 'ph':'M', 'pid':1, 'tid':tid,
+                               'args':{'name':threadname}}
+                              for tid,threadname in self._threads.values() ])
+
+            return metadata + list(self._events)
+
+
+    def write(self, filename):
+        write(filename, self.events())
+
+
+def merge(traces):
+    ''' Merge traces, a list of event lists each recorded by one
+    process, giving each process its own track group.
+    '''
+    merged = []
+
+    for pid,events in enumerate(traces, 1):
+        for event in events:
+            event = dict(event)
+
+            event['pid'] = pid
+
+            merged.append(event)
+
+    return merged
+
+
+def write(filename, events):
+    tmpname = filename + '.tmp'
+
+    with open(tmpname, 'w') as tracef:
+        json.dump({'traceEvents':events, 'displayTimeUnit':'ms'}, tracef)
+
+    os.rename(tmpname, filename)
+
+
+# the tracer of this process
+TRACER = Tracer()
+
+
+def span(name, **args):
+    ''' A context manager timing its block as a span called name. '''
+    return TRACER.span(name, **args)
+
+
+def traced(name):
+    ''' Decorate a function to be timed as a span called name. '''
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+
+            with TRACER.span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,331 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import BaseHTTPServer
+import json
+import os
+import SocketServer
+import socket
+import threading
+import urlparse
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+        self.server.connections.append(self.connection)
+
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+    def _dispatch(self, method):
+        url = urlparse.urlparse(self.path)
+
+        query = dict([ (key,values[0]) for key,values in urlparse.parse_qs(url.query).items() ])
+
+        length = int(self.headers.getheader('Content-Length') or 0)
+
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        self.server.daemon.calls.append((method, url.path, query, body))
+
+        status,payload = self.server.daemon.handle(method, url.path.split('/')[1:], query, body)
+
+        if status == 'stream':
+            self._stream(payload)
+        else:
+            self._send(status, payload)
+
+
+    def _send(self, status, payload):
+        data = json.dumps(payload) if payload is not None else ''
+
+        self.send_response(status)
+
+        self.send_header('Content-Type', 'application/json')
+
+        self.send_header('Content-Length', str(len(data)))
+
+        self.end_headers()
+
+        self.wfile.write(data)
+
+
+    def _stream(self, messages):
+        # progress objects one per line in a chunked 200 response, the
+        # way the daemon reports a pull
+        self.send_response(200)
+
+        self.send_header('Content-Type', 'application/json')
+
+        self.send_header('Transfer-Encoding', 'chunked')
+
+        self.end_headers()
+
+        for message in messages:
+            data = json.dumps(message) + '\r\n'
+
+            self.wfile.write('%x\r\n%s\r\n' % (len(data), data))
+
+        self.wfile.write('0\r\n\r\n')
+
+
+class _Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request,_ = SocketServer.UnixStreamServer.get_request(self)
+
+        # BaseHTTPRequestHandler expects an address pair
+        return request,('local', 0)
+
+
+class FakeDockerDaemon(object):
+    ''' A stand-in Docker daemon serving the part of the Engine API
+    DockerEngineClient uses on a unix socket. It keeps containers,
+    images and networks in memory and records every request in calls
+    as (method, path, query, body).
+    '''
+    def __init__(self, socketpath, images=()):
+        self.socketpath = socketpath
+
+        self.calls = []
+
+        self.images = set(images)
+
+        # image: error message a pull of it reports in the stream
+        self.pullerrors = {}
+
+        # name: {'Image', 'Labels', 'State', 'Pid'}
+        self.containers = {}
+
+        self.networks = set(['none', 'bridge'])
+
+        self._server = None
+
+
+    def start(self):
+        if os.path.exists(self.socketpath):
+            os.remove(self.socketpath)
+
+        self._server = _Server(self.socketpath, _Handler)
+
+        self._server.daemon = self
+
+        self._server.connections = []
+
+        thread = threading.Thread(target=self._server.serve_forever, args=(0.05,))
+
+        thread.daemon = True
+
+        thread.start()
+
+        return self
+
+
+    def stop(self):
+        self._server.shutdown()
+
+        self.dropconnections()
+
+        self._server.server_close()
+
+        os.remove(self.socketpath)
+
+
+    def dropconnections(self):
+        ''' Close every open client connection, as the daemon does with
+        idle keep-alive connections.
+        '''
+        for connection in self._server.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+            connection.close()
+
+        del self._server.connections[:]
+
+
+    def requests(self, method=None):
+        return [ (m,path) for m,path,_,_ in self.calls if method is None or m == method ]
+
+
+    def handle(self, method, parts, query, body):
+        if parts == ['_ping']:
+            return 200, 'OK'
+
+        if parts == ['images', 'create'] and method == 'POST':
+            return self._pull(query['fromImage'] + ':' + query.get('tag', 'latest'))
+
+        if parts[0] == 'containers':
+            return self._containers(method, parts[1:], query, body)
+
+        if parts[0] == 'networks':
+            return self._networks(method, parts[1:], body)
+
+        return 404, {'message':'page not found'}
+
+
+    def _pull(self, image):
+        messages = [ {'status':'Pulling from %s' % image},
+                     {'status':'Downloading', 'progress':'[=>   ]'} ]
+
+        if image in self.pullerrors:
+            messages.append({'errorDetail':{'message':self.pullerrors[image]},
+                             'error':self.pullerrors[image]})
+        else:
+            self.images.add(image)
+
+            messages.append({'status':'Downloaded newer image for %s' % image})
+
+        return 'stream', messages
+
+
+    def _containers(self, method, parts, query, body):
+        if parts == ['create']:
+            name = query['name']
+
+            image = body['Image']
+
+            # a ':' that belongs to a registry port is not a tag separator
+            if not ':' in image.rpartition('/')[2]:
+                image += ':latest'
+
+            if not image in self.images:
+                return 404, {'message':'No such image: %s' % image}
+
+            if name in self.containers:
+                return 409, {'message':'Conflict. The container name "/%s" is already in use' % name}
+
+            self.containers[name] = {'Image':image,
+                                     'Labels':body.get('Labels') or {},
+                                     'State':'created',
+                                     'Pid':0}
+
+            return 201, {'Id':name, 'Warnings':[]}
+
+        if parts == ['json']:
+            filters = json.loads(query.get('filters', '{}'))
+
+            return 200, [ {'Names':['/' + name],
+                           'State':container['State'],
+                           'Labels':container['Labels']}
+                          for name,container in sorted(self.containers.items())
+                          if self._matches(container['Labels'], filters.get('label', [])) ]
+
+        name = parts[0]
+
+        if not name in self.containers:
+            return 404, {'message':'No such container: %s' % name}
+
+        container = self.containers[name]
+
+        if method == 'DELETE':
+            del self.containers[name]
+
+            return 204, None
+
+        if parts[1:] == ['start']:
+            container['State'] = 'running'
+
+            container['Pid'] = 1000 + len(self.calls)
+
+            return 204, None
+
+        if parts[1:] == ['json']:
+            return 200, {'Name':'/' + name,
+                         'State':{'Running':container['State'] == 'running',
+                                  'Pid':container['Pid']}}
+
+        return 404, {'message':'page not found'}
+
+
+    def _networks(self, method, parts, body):
+        if not parts and method == 'GET':
+            return 200, [ {'Name':name} for name in sorted(self.networks) ]
+
+        if parts == ['create']:
+            if body['Name'] in self.networks:
+                return 409, {'message':'network with name %s already exists' % body['Name']}
+
+            self.networks.add(body['Name'])
+
+            return 201, {'Id':body['Name']}
+
+        name = parts[0]
+
+        if not name in self.networks:
+            return 404, {'message':'network %s not found' % name}
+
+        if method == 'DELETE':
+            self.networks.remove(name)
+
+            return 204, None
+
+        if parts[1:] in (['connect'], ['disconnect']):
+            if not body['Container'] in self.containers:
+                return 404, {'message':'No such container: %s' % body['Container']}
+
+            return 200, None
+
+        return 404, {'message':'page not found'}
+
+
+    def _matches(self, labels, filters):
+        for label in filters:
+            key,sep,value = label.partition('=')
+
+            if not key in labels or (sep and not labels[key] == value):
+                return False
+
+        return True
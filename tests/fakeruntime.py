@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import threading
+
+from etce.dockererror import DOCKERError
+
+
+class FakeRuntime(object):
+    ''' An in memory docker runtime recording the calls it is given.
+
+    Containers are {name: {'running':bool, 'labels':{key: value}}}.
+    removemany fails the whole batch when one name is missing, as
+    docker rm -f does. A container named in fail is refused by run
+    and create.
+    '''
+    def __init__(self, containers=None, networks=(), fail=()):
+        self.lock = threading.Lock()
+
+        self.live = dict(containers or {})
+
+        self.bridges = set(networks)
+
+        self.fail = set(fail)
+
+        self.calls = []
+
+
+    def run(self, container, image, params):
+        self._add('run', container, params, True)
+
+
+    def create(self, container, image, params, networks):
+        self._add('create', container, params, False)
+
+
+    def start(self, docker_name):
+        with self.lock:
+            self.calls.append(('start', docker_name))
+
+            self.live[docker_name]['running'] = True
+
+
+    def connect(self, network, docker_name, ipv4):
+        with self.lock:
+            self.calls.append(('connect', docker_name, network))
+
+
+    def disconnect(self, network, docker_name):
+        with self.lock:
+            self.calls.append(('disconnect', docker_name, network))
+
+
+    def pid(self, docker_name):
+        return 1
+
+
+    def removemany(self, docker_names):
+        with self.lock:
+            self.calls.append(('removemany', tuple(docker_names)))
+
+            missing = [ name for name in docker_names if not name in self.live ]
+
+            if missing:
+                raise DOCKERError('No such container: %s' % ', '.join(missing))
+
+            for name in docker_names:
+                del self.live[name]
+
+
+    def containers(self, label=None):
+        with self.lock:
+            return set([ name for name,container in self.live.items()
+                         if self._labelled(container, label) ])
+
+
+    def states(self, label, key):
+        with self.lock:
+            return dict([ (name, (container['running'], container['labels'].get(key, '')))
+                          for name,container in self.live.items()
+                          if self._labelled(container, label) ])
+
+
+    def networks(self):
+        with self.lock:
+            return set(self.bridges)
+
+
+    def createnetwork(self, name, subnet, iprange, gateway, mtu):
+        with self.lock:
+            self.calls.append(('createnetwork', name))
+
+            self.bridges.add(name)
+
+
+    def removenetworks(self, names):
+        with self.lock:
+            self.calls.append(('removenetworks', tuple(names)))
+
+            self.bridges.difference_update(names)
+
+
+    def close(self):
+        pass
+
+
+    def _add(self, operation, container, params, running):
+        name = container.docker_name
+
+        with self.lock:
+            self.calls.append((operation, name))
+
+            if name in self.fail:
+                raise DOCKERError('%s refused' % name)
+
+            labels = dict([ value.split('=', 1) for flag,value in params if flag == '--label=' ])
+
+            self.live[name] = {'running':running, 'labels':labels}
+
+
+    def _labelled(self, container, label):
+        if not label:
+            return True
+
+        key,_,value = label.partition('=')
+
+        return container['labels'].get(key) == value
@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+PLAN = '''<dockerplan>
+<hosts>
+%s
+</hosts>
+</dockerplan>
+'''
+
+HOST = '''<host hostname="%(hostname)s" ip="%(ip)s">
+<bridges>%(bridges)s</bridges>
+<containers>%(containers)s</containers>
+</host>'''
+
+BRIDGE = '<bridge name="%s" persistent="false" subnet="10.%d.0.0/16"/>'
+
+CONTAINER = '''<container docker_name="%(name)s" docker_indices="1">
+<parameters><parameter name="image" value="%(image)s"/></parameters>
+<interfaces><interface bridge="%(bridge)s"><parameter name="ipv4" value="%(ipv4)s"/></interface></interfaces>
+</container>'''
+
+
+def planxml(hosts, image='emane'):
+    ''' A plan for hosts, a list of (hostname, [container name]). Each
+    host has one bridge, ctl, and each container an image and one ctl
+    interface.
+    '''
+    hostelems = []
+
+    for i,(hostname,names) in enumerate(hosts):
+        containers = [ CONTAINER % {'name':name,
+                                    'image':image,
+                                    'bridge':'ctl',
+                                    'ipv4':'10.99.%d.%d' % (i, j + 1)}
+                       for j,name in enumerate(names) ]
+
+        hostelems.append(HOST % {'hostname':hostname,
+                                 'ip':'192.168.0.%d' % (i + 1),
+                                 'bridges':BRIDGE % ('ctl', 99),
+                                 'containers':''.join(containers)})
+
+    return PLAN % '\n'.join(hostelems)
+
+
+def writeplan(planfile, hosts, image='emane'):
+    with open(planfile, 'w') as planf:
+        planf.write(planxml(hosts, image))
+
+    return planfile
@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import unittest
+
+from etce.dockeraddressallocator import AddressAllocator,AddressCollisionError
+from etce.dockererror import DOCKERError
+
+
+class AddressAllocatorTest(unittest.TestCase):
+    def test_allocates_lowest_free_addresses(self):
+        allocator = AddressAllocator('10.99.0.0/29')
+
+        allocator.reserve(allocator.network.first, 'the network')
+
+        allocator.reserve('10.99.0.2', 'n1')
+
+        self.assertEqual(allocator.allocate('ctl'), '10.99.0.1')
+
+        self.assertEqual(allocator.allocatemany(2, 'ctl'), ['10.99.0.3', '10.99.0.4'])
+
+        self.assertEqual(allocator.owner('10.99.0.2'), 'n1')
+
+        self.assertEqual(allocator.available, 3)
+
+
+    def test_released_address_is_reused(self):
+        allocator = AddressAllocator('10.99.0.0/29')
+
+        allocator.allocatemany(4)
+
+        allocator.release('10.99.0.1')
+
+        self.assertEqual(allocator.allocate(), '10.99.0.1')
+
+        self.assertEqual(allocator.allocate(), '10.99.0.4')
+
+
+    def test_collision(self):
+        allocator = AddressAllocator('10.99.0.0/16')
+
+        allocator.reserve('10.99.1.1', 'n1')
+
+        with self.assertRaises(AddressCollisionError) as raised:
+            allocator.reserve('10.99.1.1', 'n2')
+
+        self.assertEqual((raised.exception.owner, raised.exception.previous), ('n2', 'n1'))
+
+        with self.assertRaises(AddressCollisionError):
+            allocator.reserverange('10.99.1.0', '10.99.1.3', 'pool')
+
+        # a failed range reservation leaves nothing reserved
+        self.assertEqual(len(allocator), 1)
+
+
+    def test_exhaustion(self):
+        allocator = AddressAllocator('10.99.0.0/30')
+
+        allocator.reserverange('10.99.0.0', '10.99.0.1')
+
+        with self.assertRaises(DOCKERError):
+            allocator.allocatemany(3)
+
+        self.assertEqual(len(allocator), 2)
+
+        self.assertEqual(allocator.allocatemany(2), ['10.99.0.2', '10.99.0.3'])
+
+        with self.assertRaises(DOCKERError):
+            allocator.allocate()
+
+
+    def test_membership(self):
+        allocator = AddressAllocator('10.99.0.0/16')
+
+        self.assertTrue('10.99.255.255' in allocator)
+
+        self.assertFalse('10.100.0.1' in allocator)
+
+        self.assertFalse('fd00::1' in allocator)
+
+        self.assertFalse('not an address' in allocator)
+
+        with self.assertRaises(DOCKERError):
+            allocator.reserve('10.100.0.1', 'n1')
+
+
+    def test_invalid_network(self):
+        with self.assertRaises(DOCKERError):
+            AddressAllocator('10.99.0.0/33')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from etce.dockerapi import DockerAPIError
+from etce.dockererror import DOCKERError
+from etce.dockerruntime import DockerAPIRuntime
+
+from fakedaemon import FakeDockerDaemon
+
+
+class Container(object):
+    def __init__(self, docker_name, docker_directory='/tmp/etce/node'):
+        self.docker_name = docker_name
+
+        self.docker_directory = docker_directory
+
+
+class DockerAPITest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.daemon = FakeDockerDaemon(os.path.join(self.tmpdir, 'docker.sock'),
+                                       images=['emane:latest']).start()
+
+        self.runtime = DockerAPIRuntime(self.daemon.socketpath)
+
+        self.client = self.runtime.client
+
+
+    def tearDown(self):
+        self.runtime.close()
+
+        self.daemon.stop()
+
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_stale_pooled_connection_is_retried(self):
+        self.client.ping()
+
+        # the pooled connection is closed by the daemon while idle
+        self.daemon.dropconnections()
+
+        self.assertEqual(self.client.list_networks(), [{'Name':'bridge'}, {'Name':'none'}])
+
+        self.assertEqual(self.daemon.requests(), [('GET', '/_ping'), ('GET', '/networks')])
+
+
+    def test_error_status_maps_to_docker_api_error(self):
+        with self.assertRaises(DockerAPIError) as raised:
+            self.client.start_container('missing')
+
+        self.assertEqual(raised.exception.status, 404)
+
+        self.assertEqual(raised.exception.error, 'No such container: missing')
+
+        self.assertEqual(raised.exception.operation, 'start container missing')
+
+        self.assertTrue(isinstance(raised.exception, DOCKERError))
+
+        # startdockers and stopdockers re-raise with the message
+        self.assertEqual(raised.exception.message,
+                         'start container missing failed with status 404: No such container: missing')
+
+
+    def test_remove_ignores_missing_containers_only(self):
+        self.runtime.run(Container('n1'), 'emane', [])
+
+        self.runtime.removemany(['n1', 'n2'])
+
+        self.assertEqual(self.daemon.containers, {})
+
+
+    def test_create_pulls_missing_image(self):
+        self.runtime.run(Container('n1'), 'ubuntu:22.04', [('--label=', 'role=radio')])
+
+        self.assertEqual(self.daemon.requests('POST'),
+                         [('POST', '/containers/create'),
+                          ('POST', '/images/create'),
+                          ('POST', '/containers/create'),
+                          ('POST', '/containers/n1/start')])
+
+        self.assertEqual(self.daemon.containers['n1']['State'], 'running')
+
+        self.assertEqual(self.daemon.containers['n1']['Labels'], {'role':'radio'})
+
+        self.assertTrue(self.runtime.pid('n1') > 0)
+
+
+    def test_pull_error_reported_in_stream(self):
+        self.daemon.pullerrors['private/image:latest'] = 'pull access denied for private/image'
+
+        with self.assertRaises(DockerAPIError) as raised:
+            self.runtime.run(Container('n1'), 'private/image', [])
+
+        self.assertEqual(raised.exception.error, 'pull access denied for private/image')
+
+        self.assertFalse('n1' in self.daemon.containers)
+
+        # the connection carrying the failed pull is not reused
+        self.assertEqual(self.client.list_containers(), [])
+
+
+    def test_pull_of_registry_port_image(self):
+        self.runtime.run(Container('n1'), 'registry:5000/emane', [])
+
+        self.assertEqual(self.daemon.calls[1][2], {'fromImage':'registry:5000/emane', 'tag':'latest'})
+
+
+    def test_label_filters(self):
+        for name,field in (('a1', '/tmp/etce/a'), ('a2', '/tmp/etce/a'), ('b1', '/tmp/etce/b')):
+            self.runtime.run(Container(name),
+                             'emane',
+                             [('--label=', 'etce.docker.field=%s' % field),
+                              ('--label=', 'etce.docker.hash=%s' % name)])
+
+        self.daemon.containers['a2']['State'] = 'exited'
+
+        self.assertEqual(self.runtime.containers(), set(['a1', 'a2', 'b1']))
+
+        self.assertEqual(self.runtime.containers('etce.docker.field=/tmp/etce/a'), set(['a1', 'a2']))
+
+        self.assertEqual(self.runtime.containers('etce.docker.field'), set(['a1', 'a2', 'b1']))
+
+        self.assertEqual(self.runtime.states('etce.docker.field=/tmp/etce/b', 'etce.docker.hash'),
+                         {'b1':(True, 'b1')})
+
+        self.assertEqual(self.runtime.states('etce.docker.field=/tmp/etce/a', 'etce.docker.hash'),
+                         {'a1':(True, 'a1'), 'a2':(False, 'a2')})
+
+
+    def test_networks(self):
+        self.runtime.createnetwork('br0', '10.0.0.0/24', None, None, 1500)
+
+        self.assertEqual(self.runtime.networks(), set(['br0', 'bridge', 'none']))
+
+        self.runtime.removenetworks(['br0', 'br1'])
+
+        self.assertEqual(self.runtime.networks(), set(['bridge', 'none']))
+
+
+if __name__ == '__main__':
+    unittest.main()
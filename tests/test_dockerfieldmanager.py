@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import etce.dockerfieldmanager
+
+from plans import writeplan
+
+
+class Result(object):
+    def __init__(self):
+        self.retval = {'result':'ok'}
+
+
+class Client(object):
+    def __init__(self, recorder, hosts):
+        self._recorder = recorder
+
+        self._hosts = hosts
+
+
+    def put(self, src, dst, hosts, doclobber=False):
+        pass
+
+
+    def execute(self, command, hosts):
+        with self._recorder.lock:
+            self._recorder.executed.extend(hosts)
+
+        return dict([ (host, Result()) for host in hosts ])
+
+
+    def close(self):
+        pass
+
+
+class ClientBuilder(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        self.executed = []
+
+
+    def __call__(self):
+        return self
+
+
+    def build(self, hosts, **kwargs):
+        return Client(self, hosts)
+
+
+class Platform(object):
+    def hostname(self):
+        return 'Host0'
+
+
+class FanoutTest(unittest.TestCase):
+    ''' startfield and stopfield against a three host plan, run on
+    host0 with ssh, the local docker manager and /etc/hosts replaced.
+    '''
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.saved = dict([ (name, getattr(etce.dockerfieldmanager, name))
+                            for name in ('ClientBuilder', 'Platform', 'startdockers',
+                                         'stopdockers', 'writehosts') ])
+
+        self.saved['system'] = os.system
+
+        self.saved['WORKDIR'] = os.environ.get('WORKDIR')
+
+        self.clientbuilder = ClientBuilder()
+
+        self.local = []
+
+        etce.dockerfieldmanager.ClientBuilder = self.clientbuilder
+
+        etce.dockerfieldmanager.Platform = Platform
+
+        etce.dockerfieldmanager.startdockers = lambda *args: self.local.append('start')
+
+        etce.dockerfieldmanager.stopdockers = lambda *args: self.local.append('stop')
+
+        etce.dockerfieldmanager.writehosts = lambda plandoc, containers: None
+
+        # etce-test publish and run
+        os.system = lambda command: 0
+
+        os.environ['WORKDIR'] = self.tmpdir
+
+        self.args = argparse.Namespace(
+            dockerplanfile=writeplan(os.path.join(self.tmpdir, 'dockerplan.xml'),
+                                     [('host0', ['a1']), ('host1', ['b1']), ('host2', ['c1'])]),
+            stream=False,
+            slices=False,
+            writehosts=False,
+            forcedockerroot=False,
+            dryrun=True,
+            parallel=1,
+            runtime='cli',
+            attach='connect',
+            netlink=False,
+            reconcile=False,
+            collect=False,
+            user=None,
+            port=None,
+            password=None,
+            policy='reject',
+            maxhosts=8,
+            hosttimeout=None,
+            trace=None,
+            textfiledir=None)
+
+
+    def tearDown(self):
+        for name,value in self.saved.items():
+            if name == 'system':
+                os.system = value
+            elif name == 'WORKDIR':
+                if value is None:
+                    del os.environ['WORKDIR']
+                else:
+                    os.environ['WORKDIR'] = value
+            else:
+                setattr(etce.dockerfieldmanager, name, value)
+
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_startfield_fans_out_to_other_hosts_only(self):
+        etce.dockerfieldmanager.startfield(self.args)
+
+        self.assertEqual(sorted(self.clientbuilder.executed), ['host1', 'host2'])
+
+        self.assertEqual(self.local, ['start'])
+
+
+    def test_stopfield_fans_out_to_other_hosts_only(self):
+        open(os.path.join(self.tmpdir, 'etce.docker.lock'), 'w').close()
+
+        etce.dockerfieldmanager.stopfield(self.args)
+
+        self.assertEqual(sorted(self.clientbuilder.executed), ['host1', 'host2'])
+
+        self.assertEqual(self.local, ['stop'])
+
+
+    def test_localhost_is_never_remote(self):
+        class Plan(object):
+            def hostnames(self):
+                return (('localhost', '127.0.0.1'),)
+
+        self.assertEqual(etce.dockerfieldmanager.remotehosts(Plan(), 'host0'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from etce.dockerhostsfile import OPENTAG,CLOSETAG,hostsblock,unmanagedlines,writehosts
+
+
+class UnmanagedLinesTest(unittest.TestCase):
+    def test_lines_after_block_are_kept(self):
+        # the baseline parser never left the block, dropping these
+        content = '127.0.0.1 localhost\n' \
+                  + OPENTAG \
+                  + '10.99.0.1 node-1\n' \
+                  + CLOSETAG \
+                  + '192.168.1.5 printer\n'
+
+        self.assertEqual(unmanagedlines(content),
+                         ['127.0.0.1 localhost\n', '192.168.1.5 printer\n'])
+
+
+    def test_trailing_blank_lines_dropped(self):
+        self.assertEqual(unmanagedlines('127.0.0.1 localhost\n\n  \n'),
+                         ['127.0.0.1 localhost\n'])
+
+
+    def test_unterminated_block_drops_the_rest(self):
+        content = '127.0.0.1 localhost\n' + OPENTAG + '10.99.0.1 node-1\n'
+
+        self.assertEqual(unmanagedlines(content), ['127.0.0.1 localhost\n'])
+
+
+class WriteHostsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.hostsfile = os.path.join(self.tmpdir, 'hosts')
+
+        with open(self.hostsfile, 'w') as hostsf:
+            hostsf.write('127.0.0.1 localhost\n')
+
+        os.chmod(self.hostsfile, 0640)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def read(self):
+        with open(self.hostsfile) as hostsf:
+            return hostsf.read()
+
+
+    def test_block_replaced(self):
+        self.assertTrue(writehosts([('10.99.0.1', 'node-1')], self.hostsfile))
+
+        self.assertTrue(writehosts([('10.99.0.2', 'node-2')], self.hostsfile))
+
+        self.assertEqual(self.read(),
+                         '127.0.0.1 localhost\n\n' + hostsblock([('10.99.0.2', 'node-2')]))
+
+        self.assertEqual(os.stat(self.hostsfile).st_mode & 0777, 0640)
+
+
+    def test_unchanged_content_not_rewritten(self):
+        entries = [('10.99.0.1', 'node-1'), ('10.99.0.2', 'node-2')]
+
+        writehosts(entries, self.hostsfile)
+
+        inode = os.stat(self.hostsfile).st_ino
+
+        self.assertFalse(writehosts(entries, self.hostsfile))
+
+        self.assertEqual(os.stat(self.hostsfile).st_ino, inode)
+
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['hosts'])
+
+
+    def test_missing_file_created(self):
+        os.remove(self.hostsfile)
+
+        self.assertTrue(writehosts([('10.99.0.1', 'node-1')], self.hostsfile))
+
+        self.assertEqual(self.read(), '\n' + hostsblock([('10.99.0.1', 'node-1')]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import etce.dockerkernelparameters
+from etce.dockerkernelparameters import KernelParameters,savefilename
+from etce.dockermanager import DOCKERManagerImpl
+
+
+class ProcSysTest(unittest.TestCase):
+    ''' Runs against a scratch copy of the parts of /proc/sys used. '''
+    VALUES = {'net/core/rmem_max':'212992\n',
+              'net/ipv4/tcp_rmem':'4096\t131072\t6291456\n',
+              'net/ipv4/ip_forward':'0\n'}
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.procsys = os.path.join(self.tmpdir, 'proc', 'sys')
+
+        for name,value in self.VALUES.items():
+            path = os.path.join(self.procsys, name)
+
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            with open(path, 'w') as paramf:
+                paramf.write(value)
+
+        self.dockerrootdir = os.path.join(self.tmpdir, 'etce', 'field')
+
+        os.makedirs(self.dockerrootdir)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def value(self, name):
+        with open(os.path.join(self.procsys, *name.split('.'))) as paramf:
+            return paramf.read()
+
+
+    def setvalue(self, name, value):
+        with open(os.path.join(self.procsys, *name.split('.')), 'w') as paramf:
+            paramf.write(value)
+
+
+class KernelParametersTest(ProcSysTest):
+    def setUp(self):
+        ProcSysTest.setUp(self)
+
+        self.kernel = KernelParameters(self.procsys)
+
+        self.savefile = savefilename(self.dockerrootdir)
+
+
+    def test_apply_writes_only_differing_values(self):
+        report = self.kernel.apply({'net.core.rmem_max':'8388608',
+                                    'net.ipv4.tcp_rmem':'4096 131072  6291456',
+                                    'net.core.missing':'1'},
+                                   self.savefile)
+
+        self.assertEqual(report.changed, [('net.core.rmem_max', '212992', '8388608')])
+
+        # tabs in /proc/sys and spaces in the plan compare equal
+        self.assertEqual(report.unchanged, ['net.ipv4.tcp_rmem'])
+
+        self.assertEqual(report.failed, [('net.core.missing', 'unknown parameter')])
+
+        self.assertEqual(self.value('net.ipv4.tcp_rmem'), '4096\t131072\t6291456\n')
+
+        self.assertEqual(etce.dockerkernelparameters.load(self.savefile),
+                         {'net.core.rmem_max':('212992', '8388608')})
+
+
+    def test_nothing_saved_when_nothing_changes(self):
+        self.kernel.apply({'net.ipv4.ip_forward':'0'}, self.savefile)
+
+        self.assertFalse(os.path.exists(self.savefile))
+
+
+    def test_restore(self):
+        self.kernel.apply({'net.core.rmem_max':'8388608', 'net.ipv4.ip_forward':'1'},
+                          self.savefile)
+
+        report = self.kernel.restore(self.savefile)
+
+        self.assertEqual(report.changed,
+                         [('net.core.rmem_max', '8388608', '212992'),
+                          ('net.ipv4.ip_forward', '1', '0')])
+
+        self.assertEqual(self.value('net.core.rmem_max'), '212992')
+
+        self.assertFalse(os.path.exists(self.savefile))
+
+
+    def test_restore_leaves_values_changed_since_start(self):
+        self.kernel.apply({'net.core.rmem_max':'8388608', 'net.ipv4.ip_forward':'1'},
+                          self.savefile)
+
+        # another field or an operator sets it after this start
+        self.setvalue('net.core.rmem_max', '16777216')
+
+        report = self.kernel.restore(self.savefile)
+
+        self.assertEqual(report.failed, [('net.core.rmem_max', 'changed since start to 16777216')])
+
+        self.assertEqual(report.changed, [('net.ipv4.ip_forward', '1', '0')])
+
+        self.assertEqual(self.value('net.core.rmem_max'), '16777216')
+
+
+    def test_restore_of_value_already_back(self):
+        self.kernel.apply({'net.ipv4.ip_forward':'1'}, self.savefile)
+
+        self.setvalue('net.ipv4.ip_forward', '0')
+
+        report = self.kernel.restore(self.savefile)
+
+        self.assertEqual((report.changed, report.unchanged), ([], ['net.ipv4.ip_forward']))
+
+
+    def test_second_start_keeps_first_original(self):
+        self.kernel.apply({'net.core.rmem_max':'8388608'}, self.savefile)
+
+        self.kernel.apply({'net.core.rmem_max':'4194304'}, self.savefile)
+
+        self.assertEqual(etce.dockerkernelparameters.load(self.savefile),
+                         {'net.core.rmem_max':('212992', '4194304')})
+
+        self.kernel.restore(self.savefile)
+
+        self.assertEqual(self.value('net.core.rmem_max'), '212992')
+
+
+    def test_slash_separated_names_keep_dots(self):
+        self.assertEqual(self.kernel.path('net/ipv4/conf/eth0.100/forwarding'),
+                         os.path.join(self.procsys, 'net', 'ipv4', 'conf', 'eth0.100', 'forwarding'))
+
+
+class ForceRestartTest(ProcSysTest):
+    def setUp(self):
+        ProcSysTest.setUp(self)
+
+        self.procsysdefault = etce.dockerkernelparameters.PROCSYS
+
+        etce.dockerkernelparameters.PROCSYS = self.procsys
+
+        self.impl = DOCKERManagerImpl(platform=object())
+
+
+    def tearDown(self):
+        etce.dockerkernelparameters.PROCSYS = self.procsysdefault
+
+        ProcSysTest.tearDown(self)
+
+
+    def test_force_restart_then_stop_restores_originals(self):
+        parameters = {'net.core.rmem_max':'8388608', 'net.ipv4.ip_forward':'1'}
+
+        self.impl._tunekernel(parameters, self.dockerrootdir)
+
+        # the field is never stopped, the next start force removes
+        # its docker root and tunes the kernel again
+        shutil.rmtree(self.dockerrootdir)
+
+        os.makedirs(self.dockerrootdir)
+
+        self.impl._tunekernel(parameters, self.dockerrootdir)
+
+        self.assertEqual(self.value('net.core.rmem_max'), '8388608')
+
+        self.impl._restorekernel(self.dockerrootdir)
+
+        self.assertEqual(self.value('net.core.rmem_max'), '212992')
+
+        self.assertEqual(self.value('net.ipv4.ip_forward'), '0')
+
+        self.assertFalse(os.path.exists(savefilename(self.dockerrootdir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
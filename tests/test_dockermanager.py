@@ -0,0 +1,421 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import etce.dockermanager
+
+from etce.dockererror import DOCKERError
+from etce.dockermanager import DOCKERManagerImpl,FIELD_LABEL,HASH_LABEL,bridgesfilename
+from etce.dockermetrics import METRICS
+from etce.dockerplanfiledoc import DOCKERPlanFileDoc
+from etce.dockerruntime import RUNTIMES
+
+from fakeruntime import FakeRuntime
+from plans import writeplan
+
+
+def labelled(root, digest='', running=True):
+    return {'running':running, 'labels':{FIELD_LABEL:root, HASH_LABEL:digest}}
+
+
+class Container(object):
+    def __init__(self, dockerrootdir, docker_name):
+        self.docker_name = docker_name
+
+        self.docker_directory = os.path.join(dockerrootdir, docker_name)
+
+
+class Bridge(object):
+    def __init__(self, devicename, persistent=False):
+        self.devicename = devicename
+
+        self.persistent = persistent
+
+
+class Platform(object):
+    def __init__(self, calls=None):
+        self.bridgesdown = []
+
+        self.calls = calls if calls is not None else []
+
+
+    def hostname(self):
+        return 'host0'
+
+
+    def getnetworkdevicenames(self):
+        return []
+
+
+    def dockerbridgedown(self, devicename):
+        self.bridgesdown.append(devicename)
+
+        self.calls.append(('dockerbridgedown', devicename))
+
+
+class OffloadTuner(object):
+    def apply(self, docker_name, pid, requests):
+        return None
+
+
+class SlowRuntime(FakeRuntime):
+    ''' Holds each run a little while, counting the runs in flight. '''
+    def __init__(self, *args, **kwargs):
+        FakeRuntime.__init__(self, *args, **kwargs)
+
+        self.inflight = 0
+
+        self.maxinflight = 0
+
+
+    def run(self, container, image, params):
+        with self.lock:
+            self.inflight += 1
+
+            self.maxinflight = max(self.maxinflight, self.inflight)
+
+        time.sleep(0.02)
+
+        with self.lock:
+            self.inflight -= 1
+
+        FakeRuntime.run(self, container, image, params)
+
+
+class ManagerTest(unittest.TestCase):
+    ''' A DOCKERManagerImpl over a FakeRuntime registered as the
+    "fake" runtime, with metrics recorded.
+    '''
+    def manager(self, runtime, **kwargs):
+        RUNTIMES['fake'] = lambda: runtime
+
+        METRICS.enable()
+
+        return DOCKERManagerImpl('fake', platform=kwargs.pop('platform', object()), **kwargs)
+
+
+    def tearDown(self):
+        RUNTIMES.pop('fake', None)
+
+        METRICS.disable()
+
+
+    def counter(self, name):
+        return sum([ counter['value'] for counter in METRICS.snapshot()['counters']
+                     if counter['name'] == name ])
+
+
+class RemoveContainersTest(ManagerTest):
+    def test_missing_names_do_not_fail_the_batch(self):
+        runtime = FakeRuntime(dict([ (name, labelled('/root')) for name in ('a', 'c') ]))
+
+        impl = self.manager(runtime)
+
+        impl.REMOVE_BATCH_SIZE = 3
+
+        leftovers = impl._removecontainers(['a', 'b', 'c'], parallel=1)
+
+        self.assertEqual(leftovers, [])
+
+        self.assertEqual(runtime.calls, [('removemany', ('a', 'c'))])
+
+        self.assertEqual(runtime.live, {})
+
+        self.assertEqual(self.counter('etce_docker_containers_removed_total'), 2)
+
+
+    def test_only_removed_containers_are_counted(self):
+        runtime = FakeRuntime(dict([ (name, labelled('/root')) for name in 'abcd' ]))
+
+        impl = self.manager(runtime)
+
+        impl.REMOVE_BATCH_SIZE = 2
+
+        # the daemon refuses to remove d, failing the c,d batch
+        removemany = runtime.removemany
+
+        def refusing(names):
+            if 'd' in names:
+                raise DOCKERError('removal of container d is already in progress')
+
+            removemany(names)
+
+        runtime.removemany = refusing
+
+        leftovers = impl._removecontainers(list('abcd'), parallel=2)
+
+        self.assertEqual(leftovers, ['c', 'd'])
+
+        self.assertEqual(sorted(runtime.live), ['c', 'd'])
+
+        self.assertEqual(self.counter('etce_docker_containers_removed_total'), 2)
+
+
+    def test_nothing_to_remove(self):
+        runtime = FakeRuntime()
+
+        impl = self.manager(runtime)
+
+        self.assertEqual(impl._removecontainers(['a'], parallel=4), [])
+
+        self.assertEqual(runtime.calls, [])
+
+
+class ReconcileTest(ManagerTest):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.dockerrootdir = os.path.join(self.tmpdir, 'dockerroot')
+
+        os.makedirs(self.dockerrootdir)
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+        ManagerTest.tearDown(self)
+
+
+    def reconcile(self, runtime, names, bridges=(), platform=None):
+        self.impl = self.manager(runtime, platform=platform or Platform())
+
+        containers = [ Container(self.dockerrootdir, name) for name in names ]
+
+        hashes = dict([ (name, 'new') for name in names ])
+
+        recreate = self.impl._reconcile(containers,
+                                        hashes,
+                                        dict([ (name, Bridge(name)) for name in bridges ]),
+                                        self.dockerrootdir,
+                                        parallel=2)
+
+        return sorted([ container.docker_name for container in recreate ])
+
+
+    def test_classification(self):
+        root = self.dockerrootdir
+
+        runtime = FakeRuntime({'unchanged':labelled(root, 'new'),
+                               'changed':labelled(root, 'old'),
+                               'stopped':labelled(root, 'new', running=False),
+                               'orphan':labelled(root, 'new'),
+                               'otherfield':labelled('/tmp/other', 'new'),
+                               'unlabelled':{'running':True, 'labels':{}},
+                               'bystander':{'running':True, 'labels':{}}})
+
+        recreate = self.reconcile(runtime, ['unchanged', 'changed', 'stopped', 'missing',
+                                            'otherfield', 'unlabelled'])
+
+        # a same name container of another field or without labels is
+        # replaced like a changed one
+        self.assertEqual(recreate, ['changed', 'missing', 'otherfield', 'stopped', 'unlabelled'])
+
+        self.assertEqual(sorted(runtime.live), ['bystander', 'unchanged'])
+
+
+    def test_dropped_container_directories_are_removed(self):
+        for entry in ('kept', 'dropped', '.initscripts'):
+            os.makedirs(os.path.join(self.dockerrootdir, entry))
+
+        open(os.path.join(self.dockerrootdir, 'notes'), 'w').close()
+
+        self.reconcile(FakeRuntime(), ['kept'])
+
+        self.assertEqual(sorted(os.listdir(self.dockerrootdir)), ['.initscripts', 'kept', 'notes'])
+
+
+    def test_dropped_bridges_are_brought_down(self):
+        with open(bridgesfilename(self.dockerrootdir), 'w') as fd:
+            fd.write('br0\nbr1\nbr2\n')
+
+        platform = Platform()
+
+        self.reconcile(FakeRuntime(), ['a'], bridges=['br0', 'br2', 'br3'], platform=platform)
+
+        self.assertEqual(platform.bridgesdown, ['br1'])
+
+
+    def test_start_records_its_bridges(self):
+        impl = self.manager(FakeRuntime())
+
+        impl._savebridges({'br0':Bridge('br0'), 'ctl':Bridge('ctl', persistent=True)},
+                          self.dockerrootdir)
+
+        with open(bridgesfilename(self.dockerrootdir)) as fd:
+            self.assertEqual(fd.read(), 'br0\n')
+
+
+class PlanTest(ManagerTest):
+    ''' A plan whose host0 runs NAMES, each with one ctl interface. '''
+    NAMES = [ 'a%d' % i for i in range(1, 9) ]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        planfile = writeplan(os.path.join(self.tmpdir, 'dockerplan.xml'),
+                             [('host0', self.NAMES), ('host1', ['b1'])])
+
+        self.plandoc = DOCKERPlanFileDoc(planfile, cache=False)
+
+        self.containers = list(self.plandoc.containers('host0'))
+
+        self.hashes = dict([ (name, 'digest') for name in self.NAMES ])
+
+        self.waitforinterface = etce.dockermanager.waitforinterface
+
+        etce.dockermanager.waitforinterface = lambda pid, ifname, timeout: 0.0
+
+
+    def tearDown(self):
+        etce.dockermanager.waitforinterface = self.waitforinterface
+
+        shutil.rmtree(self.tmpdir)
+
+        ManagerTest.tearDown(self)
+
+
+    def startnodes(self, runtime, parallel, **kwargs):
+        impl = self.manager(runtime, **kwargs)
+
+        impl._offloadtuner = OffloadTuner()
+
+        return impl._startnodes(self.containers, self.hashes, parallel)
+
+
+    def steps(self, runtime, name):
+        return [ call[0] for call in runtime.calls if call[1] == name ]
+
+
+class StartNodesTest(PlanTest):
+    def test_each_container_steps_run_in_order(self):
+        runtime = SlowRuntime()
+
+        started = self.startnodes(runtime, parallel=4)
+
+        self.assertEqual(sorted(started), self.NAMES)
+
+        for name in self.NAMES:
+            self.assertEqual(self.steps(runtime, name), ['run', 'disconnect', 'connect'])
+
+        self.assertTrue(1 < runtime.maxinflight <= 4)
+
+        self.assertEqual(self.counter('etce_docker_containers_started_total'), len(self.NAMES))
+
+
+    def test_create_attach_declares_interfaces_at_create(self):
+        runtime = FakeRuntime()
+
+        self.startnodes(runtime, parallel=3, attach='create')
+
+        for name in self.NAMES:
+            self.assertEqual(self.steps(runtime, name), ['create', 'start'])
+
+
+    def test_serial_start_keeps_plan_order(self):
+        runtime = FakeRuntime()
+
+        self.startnodes(runtime, parallel=1)
+
+        self.assertEqual([ call[1] for call in runtime.calls if call[0] == 'run' ], self.NAMES)
+
+
+    def test_failures_are_collected(self):
+        runtime = FakeRuntime(fail=['a3', 'a6'])
+
+        with self.assertRaises(DOCKERError) as raised:
+            self.startnodes(runtime, parallel=4)
+
+        self.assertEqual(str(raised.exception),
+                         'Failed to start 2 of 8 containers: a3,a6. Quitting.')
+
+        # the other containers are started regardless
+        self.assertEqual(sorted(runtime.live), [ name for name in self.NAMES
+                                                 if not name in ('a3', 'a6') ])
+
+        self.assertEqual(self.counter('etce_docker_containers_started_total'), 6)
+
+        self.assertEqual(self.counter('etce_docker_containers_failed_total'), 2)
+
+
+class StopTest(PlanTest):
+    def setUp(self):
+        PlanTest.setUp(self)
+
+        # keep stop away from the files of a field running on this host
+        self.filenames = (etce.dockermanager.savefilename, etce.dockermanager.bridgesfilename)
+
+        etce.dockermanager.savefilename = lambda root: os.path.join(self.tmpdir, 'saved')
+
+        etce.dockermanager.bridgesfilename = lambda root: os.path.join(self.tmpdir, 'bridges')
+
+
+    def tearDown(self):
+        etce.dockermanager.savefilename, etce.dockermanager.bridgesfilename = self.filenames
+
+        PlanTest.tearDown(self)
+
+
+    def test_containers_are_removed_before_the_bridges(self):
+        root = self.plandoc.docker_root_directory('host0')
+
+        # a container of the field the plan no longer names is found by
+        # its label
+        runtime = FakeRuntime(dict([ (name, labelled(root)) for name in self.NAMES + ['dropped'] ]))
+
+        platform = Platform(runtime.calls)
+
+        impl = self.manager(runtime, platform=platform)
+
+        impl.REMOVE_BATCH_SIZE = 3
+
+        impl.stop(self.plandoc, parallel=3)
+
+        self.assertEqual(runtime.live, {})
+
+        operations = [ call[0] for call in runtime.calls ]
+
+        self.assertEqual(operations.count('removemany'), 3)
+
+        self.assertEqual(operations[-1], 'dockerbridgedown')
+
+        self.assertEqual(platform.bridgesdown, ['ctl'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from etce.dockermetrics import Metrics,MeasuredCalls,TEXTFILE,accumulate,exposition,load,write
+
+
+class Runtime(object):
+    def run(self, name):
+        if name == 'bad':
+            raise ValueError(name)
+
+        return name
+
+
+class MetricsTest(unittest.TestCase):
+    def test_nothing_recorded_until_enabled(self):
+        metrics = Metrics()
+
+        metrics.inc('etce_docker_runs_total')
+
+        metrics.observe('etce_docker_command_seconds', 0.1)
+
+        with metrics.timer('etce_docker_command_seconds'):
+            pass
+
+        metrics.enable()
+
+        snapshot = metrics.snapshot()
+
+        self.assertEqual((snapshot['counters'], snapshot['gauges'], snapshot['histograms']),
+                         ([], [], []))
+
+
+    def test_histogram_buckets(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+
+        metrics.enable()
+
+        for seconds in (0.05, 0.1, 0.5, 5.0):
+            metrics.observe('etce_docker_command_seconds', seconds, tool='docker', operation='run')
+
+        histogram, = metrics.snapshot()['histograms']
+
+        # a value on a bound falls in that bound's bucket
+        self.assertEqual(histogram['counts'], [2, 1, 1])
+
+        self.assertEqual((histogram['sum'], histogram['count']), (5.65, 4))
+
+        self.assertEqual(histogram['labels'], {'tool':'docker', 'operation':'run'})
+
+
+    def test_measured_calls(self):
+        metrics = Metrics()
+
+        runtime = MeasuredCalls(Runtime(), 'docker', metrics)
+
+        self.assertEqual(runtime.run('n1'), 'n1')
+
+        metrics.enable()
+
+        runtime.run('n1')
+
+        self.assertRaises(ValueError, runtime.run, 'bad')
+
+        snapshot = metrics.snapshot()
+
+        self.assertEqual(snapshot['counters'],
+                         [{'name':'etce_docker_command_failures_total',
+                           'labels':{'tool':'docker', 'operation':'run'},
+                           'value':1}])
+
+        self.assertEqual(snapshot['histograms'][0]['count'], 2)
+
+
+class AccumulateTest(unittest.TestCase):
+    def snapshot(self, runs, seconds, observed, buckets=(0.1, 1.0)):
+        metrics = Metrics(buckets)
+
+        metrics.enable()
+
+        metrics.inc('etce_docker_runs_total', runs, command='startdockers', result='success')
+
+        metrics.set('etce_docker_run_seconds', seconds, command='startdockers')
+
+        for value in observed:
+            metrics.observe('etce_docker_command_seconds', value, tool='docker', operation='run')
+
+        return metrics.snapshot()
+
+
+    def test_counters_and_histograms_add_gauges_replace(self):
+        previous = self.snapshot(2, 10.0, [0.05, 5.0])
+
+        previous['gauges'].append({'name':'etce_docker_run_seconds',
+                                   'labels':{'command':'stopdockers'},
+                                   'value':3.0})
+
+        current = accumulate(previous, self.snapshot(1, 12.0, [0.5]))
+
+        self.assertEqual([ sample['value'] for sample in current['counters'] ], [3])
+
+        self.assertEqual(dict([ (sample['labels']['command'], sample['value'])
+                                for sample in current['gauges'] ]),
+                         {'startdockers':12.0, 'stopdockers':3.0})
+
+        histogram, = current['histograms']
+
+        self.assertEqual((histogram['counts'], histogram['count']), ([1, 1, 1], 3))
+
+        self.assertAlmostEqual(histogram['sum'], 5.55)
+
+
+    def test_other_buckets_or_no_previous_start_afresh(self):
+        current = self.snapshot(1, 12.0, [0.5])
+
+        self.assertEqual(accumulate(None, current), current)
+
+        self.assertEqual(accumulate(self.snapshot(5, 1.0, [0.5], buckets=(1.0,)), current),
+                         current)
+
+
+class ExpositionTest(unittest.TestCase):
+    def test_exposition(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+
+        metrics.enable()
+
+        metrics.inc('etce_docker_runs_total', command='startdockers', result='success')
+
+        metrics.set('etce_docker_containers', 20, command='start')
+
+        metrics.observe('etce_docker_command_seconds', 0.5, tool='docker', operation='run')
+
+        metrics.observe('etce_docker_interface_wait_seconds', 0.05)
+
+        metrics.inc('etce_docker_hosts_failed_total', command='say "hi"\n')
+
+        self.assertEqual(exposition(metrics.snapshot()).splitlines(), [
+            '# HELP etce_docker_hosts_failed_total Remote hosts a field command failed on.',
+            '# TYPE etce_docker_hosts_failed_total counter',
+            'etce_docker_hosts_failed_total{command="say \\"hi\\"\\n"} 1',
+            '# HELP etce_docker_runs_total Commands run, by command and result.',
+            '# TYPE etce_docker_runs_total counter',
+            'etce_docker_runs_total{command="startdockers",result="success"} 1',
+            '# HELP etce_docker_containers Containers planned for this host by the last run of a command.',
+            '# TYPE etce_docker_containers gauge',
+            'etce_docker_containers{command="start"} 20',
+            '# HELP etce_docker_command_seconds Latency of external commands, by tool and operation.',
+            '# TYPE etce_docker_command_seconds histogram',
+            'etce_docker_command_seconds_bucket{operation="run",tool="docker",le="0.1"} 0',
+            'etce_docker_command_seconds_bucket{operation="run",tool="docker",le="1.0"} 1',
+            'etce_docker_command_seconds_bucket{operation="run",tool="docker",le="+Inf"} 1',
+            'etce_docker_command_seconds_sum{operation="run",tool="docker"} 0.5',
+            'etce_docker_command_seconds_count{operation="run",tool="docker"} 1',
+            '# HELP etce_docker_interface_wait_seconds Time for a connected interface to appear in its container.',
+            '# TYPE etce_docker_interface_wait_seconds histogram',
+            'etce_docker_interface_wait_seconds_bucket{le="0.1"} 1',
+            'etce_docker_interface_wait_seconds_bucket{le="1.0"} 1',
+            'etce_docker_interface_wait_seconds_bucket{le="+Inf"} 1',
+            'etce_docker_interface_wait_seconds_sum 0.05',
+            'etce_docker_interface_wait_seconds_count 1',
+        ])
+
+
+    def test_write_and_load(self):
+        tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        try:
+            metrics = Metrics()
+
+            metrics.enable()
+
+            metrics.inc('etce_docker_runs_total', command='stopdockers', result='failure')
+
+            jsonfile = os.path.join(tmpdir, 'metrics.json')
+
+            write(metrics.snapshot(), jsonfile, tmpdir)
+
+            self.assertEqual(load(jsonfile), metrics.snapshot())
+
+            with open(os.path.join(tmpdir, TEXTFILE)) as textf:
+                self.assertEqual(textf.read(), exposition(metrics.snapshot()))
+
+            self.assertEqual(sorted(os.listdir(tmpdir)), sorted(['metrics.json', TEXTFILE]))
+
+            self.assertEqual(load(os.path.join(tmpdir, 'missing.json')), None)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
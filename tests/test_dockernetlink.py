@@ -0,0 +1,290 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import errno
+import socket
+import struct
+import unittest
+
+import etce.dockernetlink
+from etce.dockernetlink import RTNetlink,NetlinkProvisioner,NLMSGHDR,IFINFOMSG,RTATTR, \
+    NLMSG_ERROR,NLMSG_DONE,NLM_F_REQUEST,NLM_F_ACK,NLM_F_CREATE,NLM_F_EXCL, \
+    RTM_NEWLINK,RTM_DELLINK,IFLA_IFNAME,IFLA_MTU,IFLA_LINKINFO,IFLA_INFO_KIND,IFF_UP, \
+    _rtattr,_ifinfomsg
+
+
+def message(msgtype, seq, payload):
+    return NLMSGHDR.pack(NLMSGHDR.size + len(payload), msgtype, 0, seq, 0) + payload
+
+
+def ack(seq, error):
+    # an error message carries the negative errno and the request header
+    return message(NLMSG_ERROR, seq, struct.pack('=i', -error) + NLMSGHDR.pack(0, 0, 0, seq, 0))
+
+
+def newlink(seq, index, flags, name):
+    return message(RTM_NEWLINK, seq, _ifinfomsg(index, flags) + _rtattr(IFLA_IFNAME, name + '\0'))
+
+
+def split(data):
+    ''' The (msgtype, flags, seq, payload) of each message in data. '''
+    messages = []
+
+    offset = 0
+
+    while offset < len(data):
+        length,msgtype,flags,seq,_ = NLMSGHDR.unpack_from(data, offset)
+
+        messages.append((msgtype, flags, seq, data[offset+NLMSGHDR.size:offset+length]))
+
+        offset += (length + 3) & ~3
+
+    return messages
+
+
+def attributes(data):
+    ''' {attrtype: data} of the attributes in data. '''
+    attrs = {}
+
+    offset = 0
+
+    while offset < len(data):
+        length,attrtype = RTATTR.unpack_from(data, offset)
+
+        attrs[attrtype] = data[offset+RTATTR.size:offset+length]
+
+        offset += (length + 3) & ~3
+
+    return attrs
+
+
+class Socket(object):
+    ''' Answers each send with the datagrams reply(messages) returns. '''
+    def __init__(self, reply):
+        self.reply = reply
+
+        self.sent = []
+
+        self.datagrams = []
+
+
+    def send(self, data):
+        self.sent.append(data)
+
+        self.datagrams.extend(self.reply(split(data)))
+
+        return len(data)
+
+
+    def recv(self, size):
+        return self.datagrams.pop(0)
+
+
+def netlink(reply):
+    rtnetlink = RTNetlink.__new__(RTNetlink)
+
+    rtnetlink._sock = Socket(reply)
+
+    rtnetlink._seq = 0
+
+    return rtnetlink
+
+
+class EncodingTest(unittest.TestCase):
+    def test_attributes_are_padded_to_four_bytes(self):
+        self.assertEqual(_rtattr(IFLA_IFNAME, 'br0\0'), RTATTR.pack(8, IFLA_IFNAME) + 'br0\0')
+
+        # the length excludes the padding
+        self.assertEqual(_rtattr(IFLA_IFNAME, 'ab'), RTATTR.pack(6, IFLA_IFNAME) + 'ab\0\0')
+
+
+    def test_ifinfomsg(self):
+        self.assertEqual(IFINFOMSG.unpack(_ifinfomsg(7, IFF_UP, IFF_UP)),
+                         (socket.AF_UNSPEC, 0, 7, IFF_UP, IFF_UP))
+
+
+    def test_bridge_body(self):
+        class Bridge(object):
+            devicename = 'br0'
+            mtu = '9000'
+
+        body = NetlinkProvisioner(None)._bridgebody(Bridge(), True)
+
+        self.assertEqual(IFINFOMSG.unpack_from(body)[2:4], (0, IFF_UP))
+
+        attrs = attributes(body[IFINFOMSG.size:])
+
+        self.assertEqual(attrs[IFLA_IFNAME], 'br0\0')
+
+        self.assertEqual(struct.unpack('=I', attrs[IFLA_MTU]), (9000,))
+
+        self.assertEqual(attributes(attrs[IFLA_LINKINFO])[IFLA_INFO_KIND], 'bridge')
+
+
+class TransactTest(unittest.TestCase):
+    def test_each_request_gets_its_errno(self):
+        errors = {'a':0, 'b':errno.EEXIST, 'c':errno.EPERM}
+
+        def reply(messages):
+            # acks out of order over two datagrams, with a message that
+            # answers no request in between
+            acks = [ ack(seq, errors['abc'[seq - 1]]) for _,_,seq,_ in messages ]
+
+            return [ acks[2] + message(NLMSG_DONE, 99, ''), acks[1] + acks[0] ]
+
+        rtnetlink = netlink(reply)
+
+        results = rtnetlink.transact([ (key, RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, _ifinfomsg())
+                                       for key in 'abc' ])
+
+        self.assertEqual(results, errors)
+
+        # one send for the batch, every request asks for an ack
+        sent, = rtnetlink._sock.sent
+
+        self.assertEqual([ (msgtype, flags, seq) for msgtype,flags,seq,_ in split(sent) ],
+                         [ (RTM_NEWLINK,
+                            NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL,
+                            seq)
+                           for seq in (1, 2, 3) ])
+
+
+    def test_requests_are_sent_in_batches(self):
+        batchsize = etce.dockernetlink.BATCH_SIZE
+
+        etce.dockernetlink.BATCH_SIZE = 2
+
+        try:
+            rtnetlink = netlink(lambda messages: [ ''.join([ ack(seq, 0)
+                                                             for _,_,seq,_ in messages ]) ])
+
+            results = rtnetlink.transact([ (i, RTM_DELLINK, 0, _ifinfomsg(i)) for i in range(5) ])
+        finally:
+            etce.dockernetlink.BATCH_SIZE = batchsize
+
+        self.assertEqual(results, dict.fromkeys(range(5), 0))
+
+        self.assertEqual([ len(split(sent)) for sent in rtnetlink._sock.sent ], [2, 2, 1])
+
+
+    def test_links_dump(self):
+        rtnetlink = netlink(lambda messages: [ newlink(1, 1, IFF_UP, 'lo') + newlink(1, 2, 0, 'eth0'),
+                                               message(NLMSG_DONE, 1, '') ])
+
+        self.assertEqual(rtnetlink.links(), {'lo':(1, IFF_UP), 'eth0':(2, 0)})
+
+
+    def test_links_error(self):
+        rtnetlink = netlink(lambda messages: [ ack(1, errno.EPERM) ])
+
+        with self.assertRaises(OSError) as raised:
+            rtnetlink.links()
+
+        self.assertEqual(raised.exception.errno, errno.EPERM)
+
+
+class Netlink(object):
+    ''' Holds links {name: (index, flags)} and answers the first
+    request for a name in errors with its errno, any other with 0. A
+    link a request created, or found already there, is listed from
+    then on.
+    '''
+    def __init__(self, links, errors=None):
+        self.linkmap = dict(links)
+
+        self.errors = errors or {}
+
+        self.requests = []
+
+
+    def links(self):
+        return dict(self.linkmap)
+
+
+    def transact(self, requests):
+        self.requests.append([ (key, msgtype) for key,msgtype,_,_ in requests ])
+
+        results = dict([ (key, self.errors.pop(key, 0)) for key,_,_,_ in requests ])
+
+        for key,msgtype,_,_ in requests:
+            if msgtype == RTM_NEWLINK and results[key] in (0, errno.EEXIST):
+                self.linkmap.setdefault(key, (len(self.linkmap) + 1, IFF_UP))
+
+        return results
+
+
+class Bridge(object):
+    def __init__(self, devicename, addifs=()):
+        self.devicename = devicename
+
+        self.mtu = None
+
+        self.addifs = addifs
+
+
+class ProvisionerTest(unittest.TestCase):
+    def test_provision(self):
+        netlink = Netlink({'eth1':(2, 0), 'br1':(3, 0)}, {'br2':errno.EEXIST, 'br3':errno.EPERM})
+
+        created,existed,failed = NetlinkProvisioner(netlink).provision(
+            [ Bridge('br0', addifs=['eth1', 'eth9']), Bridge('br1'), Bridge('br2'), Bridge('br3') ],
+            [])
+
+        self.assertEqual(created, ['br0'])
+
+        self.assertEqual(sorted(existed), ['br1', 'br2'])
+
+        self.assertEqual(failed, {'br3':'Operation not permitted',
+                                  'eth9':'addif of bridge br0 not found'})
+
+        # only the missing bridges are created, then existing ones are
+        # brought to the same state
+        self.assertEqual(sorted(netlink.requests[0]),
+                         [ (name, RTM_NEWLINK) for name in ('br0', 'br2', 'br3') ])
+
+
+    def test_deprovision(self):
+        netlink = Netlink({'br0':(3, 0), 'br1':(4, 0), 'br2':(5, 0)},
+                          {'br1':errno.ENODEV, 'br2':errno.EBUSY})
+
+        removed,absent,failed = NetlinkProvisioner(netlink).deprovision(['br0', 'br1', 'br2', 'br9'])
+
+        self.assertEqual((removed, sorted(absent), failed),
+                         (['br0'], ['br1', 'br9'], {'br2':'Device or resource busy'}))
+
+        self.assertEqual(netlink.requests, [[ (name, RTM_DELLINK) for name in ('br0', 'br1', 'br2') ]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import etce.dockerplanfiledoc
+from etce.dockerplancache import DOCKERPlanCache
+from etce.dockerplanfiledoc import DOCKERPlanFileDoc
+
+from plans import writeplan
+
+
+class PlanCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.cache = DOCKERPlanCache(os.path.join(self.tmpdir, 'cache'), maxentries=2)
+
+        self.planfile = writeplan(os.path.join(self.tmpdir, 'dockerplan.xml'),
+                                  [('host0', ['a1'])])
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_key_follows_plan_content_and_parts(self):
+        key = self.cache.key(self.planfile, '/tmp/etce', [('a', 1)])
+
+        self.assertEqual(self.cache.key(self.planfile, '/tmp/etce', [('a', 1)]), key)
+
+        self.assertNotEqual(self.cache.key(self.planfile, '/tmp/other', [('a', 1)]), key)
+
+        self.assertNotEqual(self.cache.key(self.planfile, '/tmp/etce', [('a', 2)]), key)
+
+        writeplan(self.planfile, [('host0', ['a1', 'a2'])])
+
+        self.assertNotEqual(self.cache.key(self.planfile, '/tmp/etce', [('a', 1)]), key)
+
+
+    def test_store_and_load(self):
+        self.assertEqual(self.cache.load('missing'), None)
+
+        self.cache.store('k', {'hosts':('host0',)})
+
+        self.assertEqual(self.cache.load('k'), {'hosts':('host0',)})
+
+
+    def test_unreadable_entry_is_dropped(self):
+        self.cache.store('k', 1)
+
+        entry = os.path.join(self.tmpdir, 'cache', 'k' + DOCKERPlanCache.SUFFIX)
+
+        with open(entry, 'wb') as entryf:
+            entryf.write('not a pickle')
+
+        self.assertEqual(self.cache.load('k'), None)
+
+        self.assertFalse(os.path.exists(entry))
+
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for key in ('a', 'b'):
+            self.cache.store(key, key)
+
+        entry = os.path.join(self.tmpdir, 'cache', 'b' + DOCKERPlanCache.SUFFIX)
+
+        # b older than a
+        os.utime(entry, (0, 0))
+
+        self.cache.store('c', 'c')
+
+        self.assertEqual([ self.cache.load(key) for key in ('a', 'b', 'c') ], ['a', None, 'c'])
+
+
+class ConfigDictionary(object):
+    WORK_DIRECTORY = None
+
+    OVERLAYS = {}
+
+    def get(self, section, key, default=None):
+        return {'WORK_DIRECTORY':self.WORK_DIRECTORY}[key]
+
+
+    def asdict(self):
+        return {'overlays':dict(self.OVERLAYS)}
+
+
+class PlanInvalidationTest(unittest.TestCase):
+    ''' DOCKERPlanFileDoc expands a plan again whenever the plan file,
+    the configuration overlays or WORK_DIRECTORY change.
+    '''
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.planfile = writeplan(os.path.join(self.tmpdir, 'dockerplan.xml'),
+                                  [('host0', ['a1'])])
+
+        self.saved = (etce.dockerplanfiledoc.ConfigDictionary, DOCKERPlanFileDoc._parsehost)
+
+        ConfigDictionary.WORK_DIRECTORY = os.path.join(self.tmpdir, 'work')
+
+        ConfigDictionary.OVERLAYS = {'shared':'one'}
+
+        etce.dockerplanfiledoc.ConfigDictionary = ConfigDictionary
+
+        self.expanded = []
+
+        parsehost = DOCKERPlanFileDoc._parsehost
+
+        def counting(doc, hostname):
+            self.expanded.append(hostname)
+
+            return parsehost(doc, hostname)
+
+        DOCKERPlanFileDoc._parsehost = counting
+
+
+    def tearDown(self):
+        etce.dockerplanfiledoc.ConfigDictionary, DOCKERPlanFileDoc._parsehost = self.saved
+
+        shutil.rmtree(self.tmpdir)
+
+
+    def load(self, **kwargs):
+        del self.expanded[:]
+
+        plandoc = DOCKERPlanFileDoc(self.planfile, **kwargs)
+
+        return plandoc, list(self.expanded)
+
+
+    def test_unchanged_inputs_hit(self):
+        # a lazy plan caches each host once it is first expanded
+        for kwargs in ({}, {'lazy':True}):
+            plandoc,_ = self.load(**kwargs)
+
+            plandoc.containers('host0')
+
+            plandoc,_ = self.load(**kwargs)
+
+            plandoc.containers('host0')
+
+            self.assertEqual(self.expanded, [], kwargs)
+
+
+    def test_plan_edit_misses(self):
+        self.load()
+
+        writeplan(self.planfile, [('host0', ['a1', 'a2'])])
+
+        plandoc,expanded = self.load()
+
+        self.assertEqual(expanded, ['host0'])
+
+        self.assertEqual(plandoc.containers('host0').docker_names, ['a1', 'a2'])
+
+
+    def test_overlay_change_misses(self):
+        self.load()
+
+        ConfigDictionary.OVERLAYS = {'shared':'two'}
+
+        _,expanded = self.load()
+
+        self.assertEqual(expanded, ['host0'])
+
+
+    def test_work_directory_change_misses(self):
+        self.load()
+
+        ConfigDictionary.WORK_DIRECTORY = os.path.join(self.tmpdir, 'elsewhere')
+
+        plandoc,expanded = self.load()
+
+        self.assertEqual(expanded, ['host0'])
+
+        self.assertEqual(plandoc.docker_root_directory('host0'),
+                         os.path.join(self.tmpdir, 'elsewhere', 'dockerroot'))
+
+
+if __name__ == '__main__':
+    unittest.main()
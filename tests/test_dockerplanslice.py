@@ -0,0 +1,104 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import etce.dockerplanslice
+from etce.dockerplanfiledoc import DOCKERPlanFileDoc
+from etce.dockerplanslice import DOCKERPlanSlice
+
+from plans import writeplan
+
+
+class ConfigDictionary(object):
+    ''' The etce configuration of the host receiving the slice. '''
+    WORK_DIRECTORY = '/tmp/receiver'
+
+    def get(self, section, key, default=None):
+        return {'WORK_DIRECTORY':self.WORK_DIRECTORY}[key]
+
+
+class PlanSliceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='etcetest.')
+
+        self.configdefault = etce.dockerplanslice.ConfigDictionary
+
+        etce.dockerplanslice.ConfigDictionary = ConfigDictionary
+
+        planfile = writeplan(os.path.join(self.tmpdir, 'dockerplan.xml'),
+                             [('host0', ['a1', 'a2']), ('host1', ['b1'])])
+
+        self.plandoc = DOCKERPlanFileDoc(planfile, cache=False)
+
+        self.slicefile = os.path.join(self.tmpdir, 'host1' + DOCKERPlanSlice.SUFFIX)
+
+        DOCKERPlanSlice.write(self.plandoc, 'host1', self.slicefile)
+
+
+    def tearDown(self):
+        etce.dockerplanslice.ConfigDictionary = self.configdefault
+
+        shutil.rmtree(self.tmpdir)
+
+
+    def test_docker_root_is_resolved_on_the_receiving_host(self):
+        plandoc = DOCKERPlanSlice(self.slicefile)
+
+        self.assertEqual(plandoc.docker_root_directory('host1'), '/tmp/receiver/dockerroot')
+
+        self.assertEqual([ container.docker_directory for container in plandoc.containers('host1') ],
+                         ['/tmp/receiver/dockerroot/b1'])
+
+
+    def test_slice_holds_only_its_host(self):
+        plandoc = DOCKERPlanSlice(self.slicefile)
+
+        self.assertEqual(plandoc.containers('host1').docker_names, ['b1'])
+
+        self.assertEqual(plandoc.containers('host0').docker_names, [])
+
+        self.assertEqual(plandoc.docker_root_directory('host0'), None)
+
+        self.assertEqual([ str(container) for container in plandoc.containers('host1') ],
+                         [ str(container).replace(self.plandoc.docker_root_directory('host1'),
+                                                  '/tmp/receiver/dockerroot')
+                           for container in self.plandoc.containers('host1') ])
+
+
+if __name__ == '__main__':
+    unittest.main()
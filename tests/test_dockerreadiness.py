@@ -0,0 +1,70 @@
+#
+# Copyright (c) 2013-2018 - Adjacent Link LLC, Bridgewater, New Jersey
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# * Redistributions of source code must retain the above copyright
+#   notice, this list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright
+#   notice, this list of conditions and the following disclaimer in
+#   the documentation and/or other materials provided with the
+#   distribution.
+# * Neither the name of Adjacent Link LLC nor the names of its
+#   contributors may be used to endorse or promote products derived
+#   from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+
+
+import time
+import unittest
+
+from etce.dockerreadiness import ReadinessWaiter
+
+
+class Container(object):
+    def __init__(self, docker_name):
+        self.docker_name = docker_name
+
+        self.readyfile = None
+
+
+class Runtime(object):
+    def states(self, label, key):
+        return {'a':(True, ''), 'b':(True, '')}
+
+
+class ReadinessWaiterTest(unittest.TestCase):
+    def test_each_container_is_timed_from_its_own_start(self):
+        now = time.time()
+
+        report = ReadinessWaiter(Runtime(), 'etce.docker.field=/tmp/x', 'etce.docker.hash', timeout=0.1).wait(
+            [ Container(name) for name in ('a', 'b', 'c') ],
+            {'a':now - 10.0})
+
+        self.assertTrue(10.0 <= report.ready['a'] < 11.0)
+
+        # b has no start time, it is timed from the start of the wait
+        self.assertTrue(0.0 <= report.ready['b'] < 1.0)
+
+        self.assertEqual(report.notready(), ['c'])
+
+
+if __name__ == '__main__':
+    unittest.main()